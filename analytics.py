@@ -0,0 +1,269 @@
+# analytics.py
+
+import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+DAY_NAMES = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
+
+# Секунды на единицу длительности ISO 8601 по коду символа-обозначения.
+# "M" зависит от позиции: до "T" — месяцы, после — минуты (см. parse_durations)
+_DURATION_UNITS = np.zeros(256, dtype=np.int64)
+for _designator, _seconds in (("Y", 365 * 86400), ("W", 7 * 86400), ("D", 86400), ("H", 3600), ("S", 1)):
+    _DURATION_UNITS[ord(_designator)] = _seconds
+
+
+def parse_timestamps(iso_strings: list) -> np.ndarray:
+    """
+    Превращает список строк вида '2024-01-31T18:00:00Z' в массив datetime64[s] (UTC).
+    Разбор выполняется одним вызовом NumPy, без цикла по строкам.
+    """
+    if not iso_strings:
+        return np.array([], dtype='datetime64[s]')
+    # Обрезаем 'Z' и доли секунды: NumPy не принимает суффиксы часовых поясов
+    return np.asarray(iso_strings, dtype='U32').astype('U19').astype('datetime64[s]')
+
+
+def parse_durations(iso_durations: list) -> np.ndarray:
+    """
+    Превращает длительности ISO 8601 ('PT1H2M3S', 'P1DT2H', 'P0D') в секунды (int64).
+    Строки укладываются в матрицу байтов, и разбор идет по ее столбцам (их не больше
+    ширины строки), каждый раз сразу для всех видео. Дробные секунды отбрасываются,
+    пустые и нераспознанные значения дают 0.
+    """
+    if not iso_durations:
+        return np.zeros(0, dtype=np.int64)
+    # Ширина матрицы — по самой длинной строке (обычно 8–10 символов)
+    chars = np.asarray([d or "" for d in iso_durations], dtype='S')
+    matrix = chars.view(np.uint8).reshape(len(chars), -1)
+
+    total = np.zeros(len(chars), dtype=np.int64)
+    number = np.zeros(len(chars), dtype=np.int64)
+    in_time = np.zeros(len(chars), dtype=bool)
+    fraction = np.zeros(len(chars), dtype=bool)
+    for column in matrix.T:
+        digit = (column >= ord('0')) & (column <= ord('9')) & ~fraction
+        number = np.where(digit, number * 10 + (column.astype(np.int64) - ord('0')), number)
+        fraction |= column == ord('.')
+        in_time |= column == ord('T')
+        unit = _DURATION_UNITS[column]
+        unit = np.where(column == ord('M'), np.where(in_time, 60, 30 * 86400), unit)
+        designator = unit > 0
+        total += np.where(designator, number * unit, 0)
+        number = np.where(designator, 0, number)
+        fraction &= ~designator
+    return total
+
+
+def shorts_mask(durations: np.ndarray, max_seconds: int) -> np.ndarray:
+    """
+    True для Shorts: ролики не длиннее max_seconds. Нулевая длительность
+    (идущие и запланированные трансляции) к Shorts не относится.
+    """
+    return (durations > 0) & (durations <= max_seconds)
+
+
+def _utc_offsets_seconds(timestamps: np.ndarray, tz: ZoneInfo) -> np.ndarray:
+    """
+    Смещение часового пояса (в секундах) для каждой метки времени.
+    Смещение считается один раз на каждый уникальный час, поэтому даже
+    десятки тысяч видео дают лишь несколько тысяч обращений к zoneinfo.
+    """
+    hours = timestamps.astype('datetime64[h]').astype(np.int64)
+    unique_hours, inverse = np.unique(hours, return_inverse=True)
+    offsets = np.fromiter(
+        (datetime.datetime.fromtimestamp(int(h) * 3600, tz).utcoffset().total_seconds() for h in unique_hours),
+        dtype=np.int64,
+        count=len(unique_hours)
+    )
+    return offsets[inverse]
+
+
+def build_publication_grid(timestamps: np.ndarray, tz_name: str = "UTC") -> np.ndarray:
+    """
+    Строит сетку 7x24 (день недели x час) в выбранном часовом поясе
+    одним векторизованным шагом (np.bincount).
+    """
+    if timestamps.size == 0:
+        return np.zeros((7, 24), dtype=int)
+
+    seconds = timestamps.astype('datetime64[s]').astype(np.int64)
+    if tz_name != "UTC":
+        seconds = seconds + _utc_offsets_seconds(timestamps, ZoneInfo(tz_name))
+
+    days = seconds // 86400
+    weekday = (days + 3) % 7  # 1970-01-01 — четверг, сдвигаем к понедельнику = 0
+    hour = (seconds // 3600) % 24
+    return np.bincount(weekday * 24 + hour, minlength=7 * 24).reshape(7, 24)
+
+
+def _local_days(timestamps: np.ndarray, tz_name: str) -> np.ndarray:
+    """Номер дня (от 1970-01-01) каждой метки времени в выбранном часовом поясе."""
+    seconds = timestamps.astype('datetime64[s]').astype(np.int64)
+    if tz_name != "UTC":
+        seconds = seconds + _utc_offsets_seconds(timestamps, ZoneInfo(tz_name))
+    return seconds // 86400
+
+
+def weekly_cadence(timestamps: np.ndarray, until: np.datetime64 | None = None, recent_weeks: int = 12,
+                   tz_name: str = "UTC") -> dict:
+    """
+    Считает регулярность публикаций: среднее кол-во видео в неделю за весь период,
+    за последние `recent_weeks` недель и тренд (наклон линейной регрессии по неделям).
+    Недели (с понедельника) — в часовом поясе tz_name, как и в build_publication_grid.
+    """
+    if timestamps.size == 0:
+        return {"weeks": 0, "avg_per_week": 0.0, "recent_per_week": 0.0,
+                "previous_per_week": 0.0, "trend_per_month": 0.0}
+
+    weeks = (_local_days(timestamps, tz_name) + 3) // 7  # недели, начинающиеся с понедельника
+    first_week = int(weeks.min())
+    if until is None:
+        until = np.datetime64(datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None), 's')
+    until_week = int((_local_days(np.asarray([until]), tz_name)[0] + 3) // 7)
+    last_week = max(until_week, int(weeks.max()))
+
+    counts = np.bincount(weeks - first_week, minlength=last_week - first_week + 1).astype(float)
+    recent = counts[-recent_weeks:]
+    previous = counts[-2 * recent_weeks:-recent_weeks]
+
+    trend = 0.0
+    if counts.size >= 2:
+        trend = float(np.polyfit(np.arange(counts.size), counts, 1)[0]) * 52 / 12  # видео/нед. за месяц
+
+    return {
+        "weeks": int(counts.size),
+        "avg_per_week": float(counts.mean()),
+        "recent_per_week": float(recent.mean()),
+        "previous_per_week": float(previous.mean()) if previous.size else 0.0,
+        "trend_per_month": trend
+    }
+
+
+def channel_health(views_list: list, likes_list: list, comments_list: list) -> dict:
+    """
+    Устойчивая к выбросам статистика "здоровья канала".
+    Медианы и перцентили не искажаются одним вирусным видео; выбросы
+    ищутся по правилу 1.5 * IQR на логарифмической шкале просмотров.
+    ER считается по медианам: (лайки + комментарии) / просмотры.
+    """
+    views = np.asarray(views_list, dtype=np.float64)
+    likes = np.asarray(likes_list, dtype=np.float64)
+    comments = np.asarray(comments_list, dtype=np.float64)
+
+    median_views, median_likes, median_comments = (float(np.median(a)) for a in (views, likes, comments))
+    p25, p75, p90 = np.percentile(views, [25, 75, 90])
+
+    log_views = np.log1p(views)
+    q1, q3 = np.percentile(log_views, [25, 75])
+    iqr = q3 - q1
+    high = log_views > q3 + 1.5 * iqr
+    low = log_views < q1 - 1.5 * iqr
+
+    er = (median_likes + median_comments) / median_views * 100 if median_views > 0 else 0.0
+
+    return {
+        "num_videos": int(views.size),
+        "avg_views": int(views.mean()),
+        "avg_likes": int(likes.mean()),
+        "avg_comments": int(comments.mean()),
+        "median_views": int(median_views),
+        "median_likes": int(median_likes),
+        "median_comments": int(median_comments),
+        "p25_views": int(p25),
+        "p75_views": int(p75),
+        "p90_views": int(p90),
+        "outliers_high": int(high.sum()),
+        "outliers_low": int(low.sum()),
+        "outlier_flags": (high | low).tolist(),
+        "er": f"{er:.2f}"
+    }
+
+
+def format_health(views_list: list, likes_list: list, comments_list: list, shorts: list) -> dict:
+    """
+    "Здоровье канала" отдельно для Shorts и длинных видео: у Shorts на порядок другие
+    просмотры и вовлеченность, и в общей выборке они искажают медианы и выбросы.
+    Возвращает {"shorts": channel_health(...) или None, "long": ... или None} и выбросы,
+    найденные внутри своего формата: "outlier_flags" (в исходном порядке видео),
+    "outliers_high", "outliers_low".
+    """
+    shorts = np.asarray(shorts, dtype=bool)
+    columns = [np.asarray(a, dtype=np.float64) for a in (views_list, likes_list, comments_list)]
+    flags = np.zeros(shorts.size, dtype=bool)
+    result = {"outliers_high": 0, "outliers_low": 0}
+    for name, mask in (("shorts", shorts), ("long", ~shorts)):
+        if not mask.any():
+            result[name] = None
+            continue
+        health = channel_health(*(a[mask] for a in columns))
+        flags[mask] = health.pop("outlier_flags")
+        result[name] = health
+        result["outliers_high"] += health["outliers_high"]
+        result["outliers_low"] += health["outliers_low"]
+    result["outlier_flags"] = flags.tolist()
+    return result
+
+
+def top_in_windows(published: np.ndarray, views: np.ndarray, mask: np.ndarray, windows: tuple,
+                   now: np.datetime64) -> list:
+    """
+    Для каждого окна (дней назад) — индекс самого просматриваемого видео из mask,
+    опубликованного в этом окне, или -1, если таких нет.
+    """
+    age_days = (now - published.astype('datetime64[s]')).astype(np.int64) / 86400
+    result = []
+    for days in windows:
+        candidates = np.flatnonzero(mask & (age_days <= days))
+        result.append(int(candidates[np.argmax(views[candidates])]) if candidates.size else -1)
+    return result
+
+
+def niche_outliers(views_per_channel: list, subscribers: list, top: int = 200, min_videos: int = 5) -> list:
+    """
+    Видео, которые сильнее всего обогнали обычный уровень своего канала, по всей нише.
+    views_per_channel — просмотры последних видео каждого канала, subscribers — подписчики каналов.
+    Все видео ниши обрабатываются одним набором массивов, медианы каналов считаются
+    без цикла по каналам: сортировка по (канал, просмотры) и середина каждой группы.
+    Возвращает до `top` записей {channel, video, views, to_median, to_subs, channel_median}
+    по убыванию to_median; channel и video — индексы во входных данных.
+    """
+    counts = np.array([len(v) for v in views_per_channel], dtype=np.int64)
+    total = int(counts.sum())
+    if total == 0:
+        return []
+
+    views = np.concatenate([np.asarray(v, dtype=np.float64) for v in views_per_channel])
+    starts = np.cumsum(counts) - counts
+    channel = np.repeat(np.arange(counts.size), counts)
+    position = np.arange(total) - starts[channel]
+
+    sorted_views = views[np.lexsort((views, channel))]
+    safe_counts = np.maximum(counts, 1)
+    lo = np.minimum(starts + (safe_counts - 1) // 2, total - 1)
+    hi = np.minimum(starts + safe_counts // 2, total - 1)
+    medians = np.where(counts > 0, (sorted_views[lo] + sorted_views[hi]) / 2, 0.0)
+
+    video_medians = medians[channel]
+    video_subs = np.asarray(subscribers, dtype=np.float64)[channel]
+    valid = (counts[channel] >= min_videos) & (video_medians > 0)
+    to_median = np.where(valid, views / np.where(video_medians > 0, video_medians, 1.0), 0.0)
+    to_subs = np.where(video_subs > 0, views / np.maximum(video_subs, 1.0), np.nan)
+
+    candidates = np.flatnonzero(to_median > 1.0)
+    if candidates.size > top:
+        candidates = candidates[np.argpartition(-to_median[candidates], top - 1)[:top]]
+    candidates = candidates[np.argsort(-to_median[candidates], kind='stable')]
+
+    return [
+        {
+            "channel": int(channel[i]),
+            "video": int(position[i]),
+            "views": int(views[i]),
+            "to_median": round(float(to_median[i]), 2),
+            "to_subs": None if np.isnan(to_subs[i]) else round(float(to_subs[i]), 3),
+            "channel_median": int(medians[channel[i]]),
+        }
+        for i in candidates
+    ]
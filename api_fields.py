@@ -0,0 +1,49 @@
+# api_fields.py
+
+# Маски `fields` (partial response) для каждого места вызова YouTube Data API.
+# API возвращает только перечисленные поля: без описаний, пяти превью и прочего,
+# что бот все равно не читает. Маска должна включать все поля, которые читает код.
+
+# playlistItems.list — только то, что нужно конкретному сценарию (+ токен пагинации)
+# ID и дата — для поискового индекса (search_index), который заполняется попутно
+PLAYLIST_TITLES = "nextPageToken,items/snippet(title,publishedAt,resourceId/videoId)"
+PLAYLIST_PUBLISHED = "nextPageToken,items/snippet/publishedAt"
+PLAYLIST_VIDEO_IDS = "nextPageToken,items/contentDetails/videoId"
+# ID и дата публикации: из той же страницы берется и теплокарта последних видео
+PLAYLIST_RECENT = "nextPageToken,items/contentDetails(videoId,videoPublishedAt)"
+# Проверка новых загрузок: etag нужен для условных запросов (If-None-Match)
+PLAYLIST_LATEST = "etag,items/snippet(publishedAt,title,resourceId/videoId)"
+
+# commentThreads.list — только верхнеуровневые комментарии, без ответов
+COMMENT_THREADS = (
+    "nextPageToken,"
+    "items/snippet(totalReplyCount,topLevelComment/snippet(textDisplay,authorDisplayName,likeCount,publishedAt))"
+)
+
+# videos.list
+VIDEO_DETAILS = (
+    "items(id,"
+    "snippet(title,publishedAt,categoryId,description,tags,channelId,channelTitle,"
+    "thumbnails(maxres/url,standard/url,high/url,medium/url,default/url)),"
+    "statistics(viewCount,likeCount,commentCount))"
+)
+VIDEO_STATISTICS = "items(id,statistics(viewCount,likeCount,commentCount))"
+# Статистика + длительность (Shorts / длинные) в том же запросе: part=statistics,contentDetails
+VIDEO_STATS_DURATION = "items(id,statistics(viewCount,likeCount,commentCount),contentDetails/duration)"
+# Корпус для ключевых слов: название, теги и просмотры
+VIDEO_KEYWORDS = "items(id,snippet(title,tags,channelId,publishedAt),statistics/viewCount)"
+
+# channels.list
+CHANNEL_DETAILS = "items(id,snippet(title,publishedAt),statistics(viewCount,subscriberCount,videoCount))"
+CHANNEL_UPLOADS = "items(id,contentDetails/relatedPlaylists/uploads)"
+# Сравнение каналов: статистика и плейлист загрузок одним запросом
+CHANNEL_COMPARE = ("items(id,snippet(title,publishedAt),statistics(viewCount,subscriberCount,videoCount),"
+                   "contentDetails/relatedPlaylists/uploads)")
+CHANNEL_ID = "items/id"
+
+# search.list
+SEARCH_CHANNEL_ID = "items/snippet/channelId"
+SEARCH_VIDEO_ID = "items/id/videoId"
+
+# videoCategories.list
+CATEGORY_TITLES = "items(id,snippet/title)"
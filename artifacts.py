@@ -0,0 +1,31 @@
+# artifacts.py
+
+import secrets
+
+from cache_store import make_cache
+
+
+class ArtifactStore:
+    """
+    Короткоживущее хранилище промежуточных результатов анализа (списки статистики,
+    ID плейлиста загрузок, даты публикаций). Результат сохраняется под коротким
+    токеном, который передается в callback_data кнопок под отчетом: кнопка берет
+    готовые данные и не ходит в YouTube API. Если токен истек, обработчик кнопки
+    пересобирает данные как раньше.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self._entries = make_cache("artifacts", ttl=ttl, max_size=max_size)
+        self.stats = {"saved": 0, "hits": 0, "misses": 0}
+
+    def put(self, artifact: dict) -> str:
+        # 8 символов из [A-Za-z0-9_-]: без ":", помещается в лимит callback_data (64 байта)
+        token = secrets.token_urlsafe(6)
+        self._entries.set(token, artifact)
+        self.stats["saved"] += 1
+        return token
+
+    def get(self, token: str | None) -> dict | None:
+        artifact = self._entries.get(token) if token else None
+        self.stats["hits" if artifact is not None else "misses"] += 1
+        return artifact
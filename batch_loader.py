@@ -0,0 +1,82 @@
+# batch_loader.py
+
+import asyncio
+import contextvars
+
+import deadline
+
+
+class BatchLoader:
+    """
+    Коалесцер запросов в стиле DataLoader.
+    Собирает запросы по отдельным ID от параллельных обработчиков в течение
+    короткого окна (несколько миллисекунд) и отправляет один пакетный запрос
+    на до `max_batch_size` ID. Каждый вызывающий получает свой результат.
+
+    batch_fn — корутина, принимающая список ID и возвращающая {id: элемент}.
+    Для ID, которых нет в ответе, вызывающий получает None.
+
+    Пачка общая для разных обработчиков, поэтому выполняется в чистом контексте
+    (без срока deadline того, кто ее запустил), а бюджет каждого вызывающего
+    ограничивает только его собственное ожидание.
+    """
+
+    def __init__(self, batch_fn, max_batch_size: int = 50, window: float = 0.005):
+        self._batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self._pending = {}  # id -> [Future, ...] (одинаковые ID запрашиваются один раз)
+        self._flush_handle = None
+        self.stats = {"loads": 0, "batches": 0, "ids_requested": 0}
+
+    async def load(self, key: str):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(key, []).append(future)
+        self.stats["loads"] += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._dispatch, context=contextvars.Context())
+
+        try:
+            # shield: по истечении своего бюджета вызывающий уходит, а пачка продолжается для остальных
+            return await asyncio.wait_for(asyncio.shield(future), deadline.remaining())
+        except asyncio.TimeoutError as e:
+            if isinstance(e, deadline.DeadlineExceeded):
+                raise
+            raise deadline.DeadlineExceeded(f"{key}: бюджет обработчика исчерпан") from e
+
+    async def load_many(self, keys: list) -> list:
+        return await asyncio.gather(*(self.load(key) for key in keys))
+
+    def _dispatch(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        pending, self._pending = self._pending, {}
+        keys = list(pending)
+        for i in range(0, len(keys), self.max_batch_size):
+            batch = {key: pending[key] for key in keys[i:i + self.max_batch_size]}
+            # Задача копирует текущий контекст — запускаем ее из пустого
+            contextvars.Context().run(asyncio.ensure_future, self._run_batch(batch))
+
+    async def _run_batch(self, batch: dict):
+        self.stats["batches"] += 1
+        self.stats["ids_requested"] += len(batch)
+        try:
+            results = await self._batch_fn(list(batch))
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                        future.exception()  # вызывающий мог уйти по своему сроку: без "never retrieved"
+            return
+
+        for key, futures in batch.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(results.get(key))
@@ -0,0 +1,110 @@
+# bench_charts.py
+
+"""
+Бенчмарк графиков: прежний рендер (tight_layout + bbox_inches='tight',
+полноразмерный PNG, новая фигура на каждый вызов) против шаблонного
+рендера channel_graphics во всех форматах.
+
+Печатает медианное время рендера и размер файла, который уходит в Telegram.
+
+Запуск:
+    python bench_charts.py [кол-во повторов]
+"""
+
+import io
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:bench")
+os.environ.setdefault("YOUTUBE_API_KEY", "bench")
+
+import numpy as np
+
+import channel_graphics
+from channel_graphics import plt
+
+
+def legacy_activity(views_list, likes_list, comments_list):
+    labels = [f"Видео {i}" for i in range(1, len(views_list) + 1)]
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
+    ax1.bar(labels, views_list, color='skyblue')
+    ax1.set_title(f'Просмотры {len(views_list)} последних видео', fontsize=16)
+    ax1.grid(axis='y', linestyle='--', alpha=0.7)
+    for i, v in enumerate(views_list):
+        ax1.text(i, v + (max(views_list) * 0.01), f"{v:,}".replace(',', '.'), ha='center', color='black')
+    x = np.arange(len(labels))
+    ax2.bar(x - 0.175, likes_list, 0.35, label='Лайки', color='green')
+    ax2.bar(x + 0.175, comments_list, 0.35, label='Комментарии', color='orange')
+    ax2.set_xticks(x, labels)
+    ax2.legend()
+    plt.setp(ax1.get_xticklabels(), rotation=15, ha="right")
+    plt.setp(ax2.get_xticklabels(), rotation=15, ha="right")
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buffer
+
+
+def legacy_heatmap(grid, title="Теплокарта", tz_name="UTC"):
+    fig, ax = plt.subplots(figsize=(16, 6))
+    im = ax.imshow(grid, cmap="Greens")
+    ax.set_xticks(np.arange(24), channel_graphics.HOURS)
+    ax.set_yticks(np.arange(7), channel_graphics.DAYS)
+    for i in range(7):
+        for j in range(24):
+            if grid[i, j] > 0:
+                color = "white" if grid[i, j] > grid.max() / 2 else "black"
+                ax.text(j, i, int(grid[i, j]), ha="center", va="center", color=color)
+    ax.set_title(title)
+    ax.set_xlabel(f"Время суток ({tz_name})")
+    fig.colorbar(im, ax=ax, label="Кол-во видео")
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buffer
+
+
+def measure(fn, repeats: int) -> tuple[float, int]:
+    fn()  # прогрев: шрифты, шаблон фигуры
+    timings, size = [], 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        buffer = fn()
+        timings.append(time.perf_counter() - start)
+        size = len(buffer.getvalue())
+    return statistics.median(timings) * 1000, size
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    rng = np.random.default_rng(0)
+    grid = rng.poisson(3, size=(7, 24))
+    views = rng.integers(1_000, 1_000_000, size=10).tolist()
+    likes = rng.integers(10, 10_000, size=10).tolist()
+    comments = rng.integers(0, 1_000, size=10).tolist()
+
+    charts = [
+        ("Теплокарта 7x24",
+         lambda: legacy_heatmap(grid),
+         lambda fmt: channel_graphics.create_heatmap_graph(grid, title="Теплокарта", image_format=fmt)),
+        ("Активность, 10 видео",
+         lambda: legacy_activity(views, likes, comments),
+         lambda fmt: channel_graphics.create_activity_graphs(views, likes, comments, image_format=fmt)),
+    ]
+
+    print(f"{'График':<24}{'Рендер':<22}{'Время, мс':>12}{'Размер, КБ':>14}")
+    print("-" * 72)
+    for name, legacy, fast in charts:
+        ms, size = measure(legacy, repeats)
+        print(f"{name:<24}{'прежний (PNG)':<22}{ms:>12.1f}{size / 1024:>14.1f}")
+        for image_format in ("png", "jpeg", "webp"):
+            ms, size = measure(lambda: fast(image_format), repeats)
+            print(f"{'':<24}{'шаблон (' + image_format + ')':<22}{ms:>12.1f}{size / 1024:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
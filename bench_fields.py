@@ -0,0 +1,110 @@
+# bench_fields.py
+
+"""
+Бенчмарк partial responses (`fields`) для YouTube Data API.
+
+Для сценариев бота (выгрузка названий, теплокарта, статистика, карточка видео)
+делает одинаковые запросы без маски и с маской из api_fields и печатает
+объем ответа (по сети и после распаковки) и время разбора JSON.
+
+Запуск:
+    YOUTUBE_API_KEY=... python bench_fields.py UC_x5XG1OV2P6uZZ5FSM9Ttw [кол-во страниц]
+"""
+
+import json
+import os
+import statistics
+import sys
+import time
+
+import httpx
+from dotenv import load_dotenv
+
+import api_fields
+
+API_URL = "https://www.googleapis.com/youtube/v3"
+PARSE_REPEATS = 20
+
+
+def fetch(client: httpx.Client, resource: str, params: dict) -> tuple[int, bytes]:
+    response = client.get(f"{API_URL}/{resource}", params=params)
+    response.raise_for_status()
+    return response.num_bytes_downloaded, response.content
+
+
+def parse_time_ms(body: bytes) -> float:
+    timings = []
+    for _ in range(PARSE_REPEATS):
+        start = time.perf_counter()
+        json.loads(body)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def run_scenario(client: httpx.Client, name: str, resource: str, params: dict, fields: str, pages: int = 1) -> dict:
+    result = {"name": name}
+    for label, extra in (("full", {}), ("masked", {"fields": fields})):
+        wire, raw, parse_ms = 0, 0, 0.0
+        page_token = None
+        for _ in range(pages):
+            page_params = dict(params, **extra)
+            if page_token:
+                page_params["pageToken"] = page_token
+            downloaded, body = fetch(client, resource, page_params)
+            wire += downloaded
+            raw += len(body)
+            parse_ms += parse_time_ms(body)
+            page_token = json.loads(body).get("nextPageToken")
+            if not page_token:
+                break
+        result[label] = {"wire": wire, "raw": raw, "parse_ms": parse_ms}
+    return result
+
+
+def print_report(results: list):
+    header = f"{'Сценарий':<22}{'Сеть, КБ':>18}{'JSON, КБ':>20}{'Разбор, мс':>20}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        full, masked = r["full"], r["masked"]
+        print(
+            f"{r['name']:<22}"
+            f"{full['wire'] / 1024:>8.1f} → {masked['wire'] / 1024:<7.1f}"
+            f"{full['raw'] / 1024:>10.1f} → {masked['raw'] / 1024:<7.1f}"
+            f"{full['parse_ms']:>10.2f} → {masked['parse_ms']:<7.2f}"
+        )
+        print(f"{'':<22}доля данных после маски: {masked['raw'] / full['raw']:.1%}")
+
+
+def main():
+    load_dotenv()
+    api_key = os.getenv("YOUTUBE_API_KEY")
+    if not api_key or len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    channel_id = sys.argv[1]
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    uploads_id = "UU" + channel_id[2:]
+
+    with httpx.Client(params={"key": api_key}, timeout=30) as client:
+        playlist = {"part": "snippet", "playlistId": uploads_id, "maxResults": 50}
+        _, first_page = fetch(client, "playlistItems", dict(playlist, fields="items/snippet/resourceId/videoId"))
+        video_ids = ",".join(item["snippet"]["resourceId"]["videoId"] for item in json.loads(first_page)["items"])
+
+        results = [
+            run_scenario(client, "Все названия", "playlistItems", playlist, api_fields.PLAYLIST_TITLES, pages),
+            run_scenario(client, "Теплокарта", "playlistItems", playlist, api_fields.PLAYLIST_PUBLISHED, pages),
+            run_scenario(client, "ID для статистики", "playlistItems",
+                         dict(playlist, part="contentDetails"), api_fields.PLAYLIST_VIDEO_IDS, pages),
+            run_scenario(client, "Статистика 50 видео", "videos",
+                         {"part": "statistics", "id": video_ids}, api_fields.VIDEO_STATISTICS),
+            run_scenario(client, "Карточки 50 видео", "videos",
+                         {"part": "snippet,statistics", "id": video_ids}, api_fields.VIDEO_DETAILS),
+        ]
+
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
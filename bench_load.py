@@ -0,0 +1,555 @@
+# bench_load.py
+
+"""
+Нагрузочный прогон бота целиком, без сети.
+
+Собирает настоящий Dispatcher из main.py: обновления идут через dp.feed_update,
+фоновые задачи — через настоящую JobQueue. Вместо внешних сервисов — локальные
+заглушки с настраиваемой задержкой:
+  - Telegram: фейковая сессия бота, считает исходящие запросы и запоминает
+    инлайн-кнопки, чтобы сценарий мог их "нажать";
+  - YouTube Data API: детерминированные каналы и видео (запросы выполняются
+    в пуле потоков, как и настоящие);
+  - RYD, restcountries, i.ytimg.com и лента загрузок feeds/videos.xml: httpx.MockTransport;
+  - Google Trends: подмена TrendReq с pandas-таблицами.
+
+Проигрывает синтетические сценарии пользователей (ссылка на видео + кнопки,
+ссылка на канал + графики, сессия анализа ниши, выгрузка названий, тренды)
+и печатает пропускную способность, p50/p99 по обработчикам, задачам и сценариям,
+задержку event loop и рост памяти.
+
+Токены не нужны, базы и сессии ниш создаются во временной папке.
+
+Запуск:
+    python bench_load.py [--users 300] [--concurrency 50] [--yt-latency 0.08]
+                         [--tg-latency 0.03] [--no-throttle] [--seed 1]
+"""
+
+import argparse
+import asyncio
+import datetime
+import gc
+import importlib
+import itertools
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import types as pytypes
+import typing
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Сценарии и их доли в потоке пользователей
+JOURNEYS = {"video": 35, "channel": 25, "niche": 15, "titles": 15, "trends": 10}
+NICHE_CHANNELS = 3
+JOB_TIMEOUT = 300
+LAG_INTERVAL = 0.01
+FIRST_USER_ID = 10_000
+
+
+def percentile(values: list, q: float) -> float:
+    import numpy as np
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def rss_mb() -> float:
+    """Текущий RSS процесса (Linux), иначе — пиковый."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+# --- Заглушка YouTube Data API ---
+
+def channel_id(index: int) -> str:
+    return f"UC{index:022d}"
+
+
+def video_id(channel_index: int, number: int) -> str:
+    return f"v{channel_index:04d}{number:06d}"
+
+
+class FakeRequest:
+    def __init__(self, handler, params: dict, latency: float):
+        self.handler, self.params, self.latency = handler, params, latency
+        self.postproc = None
+        self.headers = {}
+
+    def execute(self, http=None, num_retries=0):
+        time.sleep(self.latency)  # выполняется в пуле потоков, как настоящий запрос
+        return self.handler(**self.params)
+
+
+class FakeResource:
+    def __init__(self, api: "FakeYouTube", name: str):
+        self.api, self.name = api, name
+
+    def list(self, **params):
+        with self.api.lock:
+            self.api.calls[self.name] += 1
+        return FakeRequest(getattr(self.api, f"_{self.name}"), params, self.api.latency)
+
+
+class FakeYouTube:
+    """Детерминированные каналы: у канала N — videos_per_channel видео, по одному в ~3 дня."""
+
+    def __init__(self, latency: float, videos_per_channel: int):
+        self.latency = latency
+        self.videos_per_channel = videos_per_channel
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+
+    def __getattr__(self, name):
+        if name in ("channels", "playlistItems", "videos", "videoCategories", "search", "commentThreads"):
+            return lambda: FakeResource(self, name)
+        raise AttributeError(name)
+
+    def _published(self, channel_index: int, number: int) -> str:
+        moment = self.now - datetime.timedelta(hours=71 * number + channel_index % 24)
+        return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def _channel_item(self, cid: str) -> dict:
+        index = int(cid[2:])
+        return {
+            "id": cid,
+            "snippet": {"title": f"Канал {index}", "publishedAt": "2016-03-01T00:00:00Z", "country": "US"},
+            "statistics": {"viewCount": str(10 ** 6 * (index % 50 + 1)), "subscriberCount": str(1000 * (index % 300)),
+                           "videoCount": str(self.videos_per_channel)},
+            "contentDetails": {"relatedPlaylists": {"uploads": "UU" + cid[2:]}},
+        }
+
+    def _channels(self, id: str = None, forUsername: str = None, forHandle: str = None, **_):
+        ids = id.split(",") if id else [channel_id(abs(hash(forUsername or forHandle)) % 5000)]
+        return {"items": [self._channel_item(cid) for cid in ids if cid.startswith("UC")]}
+
+    def _playlistItems(self, playlistId: str, maxResults: int = 50, pageToken: str = None, **_):
+        index = int(playlistId[2:])
+        start = int(pageToken or 0)
+        stop = min(start + maxResults, self.videos_per_channel)
+        items = []
+        for number in range(start, stop):
+            vid, published = video_id(index, number), self._published(index, number)
+            items.append({
+                "snippet": {"title": f"Видео {number} про майнкрафт и выживание", "publishedAt": published,
+                            "resourceId": {"videoId": vid}},
+                "contentDetails": {"videoId": vid, "videoPublishedAt": published},
+            })
+        response = {"items": items}
+        if stop < self.videos_per_channel:
+            response["nextPageToken"] = str(stop)
+        return response
+
+    def _videos(self, id: str, **_):
+        items = []
+        for vid in id.split(","):
+            index, number = int(vid[1:5]), int(vid[5:])
+            rng = random.Random(vid)
+            items.append({
+                "id": vid,
+                "snippet": {"title": f"Видео {number} про майнкрафт", "publishedAt": self._published(index, number),
+                            "channelId": channel_id(index), "channelTitle": f"Канал {index}",
+                            "description": "Описание видео со ссылкой https://example.com и #тегами",
+                            "tags": ["майнкрафт", "выживание", f"серия {number}"], "categoryId": "20",
+                            "countryCode": "US", "thumbnails": {}},
+                "statistics": {"viewCount": str(rng.randint(100, 10 ** 6)), "likeCount": str(rng.randint(0, 10 ** 4)),
+                               "commentCount": str(rng.randint(0, 500))},
+                "contentDetails": {"duration": rng.choice(["PT45S", "PT8M12S", "PT21M", "PT1H3M"])},
+            })
+        return {"items": items}
+
+    def feed_xml(self, cid: str) -> bytes:
+        """Лента загрузок канала, как feeds/videos.xml: 15 последних видео."""
+        with self.lock:
+            self.calls["feed"] += 1
+        index = int(cid[2:])
+        entries = "".join(
+            f"<entry><id>yt:video:{video_id(index, number)}</id><yt:videoId>{video_id(index, number)}</yt:videoId>"
+            f"<yt:channelId>{cid}</yt:channelId><title>Видео {number} про майнкрафт</title>"
+            f"<published>{self._published(index, number).replace('Z', '+00:00')}</published></entry>"
+            for number in range(min(15, self.videos_per_channel))
+        )
+        return ('<?xml version="1.0" encoding="UTF-8"?><feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" '
+                f'xmlns="http://www.w3.org/2005/Atom"><title>Канал {index}</title>{entries}</feed>').encode()
+
+    def _videoCategories(self, **_):
+        return {"items": [{"id": "20", "snippet": {"title": "Gaming"}}]}
+
+    def _search(self, channelId: str = None, q: str = None, type: str = "video", **_):
+        index = int(channelId[2:]) if channelId else abs(hash(q)) % 5000
+        if type == "channel":
+            return {"items": [{"snippet": {"channelId": channel_id(index)}, "id": {"channelId": channel_id(index)}}]}
+        return {"items": [{"snippet": {"channelId": channel_id(index)}, "id": {"videoId": video_id(index, 1)}}]}
+
+    def _commentThreads(self, **_):
+        return {"items": []}
+
+
+# --- Заглушки HTTP-сервисов и Google Trends ---
+
+def mock_transport(latency: float, youtube: FakeYouTube | None = None):
+    import httpx
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        host, path = request.url.host, request.url.path
+        if host == "returnyoutubedislikeapi.com" or path.startswith("/votes"):
+            return httpx.Response(200, json={"dislikes": 42})
+        if host == "restcountries.com":
+            return httpx.Response(200, json=[{"name": {"common": "United States"}}])
+        if youtube is not None and path == "/feeds/videos.xml":
+            return httpx.Response(200, content=youtube.feed_xml(request.url.params["channel_id"]))
+        if host == "i.ytimg.com":
+            return httpx.Response(200, content=b"" if request.method == "HEAD" else b"\xff\xd8" + b"0" * 30_000)
+        return httpx.Response(404)
+
+    return httpx.MockTransport(handler)
+
+
+def fake_trend_req(latency: float):
+    import pandas as pd
+
+    class FakeTrendReq:
+        def __init__(self, *args, **kwargs):
+            self.keyword = None
+
+        def build_payload(self, kw_list, **kwargs):
+            time.sleep(latency)
+            self.keyword = kw_list[0]
+
+        def interest_over_time(self):
+            time.sleep(latency)
+            rng = random.Random(self.keyword)
+            index = pd.date_range(end=datetime.date.today(), periods=90)
+            return pd.DataFrame({self.keyword: [rng.randint(0, 100) for _ in index]}, index=index)
+
+        def interest_by_region(self, resolution="COUNTRY"):
+            time.sleep(latency)
+            return pd.DataFrame({self.keyword: [80, 55, 30]}, index=["United States", "Russia", "Brazil"])
+
+        def related_queries(self):
+            time.sleep(latency)
+            top = pd.DataFrame({"query": [f"{self.keyword} {i}" for i in range(10)], "value": range(100, 0, -10)})
+            return {self.keyword: {"top": top, "rising": None}}
+
+    return FakeTrendReq
+
+
+# --- Фейковый Telegram ---
+
+def make_session_class():
+    from aiogram import types
+    from aiogram.client.session.base import BaseSession
+
+    class FakeTelegramSession(BaseSession):
+        """Отвечает на любой метод Bot API без сети и записывает, что бот отправил."""
+
+        def __init__(self, latency: float):
+            super().__init__()
+            self.latency = latency
+            self.calls = Counter()
+            self.error_replies = Counter()
+            self.buttons = defaultdict(list)  # chat_id -> callback_data инлайн-кнопок по порядку
+            self._message_ids = itertools.count(1_000_000)
+
+        async def make_request(self, bot, method, timeout=None):
+            self.calls[type(method).__name__] += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            chat_id = getattr(method, "chat_id", None)
+            text = getattr(method, "text", None) or getattr(method, "caption", None)
+            if isinstance(text, str) and text.startswith("❌"):
+                self.error_replies[text[:60]] += 1
+            markup = getattr(method, "reply_markup", None)
+            if isinstance(markup, types.InlineKeyboardMarkup) and chat_id is not None:
+                self.buttons[chat_id].extend(
+                    button.callback_data for row in markup.inline_keyboard for button in row if button.callback_data
+                )
+
+            returning = method.__returning__
+            if returning is types.Message or types.Message in typing.get_args(returning):
+                message_id = getattr(method, "message_id", None) or next(self._message_ids)
+                return types.Message(message_id=message_id, date=datetime.datetime.now(),
+                                     chat=types.Chat(id=chat_id or 0, type="private"), text=text).as_(bot)
+            if typing.get_origin(returning) is list:
+                return []
+            return True
+
+        async def stream_content(self, *args, **kwargs):
+            yield b""
+
+        async def close(self):
+            pass
+
+    return FakeTelegramSession
+
+
+# --- Измерения ---
+
+class Recorder:
+    def __init__(self):
+        self.handlers = defaultdict(list)
+        self.jobs = defaultdict(list)
+        self.journeys = defaultdict(list)
+        self.failures = Counter()
+        self.lag = []
+        self.updates = 0
+
+    def reset(self):
+        self.__init__()
+
+
+def make_handler_timer(recorder: Recorder):
+    from aiogram import BaseMiddleware
+
+    class HandlerTimer(BaseMiddleware):
+        """Внутренний middleware: к этому моменту обработчик уже выбран фильтрами."""
+
+        async def __call__(self, handler, event, data):
+            name = data["handler"].callback.__name__
+            start = time.perf_counter()
+            try:
+                return await handler(event, data)
+            finally:
+                recorder.handlers[name].append(time.perf_counter() - start)
+
+    return HandlerTimer()
+
+
+async def watch_loop_lag(recorder: Recorder):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        recorder.lag.append(time.perf_counter() - start - LAG_INTERVAL)
+
+
+# --- Синтетические пользователи ---
+
+class User:
+    _update_ids = itertools.count(1)
+
+    def __init__(self, harness: "Harness", user_id: int):
+        self.h = harness
+        self.id = user_id
+        self.chat = {"id": user_id, "type": "private"}
+        self.sender = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+    async def _feed(self, payload: dict):
+        from aiogram import types
+        update = types.Update.model_validate(dict(payload, update_id=next(self._update_ids)))
+        self.h.recorder.updates += 1
+        await self.h.app.dp.feed_update(self.h.app.bot, update)
+
+    async def send(self, text: str):
+        message = {"message_id": next(self._update_ids), "date": int(time.time()), "text": text,
+                   "chat": self.chat, "from": self.sender}
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        await self._feed({"message": message})
+
+    async def press(self, prefix: str) -> bool:
+        """Нажимает последнюю присланную кнопку, callback_data которой начинается с prefix."""
+        data = next((d for d in reversed(self.h.session.buttons[self.id]) if d.startswith(prefix)), None)
+        if data is None:
+            self.h.recorder.failures[f"нет кнопки {prefix}"] += 1
+            return False
+        await self._feed({"callback_query": {
+            "id": str(next(self._update_ids)), "from": self.sender, "chat_instance": str(self.id), "data": data,
+            "message": {"message_id": 1, "date": int(time.time()), "chat": self.chat, "text": "report"},
+        }})
+        return True
+
+    async def wait_job(self):
+        event = self.h.job_done[self.id]
+        try:
+            await asyncio.wait_for(event.wait(), JOB_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.h.recorder.failures["задача не завершилась"] += 1
+        event.clear()
+
+    # Сценарии
+
+    async def video(self, rng: random.Random):
+        await self.send(f"https://youtu.be/{video_id(rng.randrange(5000), rng.randrange(self.h.args.videos))}")
+        await self.press("download_meta:")
+        await self.press("download_thumb:")
+
+    async def channel(self, rng: random.Random):
+        await self.send(f"https://www.youtube.com/channel/{channel_id(rng.randrange(5000))}")
+        await self.press("show_graphs:")
+        await self.press("show_heatmap:")
+
+    async def niche(self, rng: random.Random):
+        await self.send("/excel")
+        await self.send(f"Ниша {self.id}")
+        for _ in range(NICHE_CHANNELS):
+            await self.send(f"https://www.youtube.com/channel/{channel_id(rng.randrange(5000))}")
+        await self.send("💾 Готово и Скачать")
+        await self.wait_job()
+
+    async def titles(self, rng: random.Random):
+        await self.send("/get_titles")
+        await self.send(f"https://www.youtube.com/channel/{channel_id(rng.randrange(5000))}")
+        await self.wait_job()
+
+    async def trends(self, rng: random.Random):
+        await self.send("/google_trends")
+        await self.send(f"майнкрафт {rng.randrange(100)}")
+
+
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        self.recorder = Recorder()
+        self.job_done = defaultdict(asyncio.Event)
+
+    def setup(self):
+        """Импортирует main с временными базами и подменяет внешние зависимости."""
+        workdir = tempfile.mkdtemp(prefix="bench_load_")
+        os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:bench")
+        os.environ.setdefault("YOUTUBE_API_KEY", "bench")
+        for name, filename in (("JOB_DB_PATH", "jobs.db"), ("WATCH_DB_PATH", "watch.db"),
+                               ("SEARCH_DB_PATH", "search.db"), ("NICHE_SESSION_DIR", "niche_sessions")):
+            os.environ[name] = os.path.join(workdir, filename)
+        sys.path.insert(0, ROOT)
+        self.app = app = importlib.import_module("main")
+
+        import httpx
+        import trends_analyzer
+
+        self.youtube = FakeYouTube(self.args.yt_latency, self.args.videos)
+        transport = mock_transport(self.args.http_latency, self.youtube)
+        app.youtube_analyzer._youtube = self.youtube
+        app.youtube_analyzer.feed_client = httpx.AsyncClient(transport=transport)
+        app.youtube_analyzer.ryd_client = httpx.AsyncClient(base_url="https://returnyoutubedislikeapi.com",
+                                                            transport=transport)
+        app.thumbnail_fetcher.client = httpx.AsyncClient(transport=transport)
+        # get_country_info создает клиента на каждый вызов — подменяем фабрику в пространстве имен main
+        app.httpx = pytypes.SimpleNamespace(
+            AsyncClient=lambda **kwargs: httpx.AsyncClient(transport=transport, **kwargs),
+            HTTPError=httpx.HTTPError
+        )
+        trends_analyzer.TrendReq = fake_trend_req(self.args.yt_latency)
+
+        self.session = make_session_class()(self.args.tg_latency)
+        if not self.args.no_throttle:
+            self.session.middleware(app.send_throttle)
+        app.bot.session = self.session
+
+        timer = make_handler_timer(self.recorder)
+        app.dp.message.middleware(timer)
+        app.dp.callback_query.middleware(timer)
+        for kind, fn in list(app.job_queue._handlers.items()):
+            app.job_queue._handlers[kind] = self._timed_job(kind, fn)
+
+    def _timed_job(self, kind: str, fn):
+        async def timed(ctx, **params):
+            start = time.perf_counter()
+            try:
+                await fn(ctx, **params)
+            finally:
+                self.recorder.jobs[kind].append(time.perf_counter() - start)
+                self.job_done[ctx.chat_id].set()
+        return timed
+
+    async def run_journey(self, user: User, name: str, rng: random.Random):
+        start = time.perf_counter()
+        try:
+            await getattr(user, name)(rng)
+            self.recorder.journeys[name].append(time.perf_counter() - start)
+        except Exception as e:
+            self.recorder.failures[f"{name}: {type(e).__name__}: {str(e)[:80]}"] += 1
+
+    async def run(self):
+        self.setup()
+        await self.app.job_queue.start(self.app.bot)
+        rng = random.Random(self.args.seed)
+        names, weights = zip(*JOURNEYS.items())
+
+        # Прогрев: первый проход каждого сценария подгружает matplotlib, pandas, openpyxl
+        print("Прогрев...", flush=True)
+        for offset, name in enumerate(names):
+            await self.run_journey(User(self, FIRST_USER_ID - 1 - offset), name, random.Random(offset))
+        self.recorder.reset()
+        self.session.calls.clear()
+        self.session.error_replies.clear()
+        self.youtube.calls.clear()
+        gc.collect()
+        rss_start = rss_mb()
+
+        lag_task = asyncio.create_task(watch_loop_lag(self.recorder))
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def one_user(index: int):
+            journey = rng.choices(names, weights)[0]
+            user_rng = random.Random(rng.random())
+            async with semaphore:
+                await self.run_journey(User(self, FIRST_USER_ID + index), journey, user_rng)
+
+        print(f"Сценариев: {self.args.users}, одновременно: {self.args.concurrency}", flush=True)
+        start = time.perf_counter()
+        await asyncio.gather(*(one_user(i) for i in range(self.args.users)))
+        elapsed = time.perf_counter() - start
+        lag_task.cancel()
+
+        gc.collect()
+        self.report(elapsed, rss_start, rss_mb())
+
+    def report(self, elapsed: float, rss_start: float, rss_end: float):
+        r = self.recorder
+        done = sum(len(v) for v in r.journeys.values())
+        outbound = sum(self.session.calls.values())
+        print(f"\nЗа {elapsed:.1f} с: {done / elapsed:.1f} сценариев/с, {r.updates / elapsed:.1f} обновлений/с, "
+              f"{outbound / elapsed:.1f} запросов к Telegram/с")
+
+        def table(title: str, rows: dict):
+            print(f"\n{title:<34}{'кол-во':>8}{'p50, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+            print("-" * 72)
+            for name, values in sorted(rows.items(), key=lambda kv: -percentile(kv[1], 99)):
+                print(f"{name:<34}{len(values):>8}{percentile(values, 50) * 1000:>10.0f}"
+                      f"{percentile(values, 99) * 1000:>10.0f}{max(values) * 1000:>10.0f}")
+
+        table("Сценарий", r.journeys)
+        table("Обработчик", r.handlers)
+        table("Фоновая задача", r.jobs)
+
+        print(f"\nЗадержка event loop: p50 {percentile(r.lag, 50) * 1000:.1f} мс, "
+              f"p99 {percentile(r.lag, 99) * 1000:.1f} мс, max {max(r.lag, default=0) * 1000:.0f} мс")
+        print(f"Память (RSS): {rss_start:.0f} → {rss_end:.0f} МБ ({rss_end - rss_start:+.0f} МБ), "
+              f"пик {peak_rss_mb():.0f} МБ")
+        print("\nИсходящие запросы к Telegram: " + ", ".join(f"{k} {v}" for k, v in self.session.calls.most_common()))
+        print("Запросы к YouTube API: " + ", ".join(f"{k} {v}" for k, v in self.youtube.calls.most_common()))
+        if not self.args.no_throttle:
+            print(f"Троттлинг Telegram: {self.app.send_throttle.stats}")
+        if r.failures or self.session.error_replies:
+            print("\nОшибки:")
+            for text, count in (r.failures + self.session.error_replies).most_common(10):
+                print(f"  {count:>5} × {text}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота с фейковыми Telegram и YouTube")
+    parser.add_argument("--users", type=int, default=300, help="сколько сценариев проиграть")
+    parser.add_argument("--concurrency", type=int, default=50, help="сколько пользователей активны одновременно")
+    parser.add_argument("--videos", type=int, default=300, help="видео на канале (страницы выгрузок)")
+    parser.add_argument("--yt-latency", type=float, default=0.08, help="задержка YouTube API и Trends, с")
+    parser.add_argument("--http-latency", type=float, default=0.05, help="задержка RYD, restcountries, i.ytimg.com, с")
+    parser.add_argument("--tg-latency", type=float, default=0.03, help="задержка Bot API, с")
+    parser.add_argument("--no-throttle", action="store_true", help="без лимитов Telegram (SendThrottle)")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(Harness(parse_args()).run())
@@ -0,0 +1,130 @@
+# bench_startup.py
+
+"""
+Бенчмарк холодного старта бота.
+
+1. Время импорта по модулям: `python -X importtime -c "import main"`,
+   печатает самые дорогие модули (кумулятивно) и отмечает тяжелые
+   подсистемы, которые при старте загружаться не должны.
+2. Время до первого обработанного обновления: новый процесс импортирует
+   main, получает /start и отвечает на него через фейковую сессию Telegram
+   (без сети). Замер — от запуска интерпретатора до отправки ответа.
+
+Токены не нужны: если их нет в окружении, подставляются фиктивные.
+
+Запуск:
+    python bench_startup.py [кол-во прогонов]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TOP_MODULES = 15
+# Подсистемы, которые должны подгружаться лениво или фоновым прогревом
+HEAVY_MODULES = ("matplotlib", "pandas", "pytrends", "openpyxl", "googleapiclient")
+
+FIRST_UPDATE_SCRIPT = r"""
+import asyncio, datetime, sys
+sys.path.insert(0, ROOT)
+import main
+from aiogram import types
+from aiogram.client.session.base import BaseSession
+
+
+class FakeSession(BaseSession):
+    async def make_request(self, bot, method, timeout=None):
+        if method.__returning__ is types.Message:
+            return types.Message(message_id=1, date=datetime.datetime.now(),
+                                 chat=types.Chat(id=1, type="private")).as_(bot)
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+async def run():
+    main.bot.session = FakeSession()
+    update = types.Update.model_validate({
+        "update_id": 1,
+        "message": {
+            "message_id": 1, "date": 0, "text": "/start",
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "bench"},
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    })
+    await main.dp.feed_update(main.bot, update)
+    print("HANDLED", flush=True)
+
+asyncio.run(run())
+"""
+
+
+def bench_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("TELEGRAM_BOT_TOKEN", "123456:bench")
+    env.setdefault("YOUTUBE_API_KEY", "bench")
+    return env
+
+
+def import_times() -> list:
+    """Список (модуль, собственное время, кумулятивное время, глубина) в микросекундах."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import sys; sys.path.insert(0, {ROOT!r}); import main"],
+        capture_output=True, text=True, env=bench_env(), cwd=ROOT
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def time_to_first_update() -> float:
+    """Секунды от запуска процесса до ответа на первое обновление."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", f"ROOT = {ROOT!r}\n" + FIRST_UPDATE_SCRIPT],
+        capture_output=True, text=True, env=bench_env(), cwd=ROOT
+    )
+    if "HANDLED" not in result.stdout:
+        raise RuntimeError(result.stderr[-2000:])
+    return time.perf_counter() - start
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    import_times()  # первый прогон компилирует .pyc — его не считаем
+    rows = import_times()
+    main_total = next(cumulative for name, _, cumulative, _ in rows if name == "main")
+    top_level = sorted((r for r in rows if r[3] <= 1), key=lambda r: r[2], reverse=True)
+
+    print(f"Импорт main: {main_total / 1000:.0f} мс\n")
+    print(f"{'Модуль':<40}{'Свое, мс':>12}{'Всего, мс':>12}")
+    print("-" * 64)
+    for name, self_us, cumulative_us, _ in top_level[:TOP_MODULES]:
+        print(f"{name:<40}{self_us / 1000:>12.1f}{cumulative_us / 1000:>12.1f}")
+
+    loaded = {name.split(".")[0] for name, *_ in rows}
+    print("\nТяжелые подсистемы при старте:")
+    for module in HEAVY_MODULES:
+        print(f"  {module:<20}{'загружен ❌' if module in loaded else 'не загружен ✅'}")
+
+    timings = [time_to_first_update() for _ in range(runs)]
+    print(f"\nДо первого обработанного обновления (/start): "
+          f"медиана {statistics.median(timings):.2f} с, min {min(timings):.2f} с за {runs} прогонов")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# cache_store.py
+
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+
+from config import SHARED_CACHE_PATH
+
+
+class TTLCache:
+    """
+    Простой in-memory кэш с временем жизни записей и ограничением размера.
+    При переполнении вытесняются давно не использованные записи (LRU).
+    """
+
+    def __init__(self, ttl: float, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float | None = None):
+        self._data[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return entry[1] if entry is not None else default
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SharedCache:
+    """
+    Кэш в общей SQLite-базе (режим WAL), видимый всем процессам бота.
+    В многопроцессном режиме ответы API и резолвы каналов, полученные одним
+    воркером, сразу доступны остальным. Интерфейс совпадает с TTLCache.
+    """
+
+    PRUNE_EVERY = 256  # как часто (в записях) вычищать просроченное и лишнее
+
+    def __init__(self, path: str, namespace: str, ttl: float, max_size: int = 1024):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_size = max_size
+        self._writes = 0
+        self.conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                value BLOB NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+
+    def get(self, key, default=None):
+        row = self.conn.execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?", (self.namespace, repr(key))
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return default
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl: float | None = None):
+        expires_at = time.time() + (ttl if ttl is not None else self.ttl)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, expires_at, value) VALUES (?, ?, ?, ?)",
+            (self.namespace, repr(key), expires_at, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune()
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self.conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, repr(key)))
+        return value
+
+    def _prune(self):
+        self.conn.execute("DELETE FROM cache WHERE namespace = ? AND expires_at < ?", (self.namespace, time.time()))
+        self.conn.execute("""
+            DELETE FROM cache WHERE namespace = ? AND key IN (
+                SELECT key FROM cache WHERE namespace = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.namespace, self.namespace, self.max_size))
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+
+
+def make_cache(namespace: str, ttl: float, max_size: int = 1024) -> TTLCache | SharedCache:
+    """
+    Кэш для указанного пространства имен: общий SQLite-кэш, если задан
+    SHARED_CACHE_PATH (многопроцессный режим), иначе обычный in-memory TTLCache.
+    """
+    if SHARED_CACHE_PATH:
+        return SharedCache(SHARED_CACHE_PATH, namespace, ttl, max_size)
+    return TTLCache(ttl, max_size)
@@ -1,113 +1,235 @@
 # channel_graphics.py
 
-import matplotlib.pyplot as plt
 import io
+import threading
 import numpy as np
+from PIL import Image
 
-# Настройка Matplotlib для работы без графического интерфейса
+# Настройка Matplotlib для работы без графического интерфейса:
+# бэкенд выбирается до импорта pyplot, чтобы не загружать интерактивный
 import matplotlib
 
 matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from config import CHART_DPI, CHART_FORMAT, CHART_QUALITY, CHART_PNG_COLORS
+
+DAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+HOURS = [f"{h:02d}" for h in range(24)]
+
+# Шаблоны фигур строятся один раз на процесс и переиспользуются:
+# оси, подписи и колорбар уже на месте, меняются только данные.
+# Раскладка фиксированная (subplots_adjust), без tight_layout и bbox_inches='tight',
+# которые заставляют matplotlib рисовать фигуру лишний раз.
+_templates = {}
+_render_lock = threading.Lock()
+
+
+def chart_extension() -> str:
+    """Расширение файла для текущего формата графиков (для имени файла в Telegram)."""
+    return "jpg" if CHART_FORMAT == "jpeg" else CHART_FORMAT
 
 
-def create_activity_graphs(views_list: list, likes_list: list, comments_list: list) -> io.BytesIO | None:
+def encode_figure(fig, image_format: str = CHART_FORMAT, dpi: int = CHART_DPI) -> io.BytesIO:
     """
-    Рисует 2 графика (Просмотры и Вовлеченность) для 10 последних видео.
-    Возвращает буфер с PNG изображением.
+    Растеризует фигуру и кодирует ее компактно:
+    png — палитровый PNG (CHART_PNG_COLORS цветов), jpeg / webp — с качеством CHART_QUALITY.
+    """
+    fig.set_dpi(dpi)
+    fig.canvas.draw()
+    image = Image.fromarray(np.asarray(fig.canvas.buffer_rgba())).convert("RGB")
+
+    buffer = io.BytesIO()
+    if image_format == "png":
+        image.quantize(colors=CHART_PNG_COLORS, method=Image.Quantize.MEDIANCUT).save(buffer, "PNG", optimize=True)
+    elif image_format == "jpeg":
+        image.save(buffer, "JPEG", quality=CHART_QUALITY, optimize=True)
+    elif image_format == "webp":
+        image.save(buffer, "WEBP", quality=CHART_QUALITY, method=4)
+    else:
+        raise ValueError(f"Неизвестный формат графика: {image_format}")
+    buffer.seek(0)
+    return buffer
+
+
+def _activity_template() -> dict:
+    template = _templates.get("activity")
+    if template is None:
+        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
+        fig.subplots_adjust(left=0.08, right=0.98, top=0.95, bottom=0.08, hspace=0.3)
+        template = _templates["activity"] = {"fig": fig, "axes": (ax1, ax2)}
+    return template
+
+
+def create_activity_graphs(views_list: list, likes_list: list, comments_list: list,
+                           outlier_flags: list | None = None, image_format: str = CHART_FORMAT) -> io.BytesIO | None:
+    """
+    Рисует 2 графика (Просмотры и Вовлеченность) для последних видео.
+    Видео-выбросы (outlier_flags) подсвечиваются другим цветом.
+    Возвращает буфер с изображением в формате image_format (по умолчанию CHART_FORMAT).
     """
     if not views_list:
         return None
 
-    # Номер видео (от 1 до 10) для оси X
+    # Номер видео для оси X
     video_numbers = range(1, len(views_list) + 1)
     labels = [f"Видео {i}" for i in video_numbers]
-
-    # Создаем 2 графика (один над другим)
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
-
-    # --- График 1: Просмотры (Столбчатая диаграмма) ---
-    ax1.bar(labels, views_list, color='skyblue')
-    ax1.set_title('Просмотры 10 последних видео', fontsize=16)
-    ax1.set_ylabel('Кол-во просмотров', fontsize=12)
-    ax1.grid(axis='y', linestyle='--', alpha=0.7)
-
-    # Добавляем цифры над столбцами
-    for i, v in enumerate(views_list):
-        ax1.text(i, v + (max(views_list) * 0.01), f"{v:,}".replace(',', '.'), ha='center', color='black')
-
-    # --- График 2: Вовлеченность (Лайки и Комментарии) ---
-    width = 0.35  # ширина столбцов
+    # При большой глубине подписи и цифры над столбцами становятся нечитаемыми
+    dense = len(labels) > 30
     x = np.arange(len(labels))  # координаты X
 
-    rects1 = ax2.bar(x - width / 2, likes_list, width, label='Лайки', color='green')
-    rects2 = ax2.bar(x + width / 2, comments_list, width, label='Комментарии', color='orange')
-
-    ax2.set_title('Вовлеченность (Лайки и Комментарии)', fontsize=16)
-    ax2.set_ylabel('Количество', fontsize=12)
-    ax2.set_xticks(x, labels)  # Устанавливаем метки X
-    ax2.legend()
-    ax2.grid(axis='y', linestyle='--', alpha=0.7)
-
-    # Улучшаем читаемость (поворачиваем метки X, если их много)
-    if len(labels) > 5:
-        plt.setp(ax1.get_xticklabels(), rotation=15, ha="right")
-        plt.setp(ax2.get_xticklabels(), rotation=15, ha="right")
-
-    fig.tight_layout()
-
-    # Сохраняем в буфер памяти
-    image_buffer = io.BytesIO()
-    plt.savefig(image_buffer, format='png', bbox_inches='tight')
-    plt.close(fig)  # Очищаем фигуру
-    image_buffer.seek(0)
-
-    return image_buffer
+    with _render_lock:
+        template = _activity_template()
+        ax1, ax2 = template["axes"]
+        ax1.clear()
+        ax2.clear()
+
+        # --- График 1: Просмотры (Столбчатая диаграмма) ---
+        colors = ['salmon' if flag else 'skyblue' for flag in outlier_flags] if outlier_flags else 'skyblue'
+        ax1.bar(x, views_list, color=colors)
+        ax1.set_title(f'Просмотры {len(views_list)} последних видео', fontsize=16)
+        ax1.set_ylabel('Кол-во просмотров', fontsize=12)
+        ax1.grid(axis='y', linestyle='--', alpha=0.7)
+
+        # Добавляем цифры над столбцами
+        if not dense:
+            offset = max(views_list) * 0.01
+            for i, v in enumerate(views_list):
+                ax1.text(i, v + offset, f"{v:,}".replace(',', '.'), ha='center', color='black')
+
+        # --- График 2: Вовлеченность (Лайки и Комментарии) ---
+        width = 0.35  # ширина столбцов
+        ax2.bar(x - width / 2, likes_list, width, label='Лайки', color='green')
+        ax2.bar(x + width / 2, comments_list, width, label='Комментарии', color='orange')
+        ax2.set_title('Вовлеченность (Лайки и Комментарии)', fontsize=16)
+        ax2.set_ylabel('Количество', fontsize=12)
+        ax2.legend()
+        ax2.grid(axis='y', linestyle='--', alpha=0.7)
+
+        if dense:
+            step = max(1, len(labels) // 20)
+            for ax in (ax1, ax2):
+                ax.set_xticks(x[::step], [str(i) for i in video_numbers][::step])
+                ax.set_xlabel('Номер видео (1 — самое новое)')
+        else:
+            # Поворачиваем метки X, если их много
+            rotation, align = (15, "right") if len(labels) > 5 else (0, "center")
+            for ax in (ax1, ax2):
+                ax.set_xticks(x, labels, rotation=rotation, ha=align)
+
+        return encode_figure(template["fig"], image_format)
+
+
+def _heatmap_template() -> dict:
+    template = _templates.get("heatmap")
+    if template is None:
+        with plt.style.context('default'):
+            fig, ax = plt.subplots(figsize=(16, 6))
+            fig.subplots_adjust(left=0.04, right=1.0, top=0.92, bottom=0.1)
+            im = ax.imshow(np.zeros((len(DAYS), len(HOURS))), cmap="Greens", vmin=0, vmax=1)
+            ax.set_xticks(np.arange(len(HOURS)), HOURS)
+            ax.set_yticks(np.arange(len(DAYS)), DAYS)
+            colorbar = fig.colorbar(im, ax=ax, label="Кол-во видео")
+            texts = [[ax.text(j, i, "", ha="center", va="center") for j in range(len(HOURS))]
+                     for i in range(len(DAYS))]
+        template = _templates["heatmap"] = {"fig": fig, "ax": ax, "im": im, "colorbar": colorbar, "texts": texts}
+    return template
 
 
 # ⭐️⭐️⭐️ ВОЗВРАЩЕННАЯ ВЕРСИЯ (СВЕТЛАЯ) ⭐️⭐️⭐️
-def create_heatmap_graph(grid_data: np.ndarray) -> io.BytesIO | None:
+def create_heatmap_graph(grid_data: np.ndarray, title: str = "Теплокарта публикаций (по 50 последним видео)",
+                         tz_name: str = "UTC", image_format: str = CHART_FORMAT) -> io.BytesIO | None:
     """
     Рисует теплокарту (heatmap) 7x24 на основе сетки данных.
-    (Светлая тема, зеленая палитра)
+    (Светлая тема, зеленая палитра.) Фигура берется из шаблона:
+    обновляются только данные сетки, цифры в ячейках и подписи.
     """
     if grid_data is None:
         return None
 
-    days = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
-    hours = [f"{h:02d}" for h in range(24)]
-
-    # ⭐️ ВОЗВРАЩАЕМ СТАНДАРТНЫЙ СТИЛЬ
-    plt.style.use('default')
-
-    fig, ax = plt.subplots(figsize=(16, 6))
+    grid = np.asarray(grid_data)
+    peak = grid.max()
 
-    # ⭐️ ВОЗВРАЩАЕМ ЗЕЛЕНУЮ ПАЛИТРУ
-    im = ax.imshow(grid_data, cmap="Greens")
+    with _render_lock:
+        template = _heatmap_template()
+        template["im"].set_data(grid)
+        template["im"].set_clim(0, max(peak, 1))
 
-    # Настраиваем оси
-    ax.set_xticks(np.arange(len(hours)))
-    ax.set_yticks(np.arange(len(days)))
-    ax.set_xticklabels(hours)
-    ax.set_yticklabels(days)
+        # Цифры в ячейках; для темных ячеек — белый текст
+        for i, row in enumerate(template["texts"]):
+            for j, text in enumerate(row):
+                count = grid[i, j]
+                text.set_text(str(int(count)) if count > 0 else "")
+                text.set_color("white" if count > peak / 2 else "black")
 
-    # Добавляем цифры в ячейки
-    for i in range(len(days)):
-        for j in range(len(hours)):
-            count = grid_data[i, j]
-            if count > 0:
-                # Меняем цвет текста на белый для темных ячеек
-                color = "white" if count > grid_data.max() / 2 else "black"
-                ax.text(j, i, int(count), ha="center", va="center", color=color)
+        template["ax"].set_title(title)
+        template["ax"].set_xlabel(f"Время суток ({tz_name})")
+        return encode_figure(template["fig"], image_format)
 
-    ax.set_title("Теплокарта публикаций (по 50 последним видео)")
-    ax.set_xlabel("Время суток (UTC)")
-    fig.colorbar(im, ax=ax, label="Кол-во видео")
-    fig.tight_layout()
 
-    # Сохраняем в буфер
-    image_buffer = io.BytesIO()
-    plt.savefig(image_buffer, format='png', bbox_inches='tight')
-    plt.close(fig)
-    image_buffer.seek(0)
+def create_comments_graph(days: list, counts: list, title: str = "Комментарии по дням",
+                          image_format: str = CHART_FORMAT) -> io.BytesIO | None:
+    """
+    Рисует число комментариев по дням (days — строки 'ГГГГ-ММ-ДД' по возрастанию).
+    """
+    if not days:
+        return None
 
-    return image_buffer
\ No newline at end of file
+    dates = np.asarray(days, dtype='datetime64[D]').astype(object)  # datetime.date для оси X
+    with _render_lock:
+        template = _templates.get("comments")
+        if template is None:
+            fig, ax = plt.subplots(figsize=(12, 5))
+            fig.subplots_adjust(left=0.08, right=0.98, top=0.9, bottom=0.15)
+            template = _templates["comments"] = {"fig": fig, "ax": ax}
+        ax = template["ax"]
+        ax.clear()
+
+        ax.fill_between(dates, counts, step="mid", color='skyblue', alpha=0.6)
+        ax.plot(dates, counts, drawstyle="steps-mid", color='steelblue')
+        ax.set_title(title, fontsize=14)
+        ax.set_ylabel('Комментариев в день', fontsize=12)
+        ax.set_ylim(bottom=0)
+        ax.grid(axis='y', linestyle='--', alpha=0.7)
+        template["fig"].autofmt_xdate(rotation=15)
+
+        return encode_figure(template["fig"], image_format)
+
+
+def create_compare_graph(titles: list, median_views: list, er: list,
+                         title: str = "Медиана просмотров последних видео",
+                         image_format: str = CHART_FORMAT) -> io.BytesIO | None:
+    """
+    Горизонтальные столбцы по каналам (в порядке рейтинга, первый — сверху)
+    с подписью медианы просмотров и ER. Каналы без статистики пропускаются.
+    """
+    rows = [(t, v, e) for t, v, e in zip(titles, median_views, er) if v is not None]
+    if not rows:
+        return None
+    labels = [t if len(t) <= 28 else t[:27] + "…" for t, _, _ in rows]
+    values = np.asarray([v for _, v, _ in rows], dtype=np.float64)
+    y = np.arange(len(rows))
+
+    with _render_lock:
+        template = _templates.get("compare")
+        if template is None:
+            fig, ax = plt.subplots(figsize=(12, 6))
+            template = _templates["compare"] = {"fig": fig, "ax": ax}
+        fig, ax = template["fig"], template["ax"]
+        ax.clear()
+        # Высота растет с числом каналов; отступы в дюймах постоянны
+        height = max(3.0, 0.32 * len(rows) + 1.4)
+        fig.set_size_inches(12, height)
+        fig.subplots_adjust(left=0.25, right=0.9, top=1 - 0.7 / height, bottom=0.6 / height)
+
+        ax.barh(y, values, color='skyblue')
+        ax.set_yticks(y, labels)
+        ax.set_ylim(len(rows) - 0.5, -0.5)  # первый в рейтинге — сверху
+        ax.set_title(title, fontsize=14)
+        ax.grid(axis='x', linestyle='--', alpha=0.7)
+        offset = values.max() * 0.01
+        for i, (_, v, e) in enumerate(rows):
+            ax.text(v + offset, i, f"{int(v):,}".replace(',', '.') + f"  ER {e}%", va='center', fontsize=9)
+        ax.set_xlim(0, values.max() * 1.22 or 1)
+
+        return encode_figure(fig, image_format)
@@ -11,4 +11,106 @@ TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 
 if not TELEGRAM_BOT_TOKEN or not YOUTUBE_API_KEY:
-    raise ValueError("❌ ОШИБКА: TELEGRAM_BOT_TOKEN или YOUTUBE_API_KEY не найдены в окружении! Проверьте файл .env или настройки хостинга.")
\ No newline at end of file
+    raise ValueError("❌ ОШИБКА: TELEGRAM_BOT_TOKEN или YOUTUBE_API_KEY не найдены в окружении! Проверьте файл .env или настройки хостинга.")
+
+# Часовой пояс по умолчанию для теплокарты публикаций
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "UTC")
+
+# Глубина анализа "здоровья канала" (кол-во последних видео)
+HEALTH_DEPTH_DEFAULT = int(os.getenv("HEALTH_DEPTH_DEFAULT", 10))
+HEALTH_DEPTH_MAX = int(os.getenv("HEALTH_DEPTH_MAX", 500))
+
+# Время жизни кэша ответов YouTube API (в секундах)
+STATS_CACHE_TTL = int(os.getenv("STATS_CACHE_TTL", 900))
+
+# Массовый анализ видео: лимит ссылок за раз и параллельность запросов к RYD
+BULK_MAX_VIDEOS = int(os.getenv("BULK_MAX_VIDEOS", 500))
+RYD_CONCURRENCY = int(os.getenv("RYD_CONCURRENCY", 10))
+
+# Фоновые задачи: воркеры, файл со статусами, частота обновления прогресса (сек.)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.db")
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", 3.0))
+
+# Лимиты исходящих запросов к Telegram (сообщений в секунду): личный чат,
+# группа/канал (20 в минуту) и весь бот; burst — сколько можно отправить подряд
+TG_CHAT_RATE = float(os.getenv("TG_CHAT_RATE", 1.0))
+TG_GROUP_RATE = float(os.getenv("TG_GROUP_RATE", 20 / 60))
+TG_GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", 30.0))
+TG_BURST = int(os.getenv("TG_BURST", 3))
+
+# Многопроцессный режим: кол-во процессов-воркеров (1 — обычный режим)
+# и путь к общему SQLite-кэшу (выставляется автоматически для воркеров)
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", 1))
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH")
+
+# Отслеживание каналов (/watch): база подписок, границы интервала опроса (сек),
+# лимит каналов на пользователя и число одновременных проверок
+WATCH_DB_PATH = os.getenv("WATCH_DB_PATH", "watchlist.db")
+WATCH_MIN_INTERVAL = int(os.getenv("WATCH_MIN_INTERVAL", 15 * 60))
+WATCH_MAX_INTERVAL = int(os.getenv("WATCH_MAX_INTERVAL", 12 * 3600))
+WATCH_MAX_PER_USER = int(os.getenv("WATCH_MAX_PER_USER", 500))
+WATCH_CONCURRENCY = int(os.getenv("WATCH_CONCURRENCY", 5))
+
+# Поиск видео-выбросов по нише: сколько последних видео брать с канала,
+# сколько строк в листе и сколько каналов читать одновременно
+NICHE_OUTLIER_DEPTH = int(os.getenv("NICHE_OUTLIER_DEPTH", 50))
+NICHE_OUTLIERS_TOP = int(os.getenv("NICHE_OUTLIERS_TOP", 200))
+NICHE_CONCURRENCY = int(os.getenv("NICHE_CONCURRENCY", 8))
+
+# Ролики не длиннее этого (сек) считаются Shorts (лимит Shorts — 3 минуты)
+SHORTS_MAX_SECONDS = int(os.getenv("SHORTS_MAX_SECONDS", 180))
+
+# Сравнение каналов (/compare): максимум каналов (channels.list принимает 50 ID за запрос)
+# и сколько последних видео каждого канала учитывать
+COMPARE_MAX_CHANNELS = int(os.getenv("COMPARE_MAX_CHANNELS", 50))
+COMPARE_DEPTH = int(os.getenv("COMPARE_DEPTH", 10))
+
+# Журналы Excel-сессий ниши (по файлу на сессию) и срок хранения брошенных сессий (сек)
+NICHE_SESSION_DIR = os.getenv("NICHE_SESSION_DIR", "niche_sessions")
+NICHE_SESSION_MAX_AGE = int(os.getenv("NICHE_SESSION_MAX_AGE", 7 * 24 * 3600))
+
+# Графики: DPI, формат ("png" — палитровый PNG, "jpeg" или "webp"),
+# качество JPEG/WebP и число цветов палитры PNG
+CHART_DPI = int(os.getenv("CHART_DPI", 100))
+CHART_FORMAT = os.getenv("CHART_FORMAT", "png").lower()
+CHART_QUALITY = int(os.getenv("CHART_QUALITY", 85))
+CHART_PNG_COLORS = int(os.getenv("CHART_PNG_COLORS", 128))
+
+# Анализ комментариев (/comments): максимум страниц commentThreads.list
+# (1 единица квоты и до 100 комментариев на страницу), сколько страниц
+# загружать наперед и емкость приближенных топов слов и авторов
+COMMENTS_MAX_PAGES = int(os.getenv("COMMENTS_MAX_PAGES", 100))
+COMMENTS_PREFETCH = int(os.getenv("COMMENTS_PREFETCH", 2))
+COMMENTS_TOP_CAPACITY = int(os.getenv("COMMENTS_TOP_CAPACITY", 1000))
+
+# Ключевые слова (/keywords): сколько последних видео читать у канала
+# и у каждого канала ниши, максимум каналов ниши в одной команде
+KEYWORDS_MAX_VIDEOS = int(os.getenv("KEYWORDS_MAX_VIDEOS", 5000))
+KEYWORDS_NICHE_DEPTH = int(os.getenv("KEYWORDS_NICHE_DEPTH", 500))
+KEYWORDS_MAX_NICHE_CHANNELS = int(os.getenv("KEYWORDS_MAX_NICHE_CHANNELS", 20))
+
+# Общий срок (сек) на ответ интерактивного обработчика (анализ видео / канала):
+# внешние вызовы получают таймаут из остатка, необязательные поля отбрасываются
+HANDLER_BUDGET = float(os.getenv("HANDLER_BUDGET", 10.0))
+# Обработчики, которые по природе дольше: Google Trends (несколько шагов pytrends)
+# и массовый анализ видео (до BULK_MAX_VIDEOS дизлайков из RYD)
+TRENDS_BUDGET = float(os.getenv("TRENDS_BUDGET", 30.0))
+BULK_BUDGET = float(os.getenv("BULK_BUDGET", 60.0))
+
+# Публичная лента последних загрузок канала (без квоты Data API): теплокарта и /watch
+# берут даты и ID оттуда, если ленты хватает. Пустое значение отключает ленту
+RSS_FEED_URL = os.getenv("RSS_FEED_URL", "https://www.youtube.com/feeds/videos.xml")
+
+# Локальный полнотекстовый индекс видео (/search)
+SEARCH_DB_PATH = os.getenv("SEARCH_DB_PATH", "search.db")
+
+# Промежуточные результаты анализа для кнопок под отчетом: время жизни (сек) и размер хранилища
+ARTIFACT_TTL = int(os.getenv("ARTIFACT_TTL", 3600))
+ARTIFACT_MAX_SIZE = int(os.getenv("ARTIFACT_MAX_SIZE", 2048))
+
+# Архив превью канала (/thumbs): одновременные загрузки, размер части архива (байт)
+# под лимит Telegram в 50 МБ и максимум видео в одной выгрузке
+THUMB_CONCURRENCY = int(os.getenv("THUMB_CONCURRENCY", 8))
+THUMB_ZIP_PART_BYTES = int(os.getenv("THUMB_ZIP_PART_BYTES", 45 * 1024 * 1024))
+THUMB_MAX_VIDEOS = int(os.getenv("THUMB_MAX_VIDEOS", 5000))
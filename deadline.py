@@ -0,0 +1,131 @@
+# deadline.py
+
+import asyncio
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+# Абсолютный срок (time.monotonic) текущего обработчика; None — срока нет
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("deadline", default=None)
+
+# Меньше этого времени на вызов не тратим: сразу отдаем запасной результат
+MIN_CALL_TIMEOUT = 0.05
+
+_MISSING = object()
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Вызов не уложился в свой таймаут или в остаток бюджета обработчика."""
+
+
+@dataclass(frozen=True)
+class Policy:
+    """
+    Правила вызова внешней зависимости.
+    timeout — потолок на один вызов (итоговый — не больше остатка бюджета);
+    hedge_after — через сколько секунд без ответа отправить дублирующий запрос
+    (только для идемпотентного чтения; None — без дублирования).
+    """
+    timeout: float
+    hedge_after: float | None = None
+
+
+POLICIES = {
+    # Дизлайки и ГЕО — необязательные поля: при задержке отчет уходит без них
+    "ryd": Policy(timeout=2.0, hedge_after=0.6),
+    "restcountries": Policy(timeout=2.0, hedge_after=0.6),
+    # Лента загрузок бесплатна: при задержке дублируем, при сбое идем в Data API
+    "feed": Policy(timeout=3.0, hedge_after=1.0),
+    # Дубль запроса к YouTube стоит квоты, поэтому без hedge
+    "youtube": Policy(timeout=30.0),
+    "pytrends": Policy(timeout=20.0),
+}
+
+stats = {name: {"calls": 0, "timeouts": 0, "errors": 0, "hedges": 0, "hedge_wins": 0, "fallbacks": 0}
+         for name in POLICIES}
+
+
+@contextmanager
+def budget(seconds: float):
+    """
+    Общий срок на обработчик: все вызовы через call() внутри блока (и в задачах,
+    созданных из него) получают таймаут не больше оставшегося времени.
+    Вложенный бюджет не может продлить внешний.
+    """
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Сколько секунд осталось до срока текущего обработчика (None — срока нет)."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+async def _hedged(make_call, hedge_after: float, counters: dict):
+    """Первый успешный ответ из основного и (если он задержался) дублирующего запроса."""
+    first = asyncio.ensure_future(make_call())
+    done, _ = await asyncio.wait({first}, timeout=hedge_after)
+    if done:
+        return first.result()
+
+    counters["hedges"] += 1
+    second = asyncio.ensure_future(make_call())
+    pending = {first, second}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    counters["hedge_wins"] += task is second
+                    return task.result()
+        # Оба запроса упали — пробрасываем ошибку основного
+        return first.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call(dependency: str, make_call, fallback=_MISSING):
+    """
+    Вызывает внешнюю зависимость по ее политике из POLICIES.
+    make_call — функция без аргументов, возвращающая новую корутину (для hedge
+    нужна возможность повторить запрос). Если задан fallback, при таймауте или
+    ошибке возвращается он (необязательные данные); иначе исключение пробрасывается,
+    а таймаут превращается в DeadlineExceeded.
+    """
+    policy = POLICIES[dependency]
+    counters = stats[dependency]
+    counters["calls"] += 1
+
+    timeout = policy.timeout
+    left = remaining()
+    if left is not None:
+        timeout = min(timeout, left)
+
+    try:
+        if timeout < MIN_CALL_TIMEOUT:
+            raise DeadlineExceeded(f"{dependency}: бюджет обработчика исчерпан")
+        if policy.hedge_after is not None and policy.hedge_after < timeout:
+            return await asyncio.wait_for(_hedged(make_call, policy.hedge_after, counters), timeout)
+        return await asyncio.wait_for(make_call(), timeout)
+    except asyncio.TimeoutError as e:
+        counters["timeouts"] += 1
+        if fallback is _MISSING:
+            raise DeadlineExceeded(f"{dependency}: нет ответа за {timeout:.2f} с") from e
+        counters["fallbacks"] += 1
+        logging.info(f"⏱ {dependency}: нет ответа за {timeout:.2f} с, отвечаем без этих данных")
+        return fallback
+    except Exception:
+        counters["errors"] += 1
+        if fallback is _MISSING:
+            raise
+        counters["fallbacks"] += 1
+        return fallback
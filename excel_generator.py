@@ -1,10 +1,20 @@
 # excel_generator.py
 
 import io
+import csv
+from datetime import datetime
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 
 
+# Колонки листа выбросов ниши: (заголовок, ширина)
+OUTLIER_COLUMNS = [
+    ("#", 6), ("Видео", 60), ("Канал", 28), ("Дата", 12), ("Просмотры", 14),
+    ("× медианы канала", 14), ("Просмотры / подписчики", 14), ("Медиана канала", 14), ("Подписчики", 14),
+    ("Формат", 10)
+]
+
+
 class ExcelGenerator:
     """
     Класс для создания и заполнения Excel-файла для анализа ниши.
@@ -15,6 +25,9 @@ class ExcelGenerator:
         self.sheet = self.workbook.active
         self.sheet.title = f"Анализ - {niche_name[:20]}"
 
+        # Следующая свободная строка каждой категории: без сканирования листа при каждом добавлении
+        self._next_row = {'whales': 2, 'small': 2, 'tiny': 2}
+
         self._setup_styles_and_headers()
 
     def _setup_styles_and_headers(self):
@@ -72,10 +85,11 @@ class ExcelGenerator:
             start_col = 7
         elif category == 'tiny':
             start_col = 13
+        else:
+            category = 'whales'
 
-        row_to_write = 2
-        while self.sheet.cell(row=row_to_write, column=start_col).value is not None:
-            row_to_write += 1
+        row_to_write = self._next_row[category]
+        self._next_row[category] += 1
 
         # Название канала (с гиперссылкой)
         cell_name = self.sheet.cell(row=row_to_write, column=start_col)
@@ -114,8 +128,11 @@ class ExcelGenerator:
             create_hyperlink_part(f"14d: {data['idea_14d']}", data['idea_14d']),
             create_hyperlink_part(f"30d: {data['idea_30d']}", data['idea_30d'])
         ]
+        # Идеи 7d/14d/30d — длинные видео; лучший Shorts за 30 дней — отдельной строкой
+        if str(data.get('idea_shorts', '')).startswith('http'):
+            parts.append(create_hyperlink_part(f"Shorts: {data['idea_shorts']}", data['idea_shorts']))
 
-        cell_ideas.value = f"={parts[0]} & CHAR(10) & {parts[1]} & CHAR(10) & {parts[2]}"
+        cell_ideas.value = "=" + " & CHAR(10) & ".join(parts)
         cell_ideas.alignment = Alignment(wrap_text=True, horizontal='left', vertical='top')
 
         # ⬆️ --- ⭐️ КОНЕЦ ИСПРАВЛЕНИЯ ⭐️ --- ⬆️
@@ -132,6 +149,43 @@ class ExcelGenerator:
 
         self.sheet.row_dimensions[row_to_write].height = 60
 
+    def add_outliers_sheet(self, outliers: list):
+        """
+        Лист с видео-выбросами ниши: видео, сильнее всего обогнавшие медиану своего канала.
+        Записи — из YouTubeAnalyzer.get_niche_outliers, дополненные channel_name, channel_url и subs.
+        """
+        sheet = self.workbook.create_sheet("Выбросы ниши")
+        header_font = Font(bold=True)
+        header_fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
+        for col_idx, (header, width) in enumerate(OUTLIER_COLUMNS, 1):
+            cell = sheet.cell(row=1, column=col_idx)
+            cell.value = header
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+            sheet.column_dimensions[cell.column_letter].width = width
+        sheet.freeze_panes = "A2"
+
+        for rank, data in enumerate(outliers, 1):
+            row = rank + 1
+            published = datetime.fromisoformat(data['published_at'].replace('Z', '+00:00')).replace(tzinfo=None)
+            values = [rank, data['title'], data['channel_name'], published, data['views'], data['to_median'],
+                      data['to_subs'], data['channel_median'], _to_int(data.get('subs')),
+                      "Shorts" if data.get('is_short') else "Длинное"]
+            for col_idx, value in enumerate(values, 1):
+                sheet.cell(row=row, column=col_idx).value = value
+
+            sheet.cell(row=row, column=2).hyperlink = data['url']
+            sheet.cell(row=row, column=2).font = Font(color="0000FF", underline="single")
+            sheet.cell(row=row, column=3).hyperlink = data['channel_url']
+            sheet.cell(row=row, column=4).number_format = 'yyyy-mm-dd'
+            for col_idx in (5, 8, 9):
+                sheet.cell(row=row, column=col_idx).number_format = '#,##0'
+            sheet.cell(row=row, column=6).number_format = '0.00"x"'
+            sheet.cell(row=row, column=7).number_format = '0.000'
+
+        sheet.auto_filter.ref = sheet.dimensions
+
     def save_to_buffer(self) -> io.BytesIO:
         """
         Сохраняет Excel-книгу в буфер в памяти и возвращает его.
@@ -139,4 +193,156 @@ class ExcelGenerator:
         buffer = io.BytesIO()
         self.workbook.save(buffer)
         buffer.seek(0)
-        return buffer
\ No newline at end of file
+        return buffer
+
+
+# Колонки сводной таблицы массового анализа видео: (заголовок, ширина)
+VIDEO_TABLE_COLUMNS = [
+    ("Название", 60), ("ID видео", 16), ("Дата публикации", 20), ("Категория", 20), ("ГЕО", 10),
+    ("Просмотры", 14), ("Лайки", 12), ("Дизлайки", 12), ("Комментарии", 14), ("ER, %", 10)
+]
+
+
+def _to_int(value) -> int | None:
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def video_table_row(data: dict) -> list:
+    """
+    Строка сводной таблицы для одного видео (порядок — как в VIDEO_TABLE_COLUMNS).
+    Числа остаются числами, чтобы таблицу можно было сортировать.
+    """
+    views = _to_int(data.get('views')) or 0
+    likes = _to_int(data.get('likes')) or 0
+    comments = _to_int(data.get('comments')) or 0
+    published = datetime.fromisoformat(data['published_at'].replace('Z', '+00:00')).replace(tzinfo=None)
+    er = round((likes + comments) / views * 100, 2) if views > 0 else 0.0
+    return [
+        data['title'], data['video_id'], published, data.get('category_name', ''), data.get('geo_code', 'N/A'),
+        views, likes, _to_int(data.get('dislikes')), comments, er
+    ]
+
+
+class VideoTableGenerator:
+    """
+    Сводная таблица по пачке видео (массовый анализ) с фильтрами и сортировкой.
+    """
+
+    def __init__(self, title: str = "Видео"):
+        self.workbook = Workbook()
+        self.sheet = self.workbook.active
+        self.sheet.title = title[:30]
+        self._row = 1
+
+        header_font = Font(bold=True)
+        header_fill = PatternFill(start_color="DDEBF7", end_color="DDEBF7", fill_type="solid")
+        for col_idx, (header, width) in enumerate(VIDEO_TABLE_COLUMNS, 1):
+            cell = self.sheet.cell(row=1, column=col_idx)
+            cell.value = header
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = Alignment(horizontal='center', vertical='center')
+            self.sheet.column_dimensions[cell.column_letter].width = width
+        self.sheet.freeze_panes = "A2"
+
+    def add_video(self, data: dict):
+        """
+        Добавляет строку с данными видео.
+        """
+        self._row += 1
+        row = video_table_row(data)
+        for col_idx, value in enumerate(row, 1):
+            cell = self.sheet.cell(row=self._row, column=col_idx)
+            cell.value = value
+            if col_idx >= 6:
+                cell.number_format = '#,##0' if col_idx < 10 else '0.00'
+
+        cell_title = self.sheet.cell(row=self._row, column=1)
+        cell_title.hyperlink = data['url']
+        cell_title.font = Font(color="0000FF", underline="single")
+        self.sheet.cell(row=self._row, column=3).number_format = 'yyyy-mm-dd hh:mm'
+
+    def save_to_buffer(self) -> io.BytesIO:
+        """
+        Включает автофильтр (сортировка в Excel) и сохраняет книгу в буфер.
+        """
+        self.sheet.auto_filter.ref = self.sheet.dimensions
+        buffer = io.BytesIO()
+        self.workbook.save(buffer)
+        buffer.seek(0)
+        return buffer
+
+
+def build_videos_csv(videos: list) -> io.BytesIO:
+    """
+    Та же сводная таблица в CSV (UTF-8 с BOM, чтобы Excel открыл кириллицу).
+    """
+    text_buffer = io.StringIO()
+    writer = csv.writer(text_buffer)
+    writer.writerow([header for header, _ in VIDEO_TABLE_COLUMNS] + ["Ссылка"])
+    for data in videos:
+        row = video_table_row(data)
+        row[2] = row[2].strftime("%Y-%m-%d %H:%M:%S")
+        writer.writerow(row + [data['url']])
+    buffer = io.BytesIO(text_buffer.getvalue().encode('utf-8-sig'))
+    buffer.seek(0)
+    return buffer
+
+
+# Листы отчета по ключевым словам: (название листа, [(заголовок, ключ записи, ширина, формат)])
+KEYWORD_SHEETS = {
+    "phrases": ("Фразы", [("Фраза", "keyword", 40, None), ("Слов", "words", 8, None), ("Видео", "videos", 10, None),
+                          ("Просмотры", "views", 16, '#,##0'), ("Средн. просмотры", "avg_views", 16, '#,##0'),
+                          ("× медианы", "lift", 12, '0.00"x"')]),
+    "tags": ("Теги", [("Тег", "tag", 40, None), ("Видео", "videos", 10, None), ("Просмотры", "views", 16, '#,##0'),
+                      ("Средн. просмотры", "avg_views", 16, '#,##0')]),
+    "distinctive": ("Чаще, чем в нише", [("Фраза", "keyword", 40, None), ("z", "z", 10, '0.00'),
+                                         ("Канал, % видео", "channel_share", 14, '0.0'),
+                                         ("Ниша, % видео", "niche_share", 14, '0.0')]),
+    "missing": ("Есть в нише, нет у канала", [("Фраза", "keyword", 40, None), ("z", "z", 10, '0.00'),
+                                              ("Канал, % видео", "channel_share", 14, '0.0'),
+                                              ("Ниша, % видео", "niche_share", 14, '0.0')]),
+}
+
+
+def build_keywords_workbook(tables: dict) -> io.BytesIO:
+    """
+    Книга с таблицами ключевых слов (keyword_miner): по листу на каждую
+    непустую таблицу из tables (ключи — как в KEYWORD_SHEETS).
+    """
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    header_font = Font(bold=True)
+    header_fill = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")
+
+    for key, (title, columns) in KEYWORD_SHEETS.items():
+        rows = tables.get(key)
+        if not rows:
+            continue
+        sheet = workbook.create_sheet(title[:30])
+        for col_idx, (header, _, width, _) in enumerate(columns, 1):
+            cell = sheet.cell(row=1, column=col_idx)
+            cell.value = header
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+            sheet.column_dimensions[cell.column_letter].width = width
+        sheet.freeze_panes = "A2"
+
+        for row_idx, data in enumerate(rows, 2):
+            for col_idx, (_, field, _, number_format) in enumerate(columns, 1):
+                cell = sheet.cell(row=row_idx, column=col_idx)
+                cell.value = data[field]
+                if number_format:
+                    cell.number_format = number_format
+        sheet.auto_filter.ref = sheet.dimensions
+
+    if not workbook.sheetnames:
+        workbook.create_sheet("Пусто")
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer
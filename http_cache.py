@@ -0,0 +1,91 @@
+# http_cache.py
+
+import hashlib
+import threading
+
+from cache_store import make_cache
+
+# Заголовок, которым обертка помечает ответ, восстановленный из кэша после 304
+CACHE_HIT_HEADER = "x-etag-cache-key"
+
+
+class ETagCache:
+    """
+    Общий для всех потоков кэш ответов YouTube API: тело, ETag и уже
+    разобранный JSON. Ключ — хэш URL запроса (в URL есть API-ключ,
+    поэтому сам URL не хранится).
+    В многопроцессном режиме записи лежат в общем SQLite-кэше (make_cache):
+    ETag, полученный одним воркером, экономит первый запрос остальным.
+    Разобранный JSON там не сохраняется между чтениями — каждый процесс
+    разбирает тело сам.
+    """
+
+    def __init__(self, max_size: int = 2048, ttl: float = 24 * 3600):
+        self._entries = make_cache("etag", ttl=ttl, max_size=max_size)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "revalidated": 0, "not_modified": 0, "bytes_downloaded": 0, "bytes_saved": 0}
+
+    @staticmethod
+    def key(uri: str) -> str:
+        return hashlib.sha1(uri.encode()).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key: str, entry: dict):
+        with self._lock:
+            self._entries.set(key, entry)
+
+    def count(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self.stats[name] += value
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries))
+
+
+class ETagCachingHttp:
+    """
+    Обертка над httplib2.Http для googleapiclient: запоминает тело ответа
+    вместе с ETag и при повторном GET отправляет If-None-Match.
+    На 304 возвращает сохраненное тело как обычный 200, так что вызывающий
+    код ничего не замечает, а по сети приходят только заголовки.
+
+    Запросы, в которых If-None-Match уже выставлен вызывающим кодом
+    (например, проверка новых загрузок в watchlist), проходят как есть.
+    """
+
+    def __init__(self, http, cache: ETagCache):
+        self.http = http
+        self.cache = cache
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        headers = dict(headers or {})
+        if method != "GET" or any(name.lower() == "if-none-match" for name in headers):
+            return self.http.request(uri, method, body=body, headers=headers, **kwargs)
+
+        key = self.cache.key(uri)
+        cached = self.cache.get(key)
+        if cached:
+            headers["If-None-Match"] = cached["etag"]
+        resp, content = self.http.request(uri, method, body=body, headers=headers, **kwargs)
+        self.cache.count(requests=1, revalidated=int(cached is not None), bytes_downloaded=len(content or b""))
+
+        if resp.status == 304 and cached:
+            self.cache.count(not_modified=1, bytes_saved=len(cached["body"]))
+            resp.status = 200
+            resp["status"] = "200"
+            resp[CACHE_HIT_HEADER] = key
+            return resp, cached["body"]
+
+        etag = resp.get("etag")
+        if resp.status == 200 and etag:
+            self.cache.set(key, {"etag": etag, "body": content, "parsed": None})
+        return resp, content
+
+    def __getattr__(self, name):
+        # timeout, redirect_codes и прочие атрибуты — у исходного клиента
+        return getattr(self.http, name)
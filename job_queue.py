@@ -0,0 +1,263 @@
+# job_queue.py
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from collections import deque
+
+from aiogram import Bot
+
+# Статусы задач
+QUEUED, RUNNING, DONE, FAILED, CANCELLED, INTERRUPTED = (
+    "queued", "running", "done", "failed", "cancelled", "interrupted"
+)
+
+
+class JobStore:
+    """
+    Хранилище статусов задач в локальной SQLite-базе.
+    Переживает перезапуск: незавершенные задачи можно поднять заново.
+    """
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                message_id INTEGER,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def add(self, job: "Job"):
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO jobs (id, kind, user_id, chat_id, message_id, params, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job.id, job.kind, job.user_id, job.chat_id, job.message_id,
+             json.dumps(job.params, ensure_ascii=False), job.status, now, now)
+        )
+        self.conn.commit()
+
+    def update(self, job_id: str, **fields):
+        fields['updated_at'] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        self.conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+        self.conn.commit()
+
+    def unfinished(self) -> list:
+        rows = self.conn.execute(
+            "SELECT id, kind, user_id, chat_id, message_id, params FROM jobs "
+            "WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+        ).fetchall()
+        return [Job(kind, user_id, chat_id, json.loads(params), message_id, job_id)
+                for job_id, kind, user_id, chat_id, message_id, params in rows]
+
+
+class Job:
+    """Одна фоновая задача: вид, владелец, параметры (JSON) и сообщение для прогресса."""
+
+    def __init__(self, kind: str, user_id: int, chat_id: int, params: dict,
+                 message_id: int | None = None, job_id: str | None = None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.params = params
+        self.message_id = message_id
+        self.status = QUEUED
+        self.cancel_requested = False
+
+
+class JobContext:
+    """
+    То, что получает функция задачи: бот, чат и троттлинг прогресса.
+    Прогресс выводится правкой одного сообщения не чаще раза в `interval` секунд.
+    """
+
+    def __init__(self, queue: "JobQueue", job: Job):
+        self.bot = queue.bot
+        self.chat_id = job.chat_id
+        self.user_id = job.user_id
+        self.job = job
+        self._queue = queue
+        self._last_text = None
+        self._last_edit = 0.0
+
+    async def progress(self, text: str, force: bool = False):
+        now = time.monotonic()
+        if text == self._last_text or (not force and now - self._last_edit < self._queue.progress_interval):
+            return
+        self._last_text, self._last_edit = text, now
+        self._queue.store.update(self.job.id, progress=text)
+        if self.job.message_id is None:
+            return
+        try:
+            await self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.job.message_id)
+        except Exception:
+            pass  # сообщение удалено или текст не изменился — прогресс не критичен
+
+    def mark_done(self):
+        """
+        Отмечает задачу выполненной до отправки результата: если бот упадет
+        после отправки, задача не поднимется заново и не отправит его второй раз.
+        """
+        self.job.status = DONE
+        self._queue.store.update(self.job.id, status=DONE)
+
+    async def finish(self):
+        """Удаляет сообщение с прогрессом, когда результат уже отправлен."""
+        if self.job.message_id is None:
+            return
+        try:
+            await self.bot.delete_message(self.chat_id, self.job.message_id)
+        except Exception:
+            pass
+
+
+class JobQueue:
+    """
+    Очередь фоновых задач с ограниченным пулом воркеров.
+    Задачи разных пользователей берутся по кругу (round-robin), и у одного
+    пользователя одновременно выполняется не больше `per_user_limit` задач,
+    поэтому тяжелые выгрузки одного человека не блокируют остальных.
+    """
+
+    def __init__(self, store_path: str, workers: int = 4, per_user_limit: int = 1,
+                 progress_interval: float = 3.0):
+        self.store_path = store_path
+        self.store: JobStore | None = None  # открывается в start(), а не при импорте
+        self.workers = workers
+        self.per_user_limit = per_user_limit
+        self.progress_interval = progress_interval
+        self.bot: Bot | None = None
+
+        self._handlers = {}
+        self._pending = {}  # user_id -> deque[Job]
+        self._ring = deque()  # пользователи с ожидающими задачами, по кругу
+        self._running = {}  # job_id -> (Job, Task)
+        self._running_per_user = {}
+        # Все изменения очереди идут в одном event loop, поэтому блокировка не нужна —
+        # достаточно события "появилась работа" для спящих воркеров
+        self._has_work = asyncio.Event()
+        self._worker_tasks = []
+
+    def register(self, kind: str):
+        """Декоратор: регистрирует корутину `async def fn(ctx: JobContext, **params)` для вида задач."""
+        def decorator(fn):
+            self._handlers[kind] = fn
+            return fn
+        return decorator
+
+    async def start(self, bot: Bot):
+        """Запускает воркеров и поднимает задачи, не завершенные до перезапуска."""
+        self.bot = bot
+        self.store = JobStore(self.store_path)
+        for job in self.store.unfinished():
+            if job.kind not in self._handlers:
+                self.store.update(job.id, status=INTERRUPTED)
+                continue
+            logging.info(f"♻️ Возобновляю задачу {job.id} ({job.kind})")
+            await self._enqueue(job)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, kind: str, user_id: int, chat_id: int, params: dict,
+                     message_id: int | None = None) -> Job:
+        if kind not in self._handlers:
+            raise ValueError(f"Неизвестный вид задачи: {kind}")
+        job = Job(kind, user_id, chat_id, params, message_id)
+        self.store.add(job)
+        await self._enqueue(job)
+        return job
+
+    async def cancel_user_jobs(self, user_id: int) -> int:
+        """Отменяет все ожидающие и выполняющиеся задачи пользователя."""
+        cancelled = 0
+        for job in self._pending.pop(user_id, ()):
+            self.store.update(job.id, status=CANCELLED)
+            cancelled += 1
+        if user_id in self._ring:
+            self._ring.remove(user_id)
+        for job, task in list(self._running.values()):
+            if job.user_id == user_id:
+                job.cancel_requested = True
+                task.cancel()
+                cancelled += 1
+        return cancelled
+
+    async def _enqueue(self, job: Job):
+        self._pending.setdefault(job.user_id, deque()).append(job)
+        if job.user_id not in self._ring:
+            self._ring.append(job.user_id)
+        self._has_work.set()
+
+    def _take_next(self) -> Job | None:
+        for _ in range(len(self._ring)):
+            user_id = self._ring.popleft()
+            if self._running_per_user.get(user_id, 0) >= self.per_user_limit:
+                self._ring.append(user_id)
+                continue
+            queue = self._pending[user_id]
+            job = queue.popleft()
+            if queue:
+                self._ring.append(user_id)
+            else:
+                del self._pending[user_id]
+            return job
+        return None
+
+    async def _worker(self):
+        while True:
+            job = self._take_next()
+            if job is None:
+                self._has_work.clear()
+                await self._has_work.wait()
+                continue
+            self._running_per_user[job.user_id] = self._running_per_user.get(job.user_id, 0) + 1
+
+            task = asyncio.create_task(self._run(job))
+            self._running[job.id] = (job, task)
+            try:
+                await task
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise  # останавливают сам воркер
+                # задачу отменили до того, как она успела стартовать
+                self.store.update(job.id, status=CANCELLED)
+            finally:
+                self._running.pop(job.id, None)
+                self._running_per_user[job.user_id] -= 1
+                self._has_work.set()
+
+    async def _run(self, job: Job):
+        ctx = JobContext(self, job)
+        job.status = RUNNING
+        self.store.update(job.id, status=RUNNING)
+        try:
+            await self._handlers[job.kind](ctx, **job.params)
+            job.status = DONE
+            self.store.update(job.id, status=DONE)
+        except asyncio.CancelledError:
+            if not job.cancel_requested:
+                raise  # бот останавливается: статус RUNNING, задача поднимется после перезапуска
+            job.status = CANCELLED
+            self.store.update(job.id, status=CANCELLED)
+            await ctx.progress("🛑 Задача отменена.", force=True)
+        except Exception as e:
+            logging.exception(f"Задача {job.id} ({job.kind}) упала")
+            job.status = FAILED
+            self.store.update(job.id, status=FAILED, error=str(e))
+            await ctx.progress(f"❌ Ошибка: {e}", force=True)
@@ -0,0 +1,205 @@
+# keyword_miner.py
+
+import numpy as np
+
+from text_stats import STOPWORDS, words
+
+# Сила априорного распределения в log-odds сравнении (Monroe et al., 2008):
+# чем больше, тем сильнее редкие фразы притягиваются к частоте по всему корпусу
+PRIOR_STRENGTH = 500.0
+
+
+class Vocabulary:
+    """
+    Общий словарь корпусов: слово -> целочисленный ID.
+    Тексты переводятся в плоский массив ID токенов и массив номеров документов,
+    дальше n-граммы считаются векторно (NumPy), без словарей на каждую фразу.
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.words = []
+
+    def encode(self, texts: list) -> tuple[np.ndarray, np.ndarray]:
+        """(ID токенов, номер текста для каждого токена) — подряд, в порядке текстов."""
+        index, vocabulary = self.index, self.words
+        ids, lengths = [], []
+        for text in texts:
+            tokens = words(text)
+            lengths.append(len(tokens))
+            for token in tokens:
+                token_id = index.get(token)
+                if token_id is None:
+                    token_id = index[token] = len(vocabulary)
+                    vocabulary.append(token)
+                ids.append(token_id)
+        return np.asarray(ids, dtype=np.int64), np.repeat(np.arange(len(texts)), lengths)
+
+    def stop_mask(self) -> np.ndarray:
+        return np.fromiter((word in STOPWORDS for word in self.words), dtype=bool, count=len(self.words))
+
+    def decode(self, code: int, n: int) -> str:
+        """Код n-граммы (число в системе счисления по основанию len(words)) -> фраза."""
+        size = len(self.words)
+        parts = []
+        for _ in range(n):
+            code, token_id = divmod(int(code), size)
+            parts.append(self.words[token_id])
+        return " ".join(reversed(parts))
+
+
+def doc_ngrams(ids: np.ndarray, docs: np.ndarray, n: int, stop: np.ndarray,
+               size: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Уникальные пары (номер текста, код n-граммы). Фразы не пересекают границу
+    текста и не начинаются / не заканчиваются стоп-словом. Повтор фразы внутри
+    одного текста считается один раз (частота — по числу видео).
+    """
+    if size ** n >= 2 ** 63:
+        raise ValueError("Словарь слишком велик для кодирования n-грамм в int64")
+    count = len(ids) - n + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    codes = np.zeros(count, dtype=np.int64)
+    for k in range(n):
+        codes = codes * size + ids[k:k + count]
+    keep = (docs[:count] == docs[n - 1:]) & ~stop[ids[:count]] & ~stop[ids[n - 1:]]
+    doc, codes = docs[:count][keep], codes[keep]
+
+    order = np.lexsort((codes, doc))
+    doc, codes = doc[order], codes[order]
+    first = np.ones(len(doc), dtype=bool)
+    first[1:] = (doc[1:] != doc[:-1]) | (codes[1:] != codes[:-1])
+    return doc[first], codes[first]
+
+
+def keyword_table(texts: list, views: list | None = None, n_max: int = 3, top: int = 50,
+                  min_videos: int = 2) -> list:
+    """
+    Частые слова и фразы (1..n_max слов) по названиям видео, взвешенные просмотрами.
+    Для каждой фразы: в скольких видео встречается, сумма и среднее просмотров
+    этих видео и lift — среднее относительно медианы канала.
+    Сортировка — по сумме просмотров. Возвращает список словарей.
+    """
+    if not texts:
+        return []
+    vocabulary = Vocabulary()
+    ids, docs = vocabulary.encode(texts)
+    stop, size = vocabulary.stop_mask(), max(len(vocabulary.words), 1)
+    weights = np.asarray(views if views is not None else np.ones(len(texts)), dtype=np.float64)
+    median = float(np.median(weights)) or 1.0
+
+    grams, lengths, videos, view_sums = [], [], [], []
+    for n in range(1, n_max + 1):
+        doc, codes = doc_ngrams(ids, docs, n, stop, size)
+        unique, inverse = np.unique(codes, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(unique))
+        sums = np.bincount(inverse, weights=weights[doc], minlength=len(unique))
+        frequent = counts >= min_videos
+        grams.append(unique[frequent])
+        lengths.append(np.full(frequent.sum(), n))
+        videos.append(counts[frequent])
+        view_sums.append(sums[frequent])
+
+    grams, lengths = np.concatenate(grams), np.concatenate(lengths)
+    videos, view_sums = np.concatenate(videos), np.concatenate(view_sums)
+    if grams.size == 0:
+        return []
+    best = np.argpartition(-view_sums, min(top, grams.size) - 1)[:top]
+    best = best[np.argsort(-view_sums[best], kind='stable')]
+
+    return [
+        {
+            "keyword": vocabulary.decode(grams[i], lengths[i]),
+            "words": int(lengths[i]),
+            "videos": int(videos[i]),
+            "views": int(view_sums[i]),
+            "avg_views": int(view_sums[i] / videos[i]),
+            "lift": round(float(view_sums[i] / videos[i] / median), 2)
+        }
+        for i in best
+    ]
+
+
+def tag_table(tags_per_video: list, views: list | None = None, top: int = 50) -> list:
+    """Теги (целиком, без разбиения на слова): в скольких видео и сколько просмотров у этих видео."""
+    index, names, tag_ids, docs = {}, [], [], []
+    for doc, tags in enumerate(tags_per_video):
+        for tag in {tag.strip().lower() for tag in tags or ()} - {""}:
+            tag_id = index.get(tag)
+            if tag_id is None:
+                tag_id = index[tag] = len(names)
+                names.append(tag)
+            tag_ids.append(tag_id)
+            docs.append(doc)
+    if not names:
+        return []
+
+    tag_ids, docs = np.asarray(tag_ids), np.asarray(docs)
+    weights = np.asarray(views if views is not None else np.ones(len(tags_per_video)), dtype=np.float64)
+    counts = np.bincount(tag_ids, minlength=len(names))
+    sums = np.bincount(tag_ids, weights=weights[docs], minlength=len(names))
+    best = np.argsort(-sums, kind='stable')[:top]
+    return [
+        {"tag": names[i], "videos": int(counts[i]), "views": int(sums[i]), "avg_views": int(sums[i] / counts[i])}
+        for i in best
+    ]
+
+
+def compare_vocabulary(target_texts: list, background_texts: list, n_max: int = 2, top: int = 30,
+                       min_videos: int = 3) -> dict:
+    """
+    Чем словарь канала отличается от остальной ниши: log-odds с информативным
+    априорным распределением (z-оценка) для каждой фразы из обоих корпусов.
+    "distinctive" — фразы, которые канал использует чаще ниши,
+    "missing" — фразы ниши, которых у канала мало или нет.
+    Доля — в скольких процентах видео корпуса встречается фраза.
+    """
+    vocabulary = Vocabulary()
+    target_ids, target_docs = vocabulary.encode(target_texts)
+    background_ids, background_docs = vocabulary.encode(background_texts)
+    stop, size = vocabulary.stop_mask(), max(len(vocabulary.words), 1)
+
+    grams, lengths, target_counts, background_counts = [], [], [], []
+    for n in range(1, n_max + 1):
+        _, codes_t = doc_ngrams(target_ids, target_docs, n, stop, size)
+        _, codes_b = doc_ngrams(background_ids, background_docs, n, stop, size)
+        unique, inverse = np.unique(np.concatenate([codes_t, codes_b]), return_inverse=True)
+        grams.append(unique)
+        lengths.append(np.full(len(unique), n))
+        target_counts.append(np.bincount(inverse[:len(codes_t)], minlength=len(unique)))
+        background_counts.append(np.bincount(inverse[len(codes_t):], minlength=len(unique)))
+
+    grams, lengths = np.concatenate(grams), np.concatenate(lengths)
+    y_t = np.concatenate(target_counts).astype(np.float64)
+    y_b = np.concatenate(background_counts).astype(np.float64)
+    if grams.size < 2:
+        # Из одной фразы сравнивать нечего (и знаменатели log-odds обнуляются)
+        return {"distinctive": [], "missing": []}
+
+    alpha = PRIOR_STRENGTH * (y_t + y_b) / (y_t + y_b).sum()
+    n_t, n_b, alpha0 = y_t.sum(), y_b.sum(), alpha.sum()
+    delta = (np.log((y_t + alpha) / (n_t + alpha0 - y_t - alpha))
+             - np.log((y_b + alpha) / (n_b + alpha0 - y_b - alpha)))
+    z = delta / np.sqrt(1 / (y_t + alpha) + 1 / (y_b + alpha))
+
+    def rows(candidates: np.ndarray, order: np.ndarray) -> list:
+        picked = candidates[order][:top]
+        return [
+            {
+                "keyword": vocabulary.decode(grams[i], lengths[i]),
+                "z": round(float(z[i]), 2),
+                "channel_share": round(float(100 * y_t[i] / max(len(target_texts), 1)), 1),
+                "niche_share": round(float(100 * y_b[i] / max(len(background_texts), 1)), 1)
+            }
+            for i in picked
+        ]
+
+    frequent = np.flatnonzero(y_t + y_b >= min_videos)
+    positive = frequent[z[frequent] > 0]
+    negative = frequent[z[frequent] < 0]
+    return {
+        "distinctive": rows(positive, np.argsort(-z[positive], kind='stable')),
+        "missing": rows(negative, np.argsort(z[negative], kind='stable'))
+    }
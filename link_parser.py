@@ -0,0 +1,98 @@
+# link_parser.py
+
+import re
+from dataclasses import dataclass
+
+# Одно скомпилированное выражение на все форматы ссылок: текст сканируется один раз,
+# а по имени сработавшей группы понятно, что именно найдено.
+_LINK_RE = re.compile(r"""
+      (?:[?&]v=|youtu\.be/|/shorts/|/live/|/embed/)(?P<video>[a-zA-Z0-9_-]+)
+    | /channel/(?P<channel_id>[a-zA-Z0-9_-]+)
+    | /user/(?P<username>[a-zA-Z0-9_-]+)
+    | /@(?P<handle>[a-zA-Z0-9_.-]+)
+    | /c/(?P<custom>[a-zA-Z0-9_.-]+)
+    | (?<![\w/@.])@(?P<raw_handle>[a-zA-Z0-9_.-]+)
+    | (?<![\w/@.=-])(?P<raw_channel_id>UC[a-zA-Z0-9_-]{22})(?![\w-])
+""", re.VERBOSE)
+
+_URL_HINT_RE = re.compile(r"https?://|www\.|/")
+
+# Имя группы -> (вид ссылки, тип значения в терминах YouTubeAnalyzer)
+_GROUP_TYPES = {
+    'video': ('video', 'id'),
+    'channel_id': ('channel', 'id'),
+    'username': ('channel', 'username'),
+    'handle': ('channel', 'search_query'),
+    'custom': ('channel', 'search_query'),
+    'raw_handle': ('channel', 'search_query'),
+    'raw_channel_id': ('channel', 'id'),
+}
+
+
+@dataclass(frozen=True)
+class ParsedLink:
+    """
+    Распознанная ссылка.
+    kind — 'video' или 'channel';
+    type — 'id' для видео; 'id', 'username' или 'search_query' для канала.
+    """
+    kind: str
+    type: str
+    value: str
+
+    @property
+    def is_video(self) -> bool:
+        return self.kind == 'video'
+
+    def as_channel_info(self) -> dict:
+        """Формат, в котором YouTubeAnalyzer исторически описывает канал."""
+        return {'type': self.type, 'value': self.value}
+
+
+def parse_links(text: str) -> list[ParsedLink]:
+    """
+    Находит все ссылки на видео и каналы в сообщении за один проход.
+    Если ссылок нет, а текст не похож на URL, он считается поисковым запросом канала.
+    Повторы убираются, порядок появления в тексте сохраняется.
+    """
+    links = []
+    seen = set()
+    for match in _LINK_RE.finditer(text):
+        kind, value_type = _GROUP_TYPES[match.lastgroup]
+        link = ParsedLink(kind, value_type, match.group(match.lastgroup))
+        if link not in seen:
+            seen.add(link)
+            links.append(link)
+
+    if not links and not _URL_HINT_RE.search(text):
+        query = text.replace('@', '').strip()
+        if query:
+            links.append(ParsedLink('channel', 'search_query', query))
+    return links
+
+
+def parse_link(text: str, kind: str | None = None) -> ParsedLink | None:
+    """Первая ссылка в тексте (при необходимости — только заданного вида)."""
+    for link in parse_links(text):
+        if kind is None or link.kind == kind:
+            return link
+    return None
+
+
+_BARE_VIDEO_ID_RE = re.compile(r"[a-zA-Z0-9_-]{11}")
+_TOKEN_SEPARATOR_RE = re.compile(r"[\s,;]+")
+
+
+def parse_video_ids(text: str) -> list[str]:
+    """
+    Все ID видео из текста: ссылки любого формата и "голые" 11-символьные ID
+    (по одному на строку, через пробел или запятую). Голые ID берутся только из строк,
+    которые целиком состоят из ID: иначе любое 11-буквенное слово обычного текста
+    ("interesting") стало бы ID. Повторы убираются.
+    """
+    ids = [link.value for link in parse_links(text) if link.is_video]
+    for line in _LINK_RE.sub(" ", text).splitlines():
+        tokens = [token for token in _TOKEN_SEPARATOR_RE.split(line) if token]
+        if tokens and all(_BARE_VIDEO_ID_RE.fullmatch(token) for token in tokens):
+            ids.extend(tokens)
+    return list(dict.fromkeys(ids))
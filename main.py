@@ -4,29 +4,98 @@ import logging
 import html
 import io
 import os
+import sys
 import asyncio 
+import re
+import importlib
 from aiohttp import web  
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command, StateFilter
+from aiogram.filters import Command, CommandObject, StateFilter
+from aiogram.dispatcher.flags import get_flag
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import BufferedInputFile, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
 
-from config import TELEGRAM_BOT_TOKEN
+from config import (TELEGRAM_BOT_TOKEN, DEFAULT_TIMEZONE, HEALTH_DEPTH_DEFAULT, HEALTH_DEPTH_MAX, BULK_MAX_VIDEOS,
+                    JOB_WORKERS, JOB_DB_PATH, JOB_PROGRESS_INTERVAL, BOT_WORKERS,
+                    WATCH_DB_PATH, WATCH_MIN_INTERVAL, WATCH_MAX_INTERVAL, WATCH_MAX_PER_USER, WATCH_CONCURRENCY,
+                    NICHE_SESSION_DIR, NICHE_SESSION_MAX_AGE,
+                    THUMB_CONCURRENCY, THUMB_ZIP_PART_BYTES, THUMB_MAX_VIDEOS, ARTIFACT_TTL, ARTIFACT_MAX_SIZE,
+                    KEYWORDS_MAX_VIDEOS, KEYWORDS_NICHE_DEPTH, KEYWORDS_MAX_NICHE_CHANNELS, HANDLER_BUDGET,
+                    TRENDS_BUDGET, BULK_BUDGET,
+                    TG_CHAT_RATE, TG_GROUP_RATE, TG_GLOBAL_RATE, TG_BURST, NICHE_OUTLIER_DEPTH,
+                    COMPARE_MAX_CHANNELS)
 from youtube_analyzer import YouTubeAnalyzer
-from trends_analyzer import analyze_google_trends
-from excel_generator import ExcelGenerator
-from channel_graphics import create_activity_graphs, create_heatmap_graph
-from datetime import datetime
+from analytics import channel_health, format_health
+from link_parser import ParsedLink, parse_links, parse_video_ids
+from cache_store import make_cache
+from job_queue import JobQueue, JobContext, DONE
+from watchlist import WatchScheduler
+from niche_session import NicheSessionLog
+from thumbnails import ThumbnailFetcher, SpooledInputFile
+from artifacts import ArtifactStore
+from search_index import HIGHLIGHT_START, HIGHLIGHT_END
+import deadline
+from send_throttle import SendThrottle
+from datetime import datetime, date
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import httpx
 import numpy as np
 
 logging.basicConfig(level=logging.INFO)
 
+# Сколько ссылок из одного сообщения разбирать по очереди
+MAX_LINKS_PER_MESSAGE = 10
+# Сколько каналов можно добавить в отслеживание одним сообщением
+WATCH_MAX_PER_MESSAGE = 50
+
+# Тяжелые подсистемы (matplotlib, pytrends с pandas, openpyxl) импортируются
+# внутри хендлеров при первом использовании, а после старта polling
+# подгружаются в фоне (см. prewarm), чтобы бот поднимался быстрее
+PREWARM_MODULES = ("channel_graphics", "excel_generator", "trends_analyzer")
+PREWARM_DELAY = 1.0
+
 bot = Bot(token=TELEGRAM_BOT_TOKEN)
+# Все исходящие запросы идут через троттлинг: темп по чатам и по боту, склейка
+# правок прогресса, ожидание по RetryAfter. В многопроцессном режиме общий
+# лимит бота делится между процессами
+send_throttle = SendThrottle(TG_CHAT_RATE, TG_GROUP_RATE, TG_GLOBAL_RATE / BOT_WORKERS, burst=TG_BURST)
+bot.session.middleware(send_throttle)
 dp = Dispatcher()
+
+
+@dp.message.middleware()
+@dp.callback_query.middleware()
+async def handler_budget(handler, event, data):
+    """
+    Общий срок на каждый интерактивный обработчик (deadline): внешние вызовы внутри
+    получают таймаут из остатка, необязательные данные при нехватке времени опускаются.
+    Обработчик может задать свой срок флагом budget. Фоновые задачи (job_queue)
+    выполняются в своих воркерах и этот срок не наследуют.
+    """
+    with deadline.budget(get_flag(data, "budget", default=HANDLER_BUDGET)):
+        return await handler(event, data)
 youtube_analyzer = YouTubeAnalyzer()
 
+# Долгие операции (выгрузки, теплокарты, Excel) выполняются фоновыми задачами
+job_queue = JobQueue(JOB_DB_PATH, workers=JOB_WORKERS, progress_interval=JOB_PROGRESS_INTERVAL)
+
+# Отслеживание новых загрузок на каналах (/watch)
+watch_scheduler = WatchScheduler(WATCH_DB_PATH, youtube_analyzer, WATCH_MIN_INTERVAL, WATCH_MAX_INTERVAL,
+                                 concurrency=WATCH_CONCURRENCY)
+
+# Превью видео берутся напрямую с i.ytimg.com, без запросов к YouTube API
+thumbnail_fetcher = ThumbnailFetcher(concurrency=THUMB_CONCURRENCY, part_bytes=THUMB_ZIP_PART_BYTES)
+
+# Результаты анализа канала для кнопок "график" и "теплокарта" (токен в callback_data)
+artifact_store = ArtifactStore(ttl=ARTIFACT_TTL, max_size=ARTIFACT_MAX_SIZE)
+
+# Фоновые правки прогресса (show_progress): ссылки держим, пока задачи не завершатся
+_progress_tasks = set()
+
+# Названия стран по ISO-коду почти не меняются
+country_cache = make_cache("country", ttl=7 * 24 * 3600, max_size=512)
+
 
 class UserStates(StatesGroup):
     waiting_for_video_link = State()
@@ -35,6 +104,7 @@ class UserStates(StatesGroup):
     waiting_for_niche_name = State()
     niche_analysis = State()
     waiting_for_all_titles_link = State() # 👈 НОВОЕ СОСТОЯНИЕ
+    waiting_for_bulk_videos = State()
 
 def get_main_keyboard():
     buttons = [
@@ -59,6 +129,35 @@ def get_niche_analysis_keyboard():
     return keyboard
 
 
+def show_progress(msg: types.Message, text: str):
+    """
+    Правка сообщения с прогрессом без ожидания ответа Telegram. Если чат упирается
+    в лимит, шаг, не успевший уйти, склеивается со следующей правкой (см. SendThrottle).
+    """
+    # edit_text возвращает объект метода Bot API (awaitable, но не корутину)
+    task = asyncio.ensure_future(msg.edit_text(text))
+    _progress_tasks.add(task)
+    task.add_done_callback(_progress_done)
+
+
+async def render_chart(name: str, *args, **kwargs):
+    """
+    Рисует график channel_graphics.<name> в пуле потоков: matplotlib и Pillow
+    (и импорт channel_graphics при первом графике) не останавливают event loop,
+    пока другой поток держит блокировку рендера.
+    """
+    def render():
+        return getattr(importlib.import_module("channel_graphics"), name)(*args, **kwargs)
+
+    return await asyncio.get_running_loop().run_in_executor(None, render)
+
+
+def _progress_done(task: asyncio.Task):
+    _progress_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.debug(f"Не удалось обновить прогресс: {task.exception()}")
+
+
 def pluralize_canal(count: int) -> str:
     """Возвращает правильную форму слова 'канал'."""
     if count % 10 == 1 and count % 100 != 11:
@@ -69,6 +168,18 @@ def pluralize_canal(count: int) -> str:
         return "каналов"
 
 
+def format_split_lines(formats: dict | None) -> list:
+    """Строки отчета о канале с метриками отдельно по Shorts и длинным видео (если есть оба формата)."""
+    if not formats or not formats.get('shorts') or not formats.get('long'):
+        return []
+    lines = []
+    for key, label in (("long", "🎬 Длинные"), ("shorts", "📱 Shorts")):
+        health = formats[key]
+        lines.append(f"├ {label} ({health['num_videos']}): медиана <code>{format_number(health['median_views'])}</code>,"
+                     f" ER <code>{health['er']} %</code>")
+    return lines
+
+
 def format_number(num_str: str) -> str:
     """Превращает '1234567' в '1.234.567'."""
     try:
@@ -79,16 +190,36 @@ def format_number(num_str: str) -> str:
 
 
 
+async def remove_reply_keyboard(message: types.Message):
+    """
+    Убирает клавиатуру "Готово и Скачать" анализа ниши: Telegram снимает ее только
+    сообщением с ReplyKeyboardRemove, поэтому отправляем служебное сообщение и удаляем.
+    Другие режимы reply-клавиатуру не показывают — там это лишние два запроса.
+    """
+    msg_to_delete = await message.answer(".", reply_markup=ReplyKeyboardRemove())
+    await msg_to_delete.delete()
+
+
 @dp.message(Command("start"))
 async def command_start_handler(message: types.Message, state: FSMContext):
+    leaving_niche = await state.get_state() == UserStates.niche_analysis.state
     await state.clear()
     welcome_text = (
         "🙋 <b>Привет!</b>\n"
         "<b>Отправь ссылку на видео/канал для анализа.</b>\n\n"
         "<blockquote><b>👇Ниже список моих команд</b></blockquote>\n"
         "<code>/analyze_video</code> — (анализ видео)\n"
-        "<code>/analyze_channel</code> — (анализ канала)\n"
+        "<code>/analyze_channel</code> — (анализ канала, можно с глубиной: <code>@vdud 200</code>)\n"
         "<code>/get_titles</code> — (все названия)\n"
+        "<code>/thumbs</code> — (архив превью всех видео канала)\n"
+        "<code>/compare</code> — (сравнение до 50 каналов)\n"
+        "<code>/comments</code> — (о чем пишут в комментариях к видео)\n"
+        "<code>/keywords</code> — (ключевые слова и теги канала, сравнение с нишей)\n"
+        "<code>/search</code> — (поиск по всем видео, которые уже видел бот)\n"
+        "<code>/heatmap</code> — (теплокарта за всю историю)\n"
+        "<code>/bulk</code> — (массовый анализ видео в таблицу)\n"
+        "<code>/watch</code> — (уведомления о новых видео канала)\n"
+        "<code>/watchlist</code> — (отслеживаемые каналы)\n"
         "<code>/google_trends</code> — (тренд-запросы)\n"
         "<code>/excel</code> — (сбор в Excel)\n"
         "<code>/cancel</code> — (отмена)\n\n"
@@ -99,23 +230,28 @@ async def command_start_handler(message: types.Message, state: FSMContext):
         parse_mode="HTML",
         reply_markup=get_main_keyboard()
     )
-    msg_to_delete = await message.answer(".", reply_markup=ReplyKeyboardRemove())
-    await msg_to_delete.delete()
+    if leaving_niche:
+        await remove_reply_keyboard(message)
 
 
 @dp.message(Command("cancel"))
 async def command_cancel_handler(message: types.Message, state: FSMContext):
+    cancelled_jobs = await job_queue.cancel_user_jobs(message.from_user.id)
     current_state = await state.get_state()
-    if current_state is None:
+    session_id = (await state.get_data()).get('session_id')
+    if session_id:
+        NicheSessionLog(NICHE_SESSION_DIR, session_id).delete()
+    if current_state is None and not cancelled_jobs:
         await message.answer("Вы не в каком-либо режиме.")
         return
     await state.clear()
+    jobs_text = f" Остановлено задач: {cancelled_jobs}." if cancelled_jobs else ""
     await message.answer(
-        "Действие отменено. Возвращаю в главное меню.",
+        f"Действие отменено.{jobs_text} Возвращаю в главное меню.",
         reply_markup=get_main_keyboard()
     )
-    msg_to_delete = await message.answer(".", reply_markup=ReplyKeyboardRemove())
-    await msg_to_delete.delete()
+    if current_state == UserStates.niche_analysis.state:
+        await remove_reply_keyboard(message)
 
 
 # --- Обработчики команд ---
@@ -126,8 +262,23 @@ async def command_analyze_video(message: types.Message, state: FSMContext):
     await state.set_state(UserStates.waiting_for_video_link)
 
 
+def split_depth_arg(text: str) -> tuple[str, int]:
+    """
+    Отделяет необязательную глубину анализа от ввода канала:
+    '@vdud 200' -> ('@vdud', 200). Глубина ограничена HEALTH_DEPTH_MAX.
+    """
+    channel_input, _, last = text.strip().rpartition(" ")
+    if channel_input and last.isdigit():
+        return channel_input.strip(), max(1, min(int(last), HEALTH_DEPTH_MAX))
+    return text.strip(), HEALTH_DEPTH_DEFAULT
+
+
 @dp.message(Command("analyze_channel"))
-async def command_analyze_channel(message: types.Message, state: FSMContext):
+async def command_analyze_channel(message: types.Message, state: FSMContext, command: CommandObject):
+    if command.args:
+        channel_input, depth = split_depth_arg(command.args)
+        await run_channel_analysis(message, channel_input, state, depth)
+        return
     await message.answer(
         "🔗 <b>Отправьте ссылку на канал, <code>@псевдоним</code> или название</b>",
         parse_mode="HTML"
@@ -171,39 +322,709 @@ async def callback_get_titles(callback_query: types.CallbackQuery, state: FSMCon
 async def process_get_all_titles(message: types.Message, state: FSMContext):
     channel_input = message.text
     msg = await message.answer("⏳ Начинаю сбор всех названий... Это может занять время (зависит от кол-ва видео).")
-    
-    # Вызываем новую функцию
-    result = await youtube_analyzer.get_all_video_titles(channel_input)
-    
-    if result.get("error"):
-        await msg.edit_text(f"❌ Ошибка: {result['error']}")
+
+    resolved = await youtube_analyzer.resolve_channel_id(channel_input)
+    if resolved.get("error"):
+        await msg.edit_text(f"❌ Ошибка: {resolved['error']}")
         # Не сбрасываем состояние сразу, вдруг юзер ошибся ссылкой
         return
 
+    await job_queue.submit("titles_export", message.from_user.id, message.chat.id,
+                           {"channel_id": resolved['channel_id']}, msg.message_id)
+    await state.clear()
+
+
+@job_queue.register("titles_export")
+async def titles_export_job(ctx: JobContext, channel_id: str):
+    async def on_progress(count: int):
+        await ctx.progress(f"⏳ Собрано названий: {count}...")
+
+    result = await youtube_analyzer.get_all_video_titles_by_id(channel_id, on_progress=on_progress)
+
+    if result.get("error"):
+        await ctx.progress(f"❌ Ошибка: {result['error']}", force=True)
+        return
+
     titles = result['titles']
     count = len(titles)
-    
+
     if count == 0:
-        await msg.edit_text("На канале не найдено видео.")
-        await state.clear()
+        await ctx.progress("На канале не найдено видео.", force=True)
         return
 
     # Формируем текст файла
     file_text = f"Список видео канала (Всего: {count})\n\n" + "\n".join(titles)
-    
+
     # Создаем файл в памяти
     file_buffer = io.BytesIO(file_text.encode('utf-8'))
     # Используем безопасное имя файла
     safe_name = result.get('channel_title', 'channel').replace(' ', '_')
     file_name = f"titles_{safe_name}.txt"
-    
+
     input_file = BufferedInputFile(file_buffer.getvalue(), filename=file_name)
-    
-await msg.delete()
-    await message.answer_document(
-        input_file, 
+
+    await ctx.finish()
+    await ctx.bot.send_document(
+        ctx.chat_id,
+        input_file,
         caption=f"✅ Готово! Собрано названий: <b>{count}</b>",
-        parse_mode="HTML" 
+        parse_mode="HTML"
+    )
+
+
+# --- 🖼 АРХИВ ПРЕВЬЮ КАНАЛА ---
+
+@dp.message(Command("thumbs"))
+async def command_thumbs(message: types.Message, command: CommandObject):
+    """
+    Превью всех видео канала одним ZIP-архивом (или несколькими частями).
+    """
+    if not command.args:
+        await message.answer(
+            "Использование: <code>/thumbs канал</code>\n"
+            "Например: <code>/thumbs @vdud</code>",
+            parse_mode="HTML"
+        )
+        return
+
+    msg = await message.answer("🖼 Собираю список видео канала...")
+    resolved = await youtube_analyzer.resolve_channel_id(command.args.strip())
+    if resolved.get("error"):
+        await msg.edit_text(f"❌ Ошибка: {resolved['error']}")
+        return
+
+    await job_queue.submit("thumbnails_zip", message.from_user.id, message.chat.id,
+                           {"channel_id": resolved['channel_id']}, msg.message_id)
+
+
+@job_queue.register("thumbnails_zip")
+async def thumbnails_zip_job(ctx: JobContext, channel_id: str):
+    async def on_list_progress(count: int):
+        await ctx.progress(f"🖼 Найдено видео: {count}...")
+
+    async def on_download_progress(done: int, total: int):
+        await ctx.progress(f"🖼 Скачано превью: {done} из {total}...")
+
+    result = await youtube_analyzer.get_all_video_ids_by_id(channel_id, limit=THUMB_MAX_VIDEOS,
+                                                            on_progress=on_list_progress)
+    if result.get("error"):
+        await ctx.progress(f"❌ Ошибка: {result['error']}", force=True)
+        return
+    video_ids = result['video_ids']
+    if not video_ids:
+        await ctx.progress("На канале не найдено видео.", force=True)
+        return
+
+    parts = 0
+    failed = 0
+    async for part in thumbnail_fetcher.iter_archives(video_ids, on_progress=on_download_progress):
+        parts += 1
+        failed = part['failed']
+        await ctx.bot.send_document(
+            ctx.chat_id,
+            SpooledInputFile(part['file'], filename=f"thumbs_{channel_id}_{parts}.zip"),
+            caption=f"🖼 Часть {parts}: превью — <b>{part['count']}</b>",
+            parse_mode="HTML"
+        )
+
+    if not parts:
+        await ctx.progress("❌ Не удалось скачать ни одного превью.", force=True)
+        return
+    await ctx.finish()
+    summary = f"✅ Готово! Видео: <b>{len(video_ids)}</b>, архивов: <b>{parts}</b>"
+    if failed:
+        summary += f"\n⚠️ Не удалось скачать превью: {failed}"
+    if len(video_ids) >= THUMB_MAX_VIDEOS:
+        summary += f"\nℹ️ Выгружены только {THUMB_MAX_VIDEOS} последних видео."
+    await ctx.bot.send_message(ctx.chat_id, summary, parse_mode="HTML")
+
+
+# --- 💬 АНАЛИЗ КОММЕНТАРИЕВ ---
+
+@dp.message(Command("comments"))
+async def command_comments(message: types.Message, command: CommandObject):
+    """
+    Сводка по комментариям видео: частые слова, авторы, вопросы, динамика.
+    """
+    video_ids = parse_video_ids(command.args or "")
+    if not video_ids:
+        await message.answer(
+            "Использование: <code>/comments ссылка_на_видео</code>\n"
+            "Например: <code>/comments https://youtu.be/dQw4w9WgXcQ</code>",
+            parse_mode="HTML"
+        )
+        return
+    msg = await message.answer("💬 Читаю комментарии...")
+    await job_queue.submit("comments", message.from_user.id, message.chat.id,
+                           {"video_id": video_ids[0]}, msg.message_id)
+
+
+@dp.callback_query(F.data.startswith("comments:"))
+async def comments_callback_handler(callback_query: types.CallbackQuery):
+    video_id = callback_query.data.split(":")[-1]
+    await callback_query.answer("💬 Читаю комментарии...")
+    msg = await callback_query.message.answer("💬 Читаю комментарии...")
+    await job_queue.submit("comments", callback_query.from_user.id, callback_query.message.chat.id,
+                           {"video_id": video_id}, msg.message_id)
+
+
+def format_comments_report(result: dict) -> str:
+    analyzed = result['analyzed']
+    scope = format_number(analyzed)
+    if result['truncated']:
+        scope += f" последних из {format_number(result['total_comments'])}"
+    lines = [
+        f"💬 <b>Комментарии: <a href='https://youtu.be/{result['video_id']}'>{html.escape(result['title'])}</a></b>",
+        f"├ Проанализировано: <code>{scope}</code>",
+        f"├ Ответов в ветках: <code>{format_number(result['replies'])}</code>",
+        f"└ Вопросов: <code>{format_number(result['questions'])}</code>"
+        f" ({result['questions'] / analyzed:.0%})"
+    ]
+    if result['top_terms']:
+        terms = ", ".join(f"{html.escape(term)} ({count})" for term, count in result['top_terms'])
+        lines += ["", "🔤 <b>Частые слова:</b>", terms]
+    if result['top_authors']:
+        authors = ", ".join(f"{html.escape(author)} ({count})" for author, count in result['top_authors'][:5])
+        lines += ["", "👥 <b>Самые активные:</b>", authors]
+    if result['top_liked']:
+        lines += ["", "👍 <b>Самые залайканные:</b>"]
+        for comment in result['top_liked']:
+            text = comment['text'] if len(comment['text']) <= 200 else comment['text'][:200] + "…"
+            lines.append(f"<blockquote>{html.escape(text)}\n— {html.escape(comment['author'])},"
+                         f" 👍 {format_number(comment['likes'])}</blockquote>")
+    return "\n".join(lines)
+
+
+@job_queue.register("comments")
+async def comments_job(ctx: JobContext, video_id: str):
+    async def on_progress(count: int):
+        await ctx.progress(f"💬 Прочитано комментариев: {count}...")
+
+    result = await youtube_analyzer.analyze_comments(video_id, on_progress=on_progress)
+    if result.get("error"):
+        await ctx.progress(f"❌ Ошибка: {result['error']}", force=True)
+        return
+    if result['analyzed'] == 0:
+        await ctx.progress("У видео пока нет комментариев.", force=True)
+        return
+
+    await ctx.finish()
+    await ctx.bot.send_message(ctx.chat_id, format_comments_report(result), parse_mode="HTML",
+                               disable_web_page_preview=True)
+    image_buffer = await render_chart("create_comments_graph", result['days'], result['per_day'])
+    if image_buffer:
+        from channel_graphics import chart_extension
+
+        photo = BufferedInputFile(image_buffer.getvalue(), filename=f"{video_id}_comments.{chart_extension()}")
+        await ctx.bot.send_photo(ctx.chat_id, photo, caption="Комментарии по дням.")
+
+
+# --- 🔤 КЛЮЧЕВЫЕ СЛОВА ---
+
+@dp.message(Command("keywords"))
+async def command_keywords(message: types.Message, command: CommandObject):
+    """
+    Ключевые слова канала по названиям и тегам, взвешенные просмотрами.
+    Остальные каналы в команде — ниша для сравнения словаря.
+    """
+    links = [link for link in parse_links(command.args or "") if not link.is_video]
+    if not links:
+        await message.answer(
+            "Использование: <code>/keywords канал [каналы ниши ...]</code>\n"
+            "Например: <code>/keywords @vdud @redgroupchannel @skazhigordeevoy</code>\n"
+            "Первый канал — анализируемый, остальные — ниша для сравнения.",
+            parse_mode="HTML"
+        )
+        return
+
+    msg = await message.answer("🔤 Ищу каналы...")
+    channel_ids = []
+    for link in links[:KEYWORDS_MAX_NICHE_CHANNELS + 1]:
+        resolved = await youtube_analyzer.resolve_channel_id(link)
+        if resolved.get("error"):
+            await msg.edit_text(f"❌ {html.escape(link.value)}: {resolved['error']}")
+            return
+        channel_ids.append(resolved['channel_id'])
+
+    await job_queue.submit("keywords", message.from_user.id, message.chat.id,
+                           {"channel_id": channel_ids[0], "niche_ids": channel_ids[1:]}, msg.message_id)
+
+
+def format_keywords_report(title: str, tables: dict, videos: int, niche_channels: int) -> str:
+    lines = [f"🔤 <b>Ключевые слова: {html.escape(title)}</b> (видео: {videos})", ""]
+    if tables['phrases']:
+        lines.append("<b>Фразы с наибольшими просмотрами:</b>")
+        lines += [
+            f"├ {html.escape(row['keyword'])} — {row['videos']} видео, {row['lift']}x медианы"
+            for row in tables['phrases'][:10]
+        ]
+    if tables['tags']:
+        lines += ["", "<b>Теги:</b>", ", ".join(html.escape(row['tag']) for row in tables['tags'][:15])]
+    if niche_channels:
+        if tables['distinctive']:
+            lines += ["", f"<b>Чаще, чем у ниши ({niche_channels} кан.):</b>",
+                      ", ".join(html.escape(row['keyword']) for row in tables['distinctive'][:10])]
+        if tables['missing']:
+            lines += ["", "<b>Есть в нише, мало у канала:</b>",
+                      ", ".join(html.escape(row['keyword']) for row in tables['missing'][:10])]
+    return "\n".join(lines)
+
+
+@job_queue.register("keywords")
+async def keywords_job(ctx: JobContext, channel_id: str, niche_ids: list | None = None):
+    from keyword_miner import keyword_table, tag_table, compare_vocabulary
+
+    async def on_progress(count: int):
+        await ctx.progress(f"🔤 Прочитано видео канала: {count}...")
+
+    info, corpus = await asyncio.gather(
+        youtube_analyzer.load_channel(channel_id),
+        youtube_analyzer.get_keyword_corpus(channel_id, KEYWORDS_MAX_VIDEOS, on_progress=on_progress)
+    )
+    if corpus.get("error"):
+        await ctx.progress(f"❌ Ошибка: {corpus['error']}", force=True)
+        return
+    if not corpus['titles']:
+        await ctx.progress("На канале не найдено видео.", force=True)
+        return
+
+    niche_titles = []
+    if niche_ids:
+        await ctx.progress(f"🔤 Читаю каналы ниши: {len(niche_ids)}...", force=True)
+        niche = await asyncio.gather(*(youtube_analyzer.get_keyword_corpus(niche_id, KEYWORDS_NICHE_DEPTH)
+                                       for niche_id in niche_ids))
+        for niche_corpus in niche:
+            niche_titles.extend(niche_corpus.get('titles', []))
+
+    def mine() -> dict:
+        # Подсчет по десяткам тысяч названий — в пуле потоков, чтобы не держать event loop
+        tables = {
+            "phrases": keyword_table(corpus['titles'], corpus['views'], top=200),
+            "tags": tag_table(corpus['tags'], corpus['views'], top=200),
+            "distinctive": [],
+            "missing": []
+        }
+        if niche_titles:
+            tables.update(compare_vocabulary(corpus['titles'], niche_titles, top=100))
+        return tables
+
+    loop = asyncio.get_running_loop()
+    tables = await loop.run_in_executor(None, mine)
+
+    from excel_generator import build_keywords_workbook
+
+    title = info['snippet']['title'] if info else channel_id
+    file_buffer = await loop.run_in_executor(None, build_keywords_workbook, tables)
+    await ctx.finish()
+    await ctx.bot.send_message(ctx.chat_id, format_keywords_report(title, tables, len(corpus['titles']),
+                                                                   len(niche_ids or [])), parse_mode="HTML")
+    await ctx.bot.send_document(ctx.chat_id, BufferedInputFile(file_buffer.getvalue(),
+                                                               filename=f"keywords_{channel_id}.xlsx"))
+
+
+# --- ⚖️ СРАВНЕНИЕ КАНАЛОВ ---
+
+# Лимит длины сообщения Telegram (4096) с запасом на HTML-разметку
+MESSAGE_CHUNK_LIMIT = 3800
+
+
+@dp.message(Command("compare"))
+async def command_compare(message: types.Message, command: CommandObject):
+    """Сравнение до COMPARE_MAX_CHANNELS каналов одной таблицей и графиком."""
+    links = [link for link in parse_links(command.args or "") if not link.is_video]
+    if len(links) < 2:
+        await message.answer(
+            "Использование: <code>/compare канал канал [канал ...]</code>\n"
+            "Например: <code>/compare @vdud @redgroupchannel @skazhigordeevoy</code>\n"
+            f"До {COMPARE_MAX_CHANNELS} каналов: ссылки, @псевдонимы или ID через пробел или с новой строки.",
+            parse_mode="HTML"
+        )
+        return
+    if len(links) > COMPARE_MAX_CHANNELS:
+        await message.answer(f"Каналов: {len(links)}. Сравню первые {COMPARE_MAX_CHANNELS}.")
+        links = links[:COMPARE_MAX_CHANNELS]
+
+    msg = await message.answer(f"⚖️ Ищу каналы: {len(links)}...")
+    # Ссылки с ID не требуют запросов, @псевдонимы разрешаются параллельно (и кэшируются)
+    resolved = await asyncio.gather(*(youtube_analyzer.resolve_channel_id(link) for link in links))
+    channel_ids = [r['channel_id'] for r in resolved if not r.get("error")]
+    unresolved = [link.value for link, r in zip(links, resolved) if r.get("error")]
+    if len(channel_ids) < 2:
+        await msg.edit_text("❌ Нашлось меньше двух каналов: "
+                            + html.escape(", ".join(unresolved) or "проверьте ссылки"))
+        return
+
+    await job_queue.submit("compare", message.from_user.id, message.chat.id,
+                           {"channel_ids": channel_ids, "unresolved": unresolved}, msg.message_id)
+
+
+def format_compare_report(result: dict, unresolved: list) -> list:
+    """Рейтинг каналов по медиане просмотров; список сообщений (таблица может не влезть в одно)."""
+    rows = result['rows']
+    lines = [f"⚖️ <b>Сравнение каналов: {len(rows)}</b> (по {result['depth']} последним видео)",
+             "<i>Медиана просмотров │ ER │ медиана / подписчики │ видео в неделю │ доля Shorts</i>", ""]
+    for rank, row in enumerate(rows, 1):
+        title = html.escape(row['title'] if len(row['title']) <= 32 else row['title'][:31] + "…")
+        if row['median_views'] is None:
+            lines.append(f"{rank}. <a href='{row['url']}'>{title}</a> — нет недавних видео")
+            continue
+        parts = [f"<code>{format_number(row['median_views'])}</code>", f"ER {row['er']}%"]
+        if row['views_to_subs'] is not None:
+            parts.append(f"{row['views_to_subs']}x подп.")
+        if row['per_week'] is not None:
+            parts.append(f"{row['per_week']}/нед")
+        if row['shorts_share'] is not None:
+            parts.append(f"Shorts {row['shorts_share']}%")
+        lines.append(f"{rank}. <a href='{row['url']}'>{title}</a> — " + " │ ".join(parts))
+
+    missing = unresolved + result.get('missing', [])
+    if missing:
+        lines += ["", "Не найдены: " + html.escape(", ".join(missing))]
+
+    chunks, current = [], ""
+    for line in lines:
+        if current and len(current) + len(line) + 1 > MESSAGE_CHUNK_LIMIT:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    chunks.append(current)
+    return chunks
+
+
+@job_queue.register("compare")
+async def compare_job(ctx: JobContext, channel_ids: list, unresolved: list | None = None):
+    async def on_progress(done: int, total: int):
+        await ctx.progress(f"⚖️ Статистика последних видео: {done}/{total} каналов...")
+
+    await ctx.progress(f"⚖️ Загружаю статистику каналов: {len(channel_ids)}...", force=True)
+    result = await youtube_analyzer.compare_channels(channel_ids, on_progress=on_progress)
+    if result.get("error"):
+        await ctx.progress(f"❌ Ошибка: {result['error']}", force=True)
+        return
+
+    rows = result['rows']
+    chart = await render_chart("create_compare_graph", [r['title'] for r in rows],
+                               [r['median_views'] for r in rows], [r['er'] for r in rows])
+    await ctx.finish()
+    if chart is not None:
+        from channel_graphics import chart_extension
+        await ctx.bot.send_photo(ctx.chat_id, BufferedInputFile(chart.getvalue(),
+                                                                filename=f"compare.{chart_extension()}"))
+    for chunk in format_compare_report(result, unresolved or []):
+        await ctx.bot.send_message(ctx.chat_id, chunk, parse_mode="HTML", disable_web_page_preview=True)
+
+
+# --- 🔎 ПОИСК ПО ЛОКАЛЬНОМУ ИНДЕКСУ ---
+
+# Сколько результатов показывать в ответе на /search
+SEARCH_RESULTS = 10
+
+
+def highlight(text: str) -> str:
+    """Экранирует сниппет FTS5 и превращает маркеры совпадений в жирный шрифт."""
+    return html.escape(text).replace(HIGHLIGHT_START, "<b>").replace(HIGHLIGHT_END, "</b>")
+
+
+@dp.message(Command("search"))
+async def command_search(message: types.Message, command: CommandObject):
+    """
+    Поиск по названиям, тегам и описаниям всех видео, которые бот уже скачивал
+    (анализ видео и каналов, выгрузки названий, /keywords, /watch). Без запросов к API.
+    """
+    index = youtube_analyzer.search_index
+    if not command.args:
+        stats = index.stats()
+        await message.answer(
+            "Использование: <code>/search запрос</code>\n"
+            "Например: <code>/search майнкрафт выживание</code>\n\n"
+            f"В индексе видео: <b>{stats['videos']}</b>, каналов: <b>{stats['channels']}</b>.",
+            parse_mode="HTML"
+        )
+        return
+
+    results = index.search(command.args, limit=SEARCH_RESULTS)
+    if not results:
+        await message.answer("🔎 Ничего не найдено. Индекс пополняется по мере анализа каналов и видео.")
+        return
+
+    lines = [f"🔎 <b>Результаты по запросу «{html.escape(command.args)}»:</b>", ""]
+    for number, video in enumerate(results, 1):
+        title = html.escape(video['title'] or video['video_id'])
+        line = f"{number}. <a href='https://youtu.be/{video['video_id']}'>{title}</a>"
+        if video['channel_title']:
+            line += f" — {html.escape(video['channel_title'])}"
+        if video['views'] is not None:
+            line += f" (▶️ {format_number(video['views'])})"
+        lines.append(line)
+        # Сниппет показываем, только если совпадение нашлось не в самом названии
+        snippet = video['snippet'] or ""
+        if snippet.replace(HIGHLIGHT_START, "").replace(HIGHLIGHT_END, "") != (video['title'] or ""):
+            lines.append(f"<i>{highlight(snippet)}</i>")
+    await message.answer("\n".join(lines), parse_mode="HTML", disable_web_page_preview=True)
+
+
+# --- 🗓 ТЕПЛОКАРТА ЗА ВСЮ ИСТОРИЮ ---
+
+# Диапазон дат в аргументах /heatmap: цифры и дефисы по обе стороны от ".." (концы необязательны)
+_DATE_RANGE_RE = re.compile(r"[\d-]*\.\.[\d-]*")
+
+
+def parse_heatmap_args(args: str) -> dict:
+    """
+    Разбирает аргументы /heatmap: канал, часовой пояс и диапазон дат.
+    Пример: <code>/heatmap @vdud Europe/Moscow 2023-01-01..2023-12-31</code>
+    """
+    parts = args.split()
+    options = {"channel_input": None, "tz_name": DEFAULT_TIMEZONE, "date_from": None, "date_to": None}
+    for part in parts:
+        if _DATE_RANGE_RE.fullmatch(part):
+            date_from, _, date_to = part.partition("..")
+            options['date_from'] = date.fromisoformat(date_from) if date_from else None
+            options['date_to'] = date.fromisoformat(date_to) if date_to else None
+        elif options['channel_input'] is None:
+            options['channel_input'] = part
+        else:
+            # Проверяем, что такой часовой пояс существует; "../x" и т.п. ZoneInfo отвергает через ValueError
+            try:
+                ZoneInfo(part)
+            except ValueError as e:
+                raise ZoneInfoNotFoundError(part) from e
+            options['tz_name'] = part
+    return options
+
+
+HEATMAP_USAGE = (
+    "Использование: <code>/heatmap канал [часовой пояс] [ГГГГ-ММ-ДД..ГГГГ-ММ-ДД]</code>\n"
+    "Например: <code>/heatmap @vdud Europe/Moscow 2023-01-01..2023-12-31</code>"
+)
+
+
+@dp.message(Command("heatmap"))
+async def command_heatmap(message: types.Message, command: CommandObject):
+    """
+    Теплокарта по всей истории канала в выбранном часовом поясе.
+    """
+    if not command.args:
+        await message.answer(HEATMAP_USAGE, parse_mode="HTML")
+        return
+    try:
+        options = parse_heatmap_args(command.args)
+    except ZoneInfoNotFoundError:
+        await message.answer("❌ Неизвестный часовой пояс. Пример: <code>Europe/Moscow</code>", parse_mode="HTML")
+        return
+    except ValueError:
+        await message.answer("❌ Неверный формат дат. Пример: <code>2023-01-01..2023-12-31</code>", parse_mode="HTML")
+        return
+    if options['channel_input'] is None:
+        await message.answer(HEATMAP_USAGE, parse_mode="HTML")
+        return
+
+    msg = await message.answer("🗓 Читаю всю историю загрузок канала... Это может занять время.")
+    resolved = await youtube_analyzer.resolve_channel_id(options['channel_input'])
+    if resolved.get("error"):
+        await msg.edit_text(f"❌ Ошибка: {resolved['error']}")
+        return
+
+    params = {
+        "channel_id": resolved['channel_id'], "full_history": True, "tz_name": options['tz_name'],
+        "date_from": options['date_from'].isoformat() if options['date_from'] else None,
+        "date_to": options['date_to'].isoformat() if options['date_to'] else None
+    }
+    await job_queue.submit("heatmap", message.from_user.id, message.chat.id, params, msg.message_id)
+
+
+@job_queue.register("heatmap")
+async def heatmap_job(ctx: JobContext, channel_id: str, full_history: bool = False, tz_name: str = "UTC",
+                      date_from: str | None = None, date_to: str | None = None):
+    async def on_progress(count: int):
+        await ctx.progress(f"🗓 Прочитано видео: {count}...")
+
+    heatmap_data = await youtube_analyzer.get_publication_heatmap_data(
+        channel_id, full_history=full_history, tz_name=tz_name,
+        date_from=date.fromisoformat(date_from) if date_from else None,
+        date_to=date.fromisoformat(date_to) if date_to else None,
+        on_progress=on_progress
+    )
+    await ctx.finish()
+    await send_heatmap(ctx.bot, ctx.chat_id, channel_id, heatmap_data)
+
+
+# --- 👀 ОТСЛЕЖИВАНИЕ КАНАЛОВ ---
+
+def format_interval(seconds: float) -> str:
+    if seconds < 3600:
+        return f"{max(int(seconds // 60), 1)} мин"
+    if seconds < 2 * 86400:
+        return f"{seconds / 3600:.1f} ч"
+    return f"{seconds / 86400:.1f} дн"
+
+
+@dp.message(Command("watch"))
+async def command_watch(message: types.Message, command: CommandObject):
+    """
+    Подписка на новые видео каналов: можно несколько ссылок через пробел или с новой строки.
+    """
+    links = [link for link in parse_links(command.args or "") if not link.is_video]
+    if not links:
+        await message.answer(
+            "Использование: <code>/watch канал [канал ...]</code>\n"
+            "Например: <code>/watch @vdud https://www.youtube.com/@redgroupchannel</code>\n"
+            "Бот пришлет сообщение, когда на канале выйдет новое видео.",
+            parse_mode="HTML"
+        )
+        return
+
+    user_id = message.from_user.id
+    free_slots = WATCH_MAX_PER_USER - watch_scheduler.store.count_user(user_id)
+    if free_slots <= 0:
+        await message.answer(f"❌ Можно отслеживать не больше {WATCH_MAX_PER_USER} каналов. Уберите лишние: /unwatch")
+        return
+
+    links = links[:min(WATCH_MAX_PER_MESSAGE, free_slots)]
+    msg = await message.answer(f"👀 Добавляю каналы в отслеживание: {len(links)}...")
+    lines = []
+    for link in links:
+        resolved = await youtube_analyzer.resolve_channel_id(link)
+        if resolved.get("error"):
+            lines.append(f"❌ {html.escape(link.value)}: {resolved['error']}")
+            continue
+        result = await watch_scheduler.watch(user_id, message.chat.id, resolved['channel_id'])
+        if result.get("error"):
+            lines.append(f"❌ {html.escape(link.value)}: {result['error']}")
+        elif result['created']:
+            lines.append(f"✅ {html.escape(result['title'])}")
+        else:
+            lines.append(f"☑️ {html.escape(result['title'])} — уже отслеживается")
+
+    await msg.edit_text("<b>👀 Отслеживание</b>\n\n" + "\n".join(lines), parse_mode="HTML")
+
+
+@dp.message(Command("unwatch"))
+async def command_unwatch(message: types.Message, command: CommandObject):
+    links = [link for link in parse_links(command.args or "") if not link.is_video]
+    if not links:
+        await message.answer("Использование: <code>/unwatch канал [канал ...]</code>", parse_mode="HTML")
+        return
+
+    lines = []
+    for link in links[:WATCH_MAX_PER_MESSAGE]:
+        resolved = await youtube_analyzer.resolve_channel_id(link)
+        if resolved.get("error"):
+            lines.append(f"❌ {html.escape(link.value)}: {resolved['error']}")
+        elif watch_scheduler.store.unsubscribe(message.from_user.id, resolved['channel_id']):
+            lines.append(f"🗑 {html.escape(link.value)} — больше не отслеживается")
+        else:
+            lines.append(f"➖ {html.escape(link.value)} — не был в списке")
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
+@dp.message(Command("watchlist"))
+async def command_watchlist(message: types.Message):
+    channels = watch_scheduler.store.user_channels(message.from_user.id)
+    if not channels:
+        await message.answer("Список отслеживания пуст. Добавить канал: <code>/watch @канал</code>", parse_mode="HTML")
+        return
+
+    shown = 50
+    now = datetime.now().timestamp()
+    lines = [f"<b>👀 Отслеживаемые каналы ({len(channels)}):</b>\n"]
+    for channel in channels[:shown]:
+        last = channel['last_published'][:10] if channel['last_published'] else "—"
+        next_check = format_interval(max(channel['next_check'] - now, 0))
+        lines.append(
+            f"▪️ <a href='https://www.youtube.com/channel/{channel['channel_id']}'>{html.escape(channel['title'])}</a>"
+            f" — последнее видео: {last}, проверка через {next_check}"
+        )
+    if len(channels) > shown:
+        lines.append(f"\n… и еще {len(channels) - shown}")
+    await message.answer("\n".join(lines), parse_mode="HTML", disable_web_page_preview=True)
+
+
+# --- 📋 МАССОВЫЙ АНАЛИЗ ВИДЕО ---
+
+@dp.message(Command("bulk"))
+async def command_bulk(message: types.Message, state: FSMContext, command: CommandObject):
+    file_format = "csv" if (command.args or "").strip().lower() == "csv" else "xlsx"
+    await message.answer(
+        f"📋 <b>Массовый анализ видео ({file_format.upper()})</b>\n\n"
+        f"Отправьте одним сообщением ссылки или ID видео (до {BULK_MAX_VIDEOS} шт.) — "
+        f"по одной на строку или через пробел.",
+        parse_mode="HTML"
+    )
+    await state.set_state(UserStates.waiting_for_bulk_videos)
+    await state.update_data(bulk_format=file_format)
+
+
+def build_bulk_summary(videos: list, missing: list) -> str:
+    """
+    Короткая сводка по массовому анализу: медианы и лидер по просмотрам.
+    """
+    views = np.array([int(v['views']) for v in videos], dtype=np.int64)
+    likes = np.array([int(v['likes']) for v in videos], dtype=np.int64)
+    comments = np.array([int(v['comments']) for v in videos], dtype=np.int64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        er = np.where(views > 0, (likes + comments) / views * 100, 0.0)
+    top = videos[int(np.argmax(views))]
+    lines = [
+        f"✅ <b>Готово! Видео в таблице: {len(videos)}</b>",
+        f"├ Всего просмотров: <code>{format_number(int(views.sum()))}</code>",
+        f"├ Медиана просмотров: <code>{format_number(int(np.median(views)))}</code>",
+        f"├ Медиана ER: <code>{np.median(er):.2f} %</code>",
+        f"└ Лидер: <a href='{top['url']}'>{html.escape(top['title'][:60])}</a>"
+    ]
+    if missing:
+        lines.append(f"\n⚠️ Не найдено или недоступно: {len(missing)}")
+    return "\n".join(lines)
+
+
+@dp.message(UserStates.waiting_for_bulk_videos, flags={"budget": BULK_BUDGET})
+async def process_bulk_videos(message: types.Message, state: FSMContext):
+    video_ids = parse_video_ids(message.text or "")
+    if not video_ids:
+        await message.answer("Не нашел ни одной ссылки или ID видео. Попробуйте еще раз или /cancel.")
+        return
+    if len(video_ids) > BULK_MAX_VIDEOS:
+        await message.answer(f"Слишком много видео: {len(video_ids)}. Обработаю первые {BULK_MAX_VIDEOS}.")
+        video_ids = video_ids[:BULK_MAX_VIDEOS]
+
+    file_format = (await state.get_data()).get('bulk_format', 'xlsx')
+    msg = await message.answer(f"⏳ Анализирую {len(video_ids)} видео...")
+
+    result = await youtube_analyzer.get_videos_bulk(video_ids)
+    if result.get("error"):
+        await msg.edit_text(f"❌ Ошибка: {result['error']}")
+        await state.clear()
+        return
+
+    videos = result['videos']
+    if not videos:
+        await msg.edit_text("❌ Ни одно из видео не найдено или недоступно.")
+        await state.clear()
+        return
+
+    # ГЕО: по одному запросу на уникальную страну, а не на каждое видео
+    geo_codes = sorted({v['geo_code'] for v in videos if v['geo_code'] != 'N/A'})
+    geo_names = dict(zip(geo_codes, await asyncio.gather(*(get_country_info(code) for code in geo_codes))))
+    for video in videos:
+        video['geo_code'] = geo_names.get(video['geo_code'], video['geo_code'])
+
+    videos.sort(key=lambda v: int(v['views']), reverse=True)
+    from excel_generator import VideoTableGenerator, build_videos_csv
+
+    if file_format == "csv":
+        file_buffer = build_videos_csv(videos)
+    else:
+        generator = VideoTableGenerator()
+        for video in videos:
+            generator.add_video(video)
+        file_buffer = generator.save_to_buffer()
+
+    file_to_send = BufferedInputFile(file_buffer.getvalue(), filename=f"videos_{len(videos)}.{file_format}")
+    await msg.delete()
+    await message.answer_document(
+        file_to_send,
+        caption=build_bulk_summary(videos, result['missing']),
+        parse_mode="HTML"
     )
     await state.clear()
 
@@ -223,10 +1044,11 @@ async def trends_callback_handler(callback_query: types.CallbackQuery, state: FS
     await callback_query.answer()
 
 
-@dp.message(UserStates.waiting_for_trends_query)
+@dp.message(UserStates.waiting_for_trends_query, flags={"budget": TRENDS_BUDGET})
 async def process_trends_query(message: types.Message, state: FSMContext):
     query = message.text
     msg = await message.answer(f"📈 Анализирую тренд для '{query}'... Это может занять до 30 секунд.")
+    from trends_analyzer import analyze_google_trends
     analysis_result = await analyze_google_trends(query)
     if analysis_result.get("error"):
         await msg.edit_text(f"❌ Ошибка: {analysis_result['error']}")
@@ -268,7 +1090,8 @@ async def start_excel_analysis_button(callback_query: types.CallbackQuery, state
 @dp.message(UserStates.waiting_for_niche_name)
 async def process_niche_name(message: types.Message, state: FSMContext):
     niche_name = message.text
-    await state.update_data(niche_name=niche_name, channels=[])
+    session = NicheSessionLog.create(NICHE_SESSION_DIR)
+    await state.update_data(niche_name=niche_name, session_id=session.session_id, channels_count=0)
     response_text = (
         f"✅ Файл <b>{html.escape(niche_name)}.xlsx</b> успешно создан.\n\n"
         f"Теперь отправляйте названия каналов, ссылки или <code>@псевдонимы</code> — я сохраню их в таблицу автоматически.\n\n"
@@ -290,35 +1113,87 @@ async def finish_excel_analysis(message: types.Message, state: FSMContext):
     )
     state_data = await state.get_data()
     niche_name = state_data.get('niche_name', 'Анализ')
-    channels_list = state_data.get('channels', [])
-    if not channels_list:
+    session_id = state_data.get('session_id')
+    if not session_id or not state_data.get('channels_count'):
+        if session_id:
+            NicheSessionLog(NICHE_SESSION_DIR, session_id).delete()
         await msg.edit_text(
             "Вы не добавили ни одного канала. Отправка файла отменена.",
             reply_markup=get_main_keyboard()
         )
         await state.clear()
         return
-    generator = ExcelGenerator(niche_name)
-    for channel_data in channels_list:
-        generator.add_channel_data(channel_data['category'], channel_data)
-    file_buffer = generator.save_to_buffer()
-    file_to_send = BufferedInputFile(
-        file_buffer.getvalue(),
-        filename=f"{niche_name}.xlsx"
-    )
-    await msg.delete()
-    await message.answer_document(
-        file_to_send,
-        caption=f"Ваш анализ ниши '{niche_name}' готов."
-    )
+    await job_queue.submit("niche_excel", message.from_user.id, message.chat.id,
+                           {"niche_name": niche_name, "session_id": session_id}, msg.message_id)
     await state.clear()
 
 
+@job_queue.register("niche_excel")
+async def niche_excel_job(ctx: JobContext, niche_name: str, session_id: str | None = None,
+                          channels: list | None = None):
+    from excel_generator import ExcelGenerator
+    # channels — формат задач, поставленных до журнала сессий
+    session = NicheSessionLog(NICHE_SESSION_DIR, session_id) if session_id else None
+    records = session if session is not None else channels or []
+
+    try:
+        # Записи журнала идут в книгу по одной; для поиска выбросов
+        # запоминаются только поля, нужные для этого этапа
+        generator = ExcelGenerator(niche_name)
+        outlier_channels, seen_ids = [], set()
+        for channel_data in records:
+            generator.add_channel_data(channel_data['category'], channel_data)
+            if channel_data.get('channel_id') and channel_data['channel_id'] not in seen_ids:
+                seen_ids.add(channel_data['channel_id'])
+                outlier_channels.append({key: channel_data[key] for key in ('channel_id', 'name', 'url', 'subs')})
+
+        # Финальный этап: видео, обогнавшие свой канал, по всей нише
+        caption = f"Ваш анализ ниши '{niche_name}' готов."
+        if outlier_channels:
+            async def on_progress(done: int, total: int):
+                await ctx.progress(f"🔎 Ищу видео-выбросы по нише: {done}/{total} каналов...")
+
+            result = await youtube_analyzer.get_niche_outliers(outlier_channels, on_progress=on_progress)
+            outliers = [
+                dict(row, channel_name=outlier_channels[row['channel']]['name'],
+                     channel_url=outlier_channels[row['channel']]['url'],
+                     subs=outlier_channels[row['channel']]['subs'])
+                for row in result['outliers']
+            ]
+            if outliers:
+                generator.add_outliers_sheet(outliers)
+                caption += (f"\nНа листе «Выбросы ниши» — {len(outliers)} видео из {result['videos_scanned']} "
+                            f"проверенных, обогнавших медиану своего канала (Shorts и длинные видео — отдельно).")
+
+        file_buffer = generator.save_to_buffer()
+        file_to_send = BufferedInputFile(
+            file_buffer.getvalue(),
+            filename=f"{niche_name}.xlsx"
+        )
+        ctx.mark_done()
+        await ctx.finish()
+        await ctx.bot.send_document(
+            ctx.chat_id,
+            file_to_send,
+            caption=caption
+        )
+    except asyncio.CancelledError:
+        if not ctx.job.cancel_requested and ctx.job.status != DONE:
+            session = None  # бот останавливается: журнал нужен задаче после перезапуска
+        raise
+    finally:
+        # Отмена (/cancel), ошибка или успех — журнал сессии больше не нужен
+        if session is not None:
+            session.delete()
+
+
 @dp.message(UserStates.niche_analysis)
 async def process_niche_channel_input(message: types.Message, state: FSMContext):
     channel_input = message.text
-    msg = await message.answer(f"🔍 Анализирую '{channel_input}'... (Шаг 1/4: Получение данных канала)")
-    channel_data = await youtube_analyzer.analyze_channel(channel_input)
+    msg = await message.answer(f"🔍 Анализирую '{channel_input}'... (Шаг 1/2: Получение данных канала)")
+    # Та же глубина, что у поиска выбросов ниши: одна страница плейлиста и один videos.list,
+    # а выборка переиспользуется для идей и финального этапа (кэш статистики)
+    channel_data = await youtube_analyzer.analyze_channel(channel_input, NICHE_OUTLIER_DEPTH)
     if channel_data.get("error"):
         await msg.edit_text(f"❌ Ошибка: {channel_data['error']}")
         return
@@ -333,23 +1208,17 @@ async def process_niche_channel_input(message: types.Message, state: FSMContext)
     else:
         category_key, category_name = 'tiny', "Совсем маленькие"
     channel_id = channel_data['channel_id']
-    await msg.edit_text(f"... (Шаг 2/4: Поиск топ-видео за 7 дней)")
-    idea_7d = await youtube_analyzer.get_most_popular_video_in_range(channel_id, 7)
-    await msg.edit_text(f"... (Шаг 3/4: Поиск топ-видео за 14 дней)")
-    idea_14d = await youtube_analyzer.get_most_popular_video_in_range(channel_id, 14)
-    await msg.edit_text(f"... (Шаг 4/4: Поиск топ-видео за 30 дней)")
-    idea_30d = await youtube_analyzer.get_most_popular_video_in_range(channel_id, 30)
+    show_progress(msg, "... (Шаг 2/2: Топ-видео за 7, 14 и 30 дней)")
+    ideas = await youtube_analyzer.get_video_ideas(channel_id, channel_data.get('recent_stats'))
     state_data = await state.get_data()
-    channels_list = state_data.get('channels', [])
-    new_entry = {
-        'category': category_key, 'name': channel_data['title'],
-        'url': channel_data['url'], 'subs': subs_count,
-        'views': int(channel_data.get('view_count', 0)),
-        'idea_7d': idea_7d, 'idea_14d': idea_14d, 'idea_30d': idea_30d
-    }
-    channels_list.append(new_entry)
-    await state.update_data(channels=channels_list)
-    count = len(channels_list)
+    new_entry = dict(
+        ideas, category=category_key, name=channel_data['title'],
+        channel_id=channel_id, url=channel_data['url'], subs=subs_count,
+        views=int(channel_data.get('view_count', 0))
+    )
+    NicheSessionLog(NICHE_SESSION_DIR, state_data['session_id']).append(new_entry)
+    count = state_data.get('channels_count', 0) + 1
+    await state.update_data(channels_count=count)
     canal_word = pluralize_canal(count)
     response_text = (
         f"✅ Канал {html.escape(channel_data['title'])} добавлен в категорию «{category_name}».\n\n"
@@ -365,14 +1234,26 @@ async def process_niche_channel_input(message: types.Message, state: FSMContext)
 async def get_country_info(code: str) -> str:
     if code == 'N/A':
         return ""
-    try:
+    cached = country_cache.get(code)
+    if cached:
+        return cached
+
+    async def fetch() -> dict:
         async with httpx.AsyncClient(timeout=5) as client:
             response = await client.get(f"https://restcountries.com/v3.1/alpha/{code}")
             response.raise_for_status()
-            data = response.json()[0]
-            country_name = data['name']['common']
-            flag_emoji = "".join([chr(0x1F1E6 + ord(char) - ord('A')) for char in code.upper()])
-            return f"{flag_emoji} {country_name} ({code})"
+            return response.json()[0]
+
+    try:
+        # ГЕО — необязательное поле: не успели за бюджет обработчика — показываем только код
+        data = await deadline.call("restcountries", fetch, fallback=None)
+        if data is None:
+            return f"({code})"
+        country_name = data['name']['common']
+        flag_emoji = "".join([chr(0x1F1E6 + ord(char) - ord('A')) for char in code.upper()])
+        country_info = f"{flag_emoji} {country_name} ({code})"
+        country_cache.set(code, country_info)
+        return country_info
     except Exception:
         return f"({code})"
 
@@ -393,12 +1274,15 @@ def generate_metadata_content(data: dict) -> str:
     return content
 
 
-async def run_video_analysis(message: types.Message, video_url: str, state: FSMContext):
+async def run_video_analysis(message: types.Message, video_url: str | ParsedLink, state: FSMContext):
     """
     Основная функция для анализа видео.
     """
     msg = await message.answer("🔍 Анализирую видео... Это может занять несколько секунд.")
-    data = await youtube_analyzer.analyze_video(video_url)
+    # Все внешние вызовы отчета укладываются в общий срок; дизлайки и ГЕО при задержке опускаются
+    with deadline.budget(HANDLER_BUDGET):
+        data = await youtube_analyzer.analyze_video(video_url)
+        geo_info_text = await get_country_info(data['geo_code']) if not data.get("error") else ""
     if data.get("error"):
         await msg.edit_text(f"❌ Ошибка анализа: {data['error']}")
         await state.clear()
@@ -406,7 +1290,6 @@ async def run_video_analysis(message: types.Message, video_url: str, state: FSMC
     video_id = data['video_id']
     published_dt = datetime.fromisoformat(data['published_at'].replace('Z', '+00:00'))
     formatted_date = published_dt.strftime("%d.%m.%Y %H:%M:%S")
-    geo_info_text = await get_country_info(data['geo_code'])
     geo_line = f"├ ГЕО: {geo_info_text}" if geo_info_text else ""
     safe_title = html.escape(data['title'])
     safe_description = html.escape(data['description'])
@@ -427,18 +1310,21 @@ async def run_video_analysis(message: types.Message, video_url: str, state: FSMC
     output_message = "\n".join(lines)
     markup = types.InlineKeyboardMarkup(inline_keyboard=[
         [types.InlineKeyboardButton(text="📤 Скачать метаданные", callback_data=f"download_meta:{video_id}"),
-         types.InlineKeyboardButton(text="🖼️ Скачать превью", callback_data=f"download_thumb:{video_id}")]])
+         types.InlineKeyboardButton(text="🖼️ Скачать превью", callback_data=f"download_thumb:{video_id}")],
+        [types.InlineKeyboardButton(text="💬 Анализ комментариев", callback_data=f"comments:{video_id}")]])
     await msg.delete()
     await message.answer(output_message, parse_mode="HTML", disable_web_page_preview=True, reply_markup=markup)
     await state.clear()
 
 
-async def run_channel_analysis(message: types.Message, channel_input: str, state: FSMContext):
+async def run_channel_analysis(message: types.Message, channel_input: str | ParsedLink, state: FSMContext,
+                               depth: int = HEALTH_DEPTH_DEFAULT):
     """
     Основная функция для анализа канала.
     """
     msg = await message.answer("🔍 Анализирую канал... (Шаг 1/4: Поиск канала)")
-    data = await youtube_analyzer.analyze_channel(channel_input)
+    with deadline.budget(HANDLER_BUDGET):
+        data = await youtube_analyzer.analyze_channel(channel_input, depth)
     if data.get("error"):
         await msg.edit_text(f"❌ Ошибка анализа: {data['error']}")
         await state.clear()
@@ -453,34 +1339,49 @@ async def run_channel_analysis(message: types.Message, channel_input: str, state
              f"├ Общее кол-во видео: <code>{video_count_f}</code>",
              f"└ Общее кол-во просмотров: <code>{view_count_f}</code>"]
 
+    # Статистика и даты публикаций уже собраны: кнопки под отчетом возьмут их по токену
+    token = artifact_store.put(dict(data['recent_stats'], outlier_flags=data['outlier_flags'])) \
+        if 'recent_stats' in data else None
+    suffix = f":{token}" if token else ""
+
     buttons = []
-    if 'avg_views' in data:
-        avg_views_f = format_number(data['avg_views'])
-        avg_likes_f = format_number(data['avg_likes'])
-        avg_comments_f = format_number(data['avg_comments'])
-        lines.append("\n❤️ <b>Здоровье канала (на основе 10 последних видео):</b>")
-        lines.append(f"├ Средн. просмотров на видео: <code>{avg_views_f}</code>")
-        lines.append(f"├ Средн. лайков на видео: <code>{avg_likes_f}</code>")
-        lines.append(f"├ Средн. комментариев на видео: <code>{avg_comments_f}</code>")
-        lines.append(f"└ <b>ER (Коэфф. вовлеченности):</b> <code>{data['er']} %</code>")
+    if 'median_views' in data:
+        lines.append(f"\n❤️ <b>Здоровье канала (на основе {data['num_videos']} последних видео):</b>")
+        lines.append(f"├ Медиана просмотров: <code>{format_number(data['median_views'])}</code>"
+                     f" (средн. <code>{format_number(data['avg_views'])}</code>)")
+        lines.append(f"├ Разброс P25–P75: <code>{format_number(data['p25_views'])}</code>"
+                     f" – <code>{format_number(data['p75_views'])}</code>,"
+                     f" P90: <code>{format_number(data['p90_views'])}</code>")
+        lines.append(f"├ Медиана лайков: <code>{format_number(data['median_likes'])}</code>")
+        lines.append(f"├ Медиана комментариев: <code>{format_number(data['median_comments'])}</code>")
+        lines.extend(format_split_lines(data.get('formats')))
+        lines.append(f"├ Выбросы: 🚀 <code>{data['outliers_high']}</code> │ 📉 <code>{data['outliers_low']}</code>")
+        lines.append(f"└ <b>ER (Коэфф. вовлеченности, по медианам):</b> <code>{data['er']} %</code>")
 
         buttons.append(
             types.InlineKeyboardButton(
                 text="📊 Показать график",
-                callback_data=f"show_graphs:{data['channel_id']}"
+                callback_data=f"show_graphs:{data['depth']}:{data['channel_id']}{suffix}"
             )
         )
+    elif data.get('health_timeout'):
+        lines.append("\n<i>'Здоровье канала' не успело рассчитаться. Попробуйте позже или с меньшей глубиной.</i>")
     else:
         lines.append("\n<i>Не удалось рассчитать 'здоровье канала' (возможно, нет недавних видео).</i>")
 
     buttons.append(
         types.InlineKeyboardButton(
             text="📅 Показать график публикаций",
-            callback_data=f"show_heatmap:{data['channel_id']}"
+            callback_data=f"show_heatmap:{data['channel_id']}{suffix}"
         )
     )
 
-    reply_markup = types.InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+    heatmap_full_button = types.InlineKeyboardButton(
+        text="🗓 Публикации за всю историю",
+        callback_data=f"show_heatmap_full:{data['channel_id']}"
+    )
+
+    reply_markup = types.InlineKeyboardMarkup(inline_keyboard=[buttons, [heatmap_full_button]])
 
     output_message = "\n".join(lines)
     await msg.edit_text(
@@ -507,16 +1408,17 @@ async def process_channel_link(message: types.Message, state: FSMContext):
 # --- УМНЫЙ ОБРАБОТЧИК ---
 @dp.message(F.text, StateFilter(None))
 async def auto_detect_link_handler(message: types.Message, state: FSMContext):
-    text = message.text.strip()
-    video_id = youtube_analyzer._extract_video_id(text)
-    if video_id:
-        await run_video_analysis(message, text, state)
-        return
-    channel_info = youtube_analyzer._extract_channel_info(text)
-    if channel_info:
-        await run_channel_analysis(message, text, state)
+    links = parse_links(message.text)
+    if not links:
+        await message.answer("Я не распознал ссылку. Попробуйте еще раз или используйте команду.")
         return
-    await message.answer("Я не распознал ссылку. Попробуйте еще раз или используйте команду.")
+    if len(links) > MAX_LINKS_PER_MESSAGE:
+        await message.answer(f"Найдено ссылок: {len(links)}. Разберу первые {MAX_LINKS_PER_MESSAGE}.")
+    for link in links[:MAX_LINKS_PER_MESSAGE]:
+        if link.is_video:
+            await run_video_analysis(message, link, state)
+        else:
+            await run_channel_analysis(message, link, state)
 
 
 # --- 📤 ОБРАБОТЧИКИ КНОПОК СКАЧИВАНИЯ ---
@@ -538,18 +1440,13 @@ async def download_metadata_handler(callback_query: types.CallbackQuery):
 async def download_thumbnail_handler(callback_query: types.CallbackQuery):
     video_id = callback_query.data.split(":")[-1]
     await callback_query.answer("⏳ Загружаю превью...")
-    data = await youtube_analyzer.get_video_data_by_id(video_id)
-    if data.get("error"):
-        await callback_query.message.answer(f"❌ Ошибка: {data['error']}")
-        return
-    thumb_url = data.get("thumbnail_url")
-    if not thumb_url:
-        await callback_query.message.answer(f"❌ Не удалось найти превью для этого видео.")
-        return
+    # URL превью строится из ID видео: ни YouTube API, ни RYD не нужны,
+    # а картинку Telegram скачивает сам по ссылке
+    thumb_url = await thumbnail_fetcher.best_url(video_id)
     try:
         await callback_query.message.answer_photo(
             photo=thumb_url,
-            caption=f"Превью для: {data['title']}"
+            caption=f"Превью для: https://youtu.be/{video_id}"
         )
     except Exception as e:
         await callback_query.message.answer(f"❌ Не удалось отправить фото. Ошибка: {e}")
@@ -559,30 +1456,49 @@ async def download_thumbnail_handler(callback_query: types.CallbackQuery):
 async def download_graphs_handler(callback_query: types.CallbackQuery):
     """
     Обрабатывает нажатие кнопки "Показать график активности".
+    Форматы callback_data: show_graphs:<канал> и show_graphs:<глубина>:<канал>
+    (старые сообщения), show_graphs:<глубина>:<канал>:<токен>.
     """
-    channel_id = callback_query.data.split(":")[-1]
-    await callback_query.answer("🎨 Рисую графики (это может занять 10-15 секунд)...")
-
-    stats_data = await youtube_analyzer.get_recent_video_stats(channel_id)
-
-    if stats_data.get("error"):
-        await callback_query.message.answer(f"❌ Ошибка при сборе данных для графика: {stats_data['error']}")
-        return
+    parts = callback_query.data.split(":")
+    channel_id = parts[2] if len(parts) >= 3 else parts[-1]
+    depth = int(parts[1]) if len(parts) >= 3 else HEALTH_DEPTH_DEFAULT
+    stats_data = artifact_store.get(parts[3] if len(parts) == 4 else None)
+
+    if stats_data is None:
+        # Токен истек или сообщение старое — собираем статистику заново
+        await callback_query.answer("🎨 Рисую графики (это может занять 10-15 секунд)...")
+        stats_data = await youtube_analyzer.get_recent_video_stats(channel_id, depth)
+        if stats_data.get("error"):
+            await callback_query.message.answer(f"❌ Ошибка при сборе данных для графика: {stats_data['error']}")
+            return
+        # Выбросы — как в отчете: внутри своего формата, если длительности известны
+        views, likes, comments = stats_data['views_list'], stats_data['likes_list'], stats_data['comments_list']
+        if 'shorts_list' in stats_data:
+            flags = format_health(views, likes, comments, stats_data['shorts_list'])['outlier_flags']
+        else:
+            flags = channel_health(views, likes, comments)['outlier_flags']
+        stats_data = dict(stats_data, outlier_flags=flags)
+    else:
+        await callback_query.answer("🎨 Рисую графики...")
 
-    image_buffer = create_activity_graphs(
+    image_buffer = await render_chart(
+        "create_activity_graphs",
         stats_data['views_list'],
         stats_data['likes_list'],
-        stats_data['comments_list']
+        stats_data['comments_list'],
+        outlier_flags=stats_data['outlier_flags']
     )
 
     if not image_buffer:
-        await callback_query.message.answer(f"❌ Не удалось создать график.")
+        await callback_query.message.answer("❌ Не удалось создать график.")
         return
 
-    photo = BufferedInputFile(image_buffer.getvalue(), filename=f"{channel_id}_activity.png")
+    from channel_graphics import chart_extension
+
+    photo = BufferedInputFile(image_buffer.getvalue(), filename=f"{channel_id}_activity.{chart_extension()}")
     await callback_query.message.answer_photo(
         photo,
-        caption="Графики активности по 10 последним видео."
+        caption=f"Графики активности по {len(stats_data['views_list'])} последним видео."
     )
 
 
@@ -590,28 +1506,66 @@ async def download_graphs_handler(callback_query: types.CallbackQuery):
 async def download_heatmap_handler(callback_query: types.CallbackQuery):
     """
     Обрабатывает нажатие кнопки "Показать график публикаций".
+    Форматы callback_data: show_heatmap:<канал> (старые сообщения) и show_heatmap:<канал>:<токен>.
     """
-    channel_id = callback_query.data.split(":")[-1]
+    parts = callback_query.data.split(":")
+    channel_id = parts[1]
+    artifact = artifact_store.get(parts[2] if len(parts) == 3 else None)
+    if artifact is not None and artifact.get('published_at'):
+        # Даты публикаций собраны вместе с анализом канала: API не нужен, строим сразу
+        await callback_query.answer("🔥 Строю теплокарту...")
+        heatmap_data = await youtube_analyzer.get_publication_heatmap_data(
+            channel_id, published=artifact['published_at'])
+        await send_heatmap(bot, callback_query.message.chat.id, channel_id, heatmap_data)
+        return
+
     await callback_query.answer("🔥 Анализирую 50 последних видео (это может занять 15-20 секунд)...")
 
-    heatmap_data = await youtube_analyzer.get_publication_heatmap_data(channel_id)
+    msg = await callback_query.message.answer("⏳ Строю теплокарту по 50 последним видео...")
+    await job_queue.submit("heatmap", callback_query.from_user.id, callback_query.message.chat.id,
+                           {"channel_id": channel_id}, msg.message_id)
+
+
+@dp.callback_query(F.data.startswith("show_heatmap_full:"))
+async def download_full_heatmap_handler(callback_query: types.CallbackQuery):
+    """
+    Обрабатывает нажатие кнопки "Публикации за всю историю".
+    """
+    channel_id = callback_query.data.split(":")[-1]
+    await callback_query.answer("🗓 Читаю всю историю загрузок канала...")
+
+    msg = await callback_query.message.answer("🗓 Читаю всю историю загрузок канала... Это может занять время.")
+    await job_queue.submit("heatmap", callback_query.from_user.id, callback_query.message.chat.id,
+                           {"channel_id": channel_id, "full_history": True, "tz_name": DEFAULT_TIMEZONE},
+                           msg.message_id)
+
 
+async def send_heatmap(bot: Bot, chat_id: int, channel_id: str, heatmap_data: dict):
+    """
+    Отправляет теплокарту и текстовый отчет в чат.
+    """
     if heatmap_data.get("error"):
-        await callback_query.message.answer(f"❌ Ошибка при сборе данных: {heatmap_data['error']}")
+        await bot.send_message(chat_id, f"❌ Ошибка при сборе данных: {heatmap_data['error']}")
         return
 
-    image_buffer = create_heatmap_graph(heatmap_data['grid'])
+    title = f"Теплокарта публикаций (по {heatmap_data['video_count']} видео)"
+    image_buffer = await render_chart("create_heatmap_graph", heatmap_data['grid'], title=title,
+                                      tz_name=heatmap_data['tz_name'])
 
     if not image_buffer:
-        await callback_query.message.answer(f"❌ Не удалось создать теплокарту.")
+        await bot.send_message(chat_id, "❌ Не удалось создать теплокарту.")
         return
 
-    photo = BufferedInputFile(image_buffer.getvalue(), filename=f"{channel_id}_heatmap.png")
-    await callback_query.message.answer_photo(
+    from channel_graphics import chart_extension
+
+    photo = BufferedInputFile(image_buffer.getvalue(), filename=f"{channel_id}_heatmap.{chart_extension()}")
+    await bot.send_photo(
+        chat_id,
         photo,
-        caption="Теплокарта публикаций (по 50 последним видео)."
+        caption=f"{title}."
     )
-    await callback_query.message.answer(
+    await bot.send_message(
+        chat_id,
         heatmap_data['report'],
         parse_mode="HTML"
     )
@@ -623,6 +1577,11 @@ async def health_check(request):
     """Простой ответ 'OK' для проверки здоровья сервиса"""
     return web.Response(text="Bot is alive!")
 
+async def metrics_handler(request):
+    """Счетчики пакетных запросов к YouTube API (JSON)"""
+    return web.json_response(dict(youtube_analyzer.metrics(), artifacts=artifact_store.stats,
+                                  dependencies=deadline.stats, telegram=send_throttle.stats))
+
 async def start_web_server():
     """Запускает маленький веб-сервер на порту из окружения"""
     # Render передает порт через переменную окружения PORT
@@ -631,6 +1590,7 @@ async def start_web_server():
     app = web.Application()
     app.router.add_get('/', health_check)
     app.router.add_get('/health', health_check)
+    app.router.add_get('/metrics', metrics_handler)
     
     runner = web.AppRunner(app)
     await runner.setup()
@@ -641,6 +1601,23 @@ async def start_web_server():
 
 
 
+async def prewarm():
+    """
+    Фоновая подгрузка тяжелых модулей и discovery-клиента YouTube после старта
+    polling: бот уже отвечает, а первый график или Excel не ждет импорта.
+    """
+    await asyncio.sleep(PREWARM_DELAY)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    for name in PREWARM_MODULES:
+        try:
+            await loop.run_in_executor(None, importlib.import_module, name)
+        except Exception as e:
+            logging.warning(f"Не удалось прогреть {name}: {e}")
+    await loop.run_in_executor(None, lambda: youtube_analyzer.youtube)
+    logging.info(f"🔥 Подсистемы прогреты за {loop.time() - started:.2f} с")
+
+
 async def main():
     """
     Запуск бота в режиме Polling + Веб-сервер для Render.
@@ -648,14 +1625,26 @@ async def main():
     logging.info("🚀 Бот запущен в режиме Polling")
 
     await start_web_server()
-    
+    NicheSessionLog.cleanup(NICHE_SESSION_DIR, NICHE_SESSION_MAX_AGE)
+    await job_queue.start(bot)
+    watch_scheduler.start(bot)
 
     await bot.delete_webhook(drop_pending_updates=True)
 
-    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    prewarm_task = asyncio.create_task(prewarm())
+    try:
+        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    finally:
+        # Прогрев мог не закончиться (остановка в первые секунды)
+        prewarm_task.cancel()
 
 
 if __name__ == "__main__":
+    if BOT_WORKERS > 1:
+        # Многопроцессный режим: приемник обновлений сам запустит воркеров,
+        # которые импортируют этот модуль (см. sharded_runtime.py)
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sharded_runtime.py")
+        os.execv(sys.executable, [sys.executable, script])
     asyncio.run(main())
 
 
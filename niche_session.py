@@ -0,0 +1,59 @@
+# niche_session.py
+
+import json
+import os
+import time
+import uuid
+
+# Порядок полей в записи: канал хранится компактным JSON-массивом, а не словарем
+# Новые поля добавляются только в конец: записи старых сессий короче, и недостающих ключей в них нет
+RECORD_FIELDS = ("category", "name", "channel_id", "url", "subs", "views", "idea_7d", "idea_14d", "idea_30d",
+                 "idea_shorts")
+
+
+class NicheSessionLog:
+    """
+    Журнал Excel-сессии ниши: один JSONL-файл на сессию, одна строка на канал.
+    Добавление канала — дозапись строки в конец файла (O(1)), в FSM хранятся
+    только ID сессии и счетчик, а не весь список каналов.
+    """
+
+    def __init__(self, directory: str, session_id: str):
+        self.session_id = session_id
+        self.path = os.path.join(directory, f"{session_id}.jsonl")
+
+    @classmethod
+    def create(cls, directory: str) -> "NicheSessionLog":
+        os.makedirs(directory, exist_ok=True)
+        return cls(directory, uuid.uuid4().hex[:16])
+
+    def append(self, entry: dict):
+        record = [entry.get(field) for field in RECORD_FIELDS]
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def __iter__(self):
+        """Записи по одной, в порядке добавления; файл целиком в память не читается."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield dict(zip(RECORD_FIELDS, json.loads(line)))
+
+    def delete(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def cleanup(directory: str, max_age: float):
+        """Удаляет журналы брошенных сессий старше `max_age` секунд."""
+        if not os.path.isdir(directory):
+            return
+        deadline = time.time() - max_age
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".jsonl") and os.path.getmtime(path) < deadline:
+                os.remove(path)
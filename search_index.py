@@ -0,0 +1,138 @@
+# search_index.py
+
+import re
+import sqlite3
+import time
+
+# Маркеры подсветки в сниппете: заменяются на <b></b> уже после html.escape
+HIGHLIGHT_START, HIGHLIGHT_END = "\x02", "\x03"
+# Веса колонок в bm25: совпадение в названии важнее, чем в тегах и описании
+BM25_WEIGHTS = (10.0, 3.0, 1.0)
+
+_QUERY_TOKEN_RE = re.compile(r"\w+")
+
+
+def build_match_query(text: str) -> str | None:
+    """
+    Пользовательский текст -> запрос FTS5: все слова обязательны, каждое — как префикс
+    ("майнкрафт" находит "майнкрафте"). Кавычки защищают от синтаксиса FTS5 во вводе.
+    """
+    tokens = _QUERY_TOKEN_RE.findall(text.lower())
+    return " ".join(f'"{token}"*' for token in tokens) if tokens else None
+
+
+class SearchIndex:
+    """
+    Локальный полнотекстовый индекс (SQLite FTS5) по всем видео, которые бот
+    уже скачивал: названия из выгрузок, описания и теги из анализа видео.
+    Заполняется попутно, без отдельных запросов к API. Частичные данные
+    дополняют запись: название из списка загрузок не стирает описание,
+    полученное раньше. FTS-индекс обновляется триггерами и только когда
+    меняется индексируемый текст.
+    """
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, timeout=5)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS videos (
+                id INTEGER PRIMARY KEY,
+                video_id TEXT NOT NULL UNIQUE,
+                channel_id TEXT,
+                title TEXT,
+                tags TEXT,
+                description TEXT,
+                published_at TEXT,
+                views INTEGER,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS channels (
+                channel_id TEXT PRIMARY KEY,
+                title TEXT NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5(
+                title, tags, description,
+                content='videos', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS videos_ai AFTER INSERT ON videos BEGIN
+                INSERT INTO videos_fts (rowid, title, tags, description)
+                VALUES (new.id, new.title, new.tags, new.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS videos_ad AFTER DELETE ON videos BEGIN
+                INSERT INTO videos_fts (videos_fts, rowid, title, tags, description)
+                VALUES ('delete', old.id, old.title, old.tags, old.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS videos_au AFTER UPDATE ON videos
+            WHEN old.title IS NOT new.title OR old.tags IS NOT new.tags OR old.description IS NOT new.description
+            BEGIN
+                INSERT INTO videos_fts (videos_fts, rowid, title, tags, description)
+                VALUES ('delete', old.id, old.title, old.tags, old.description);
+                INSERT INTO videos_fts (rowid, title, tags, description)
+                VALUES (new.id, new.title, new.tags, new.description);
+            END;
+        """)
+        self.conn.commit()
+
+    def add_videos(self, videos: list):
+        """
+        Добавляет или дополняет видео. Запись — словарь с "video_id" и любыми из
+        "channel_id", "title", "tags" (список), "description", "published_at", "views".
+        """
+        now = time.time()
+        rows = [
+            (v['video_id'], v.get('channel_id'), v.get('title'),
+             " ".join(v['tags']) if v.get('tags') is not None else None,
+             v.get('description'), v.get('published_at'),
+             int(v['views']) if v.get('views') is not None else None, now)
+            for v in videos
+        ]
+        self.conn.executemany("""
+            INSERT INTO videos (video_id, channel_id, title, tags, description, published_at, views, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (video_id) DO UPDATE SET
+                channel_id = coalesce(excluded.channel_id, channel_id),
+                title = coalesce(excluded.title, title),
+                tags = coalesce(excluded.tags, tags),
+                description = coalesce(excluded.description, description),
+                published_at = coalesce(excluded.published_at, published_at),
+                views = coalesce(excluded.views, views),
+                updated_at = excluded.updated_at
+        """, rows)
+        self.conn.commit()
+
+    def add_channel(self, channel_id: str, title: str):
+        self.conn.execute(
+            "INSERT INTO channels (channel_id, title) VALUES (?, ?) "
+            "ON CONFLICT (channel_id) DO UPDATE SET title = excluded.title", (channel_id, title)
+        )
+        self.conn.commit()
+
+    def search(self, text: str, limit: int = 10, channel_id: str | None = None) -> list:
+        """
+        Видео по запросу, от самых релевантных (bm25). В "snippet" — фрагмент
+        описания или тегов с совпадениями между HIGHLIGHT_START и HIGHLIGHT_END.
+        """
+        query = build_match_query(text)
+        if query is None:
+            return []
+        sql = f"""
+            SELECT v.video_id, v.title, v.channel_id, c.title, v.published_at, v.views,
+                   snippet(videos_fts, -1, ?, ?, '…', 12)
+            FROM videos_fts
+            JOIN videos v ON v.id = videos_fts.rowid
+            LEFT JOIN channels c ON c.channel_id = v.channel_id
+            WHERE videos_fts MATCH ? {"AND v.channel_id = ?" if channel_id else ""}
+            ORDER BY bm25(videos_fts, {", ".join(map(str, BM25_WEIGHTS))})
+            LIMIT ?
+        """
+        params = [HIGHLIGHT_START, HIGHLIGHT_END, query] + ([channel_id] if channel_id else []) + [limit]
+        rows = self.conn.execute(sql, params).fetchall()
+        keys = ("video_id", "title", "channel_id", "channel_title", "published_at", "views", "snippet")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def stats(self) -> dict:
+        videos, channels = self.conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT channel_id) FROM videos"
+        ).fetchone()
+        return {"videos": videos, "channels": channels}
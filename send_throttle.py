@@ -0,0 +1,160 @@
+# send_throttle.py
+
+import asyncio
+import logging
+import time
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (DeleteMessage, EditMessageCaption, EditMessageReplyMarkup, EditMessageText,
+                             SendChatAction)
+
+# Правки одного сообщения, которые можно склеить: важно только последнее состояние
+COALESCE_METHODS = (EditMessageText, EditMessageCaption, EditMessageReplyMarkup)
+# Не расходуют лимит сообщений в чате
+UNTHROTTLED_METHODS = (DeleteMessage, SendChatAction)
+# Сколько раз повторять запрос после RetryAfter
+MAX_RETRIES = 3
+# Сколько корзин чатов держать в памяти, прежде чем выбросить простаивающие
+MAX_CHAT_BUCKETS = 10_000
+
+
+class _Bucket:
+    """
+    Корзина токенов: rate запросов в секунду, до burst подряд без ожидания.
+    Отрицательный остаток — уже занятые слоты в очереди.
+    blocked_until — время, до которого Telegram попросил не отправлять (RetryAfter).
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def idle(self) -> bool:
+        now = time.monotonic()
+        self._refill(now)
+        return self.tokens >= self.burst and self.blocked_until <= now
+
+    async def acquire(self) -> bool:
+        """Занимает слот и ждет его. True — если пришлось ждать."""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        waited = delay > 0
+        if waited:
+            await asyncio.sleep(delay)
+        while (left := self.blocked_until - time.monotonic()) > 0:
+            waited = True
+            await asyncio.sleep(left)
+        return waited
+
+
+class SendThrottle(BaseRequestMiddleware):
+    """
+    Исходящие запросы к Bot API с учетом лимитов Telegram (middleware сессии бота).
+    - Отправки в чат идут не чаще лимита чата и общего лимита бота: лишние ждут
+      своей очереди, а не получают 429.
+    - Правка сообщения, которая еще ждет очереди, заменяется более новой правкой
+      того же сообщения: уходит один запрос с последним текстом, а все ожидавшие
+      получают его результат.
+    - На RetryAfter чат (или весь бот для запросов без чата) ставится на паузу
+      на указанное время, и запрос повторяется.
+    """
+
+    def __init__(self, chat_rate: float, group_rate: float, global_rate: float, burst: int = 3):
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        self._global = _Bucket(global_rate, max(burst, int(global_rate)))
+        self._chats = {}
+        self._pending_edits = {}  # (метод, chat_id, message_id) -> [последний метод, future результата]
+        self._last_rounds = {}  # тот же ключ -> future последнего круга (правки одного сообщения уходят по порядку)
+        self.stats = {"sent": 0, "delayed": 0, "coalesced": 0, "retry_after": 0}
+
+    def _chat_bucket(self, chat_id) -> _Bucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                self._chats = {key: b for key, b in self._chats.items() if not b.idle()}
+            # Личные чаты — положительные ID; группы, каналы и @username ограничены строже
+            private = isinstance(chat_id, int) and chat_id > 0
+            bucket = self._chats[chat_id] = _Bucket(self.chat_rate if private else self.group_rate, self.burst)
+        return bucket
+
+    async def _acquire(self, chat_id):
+        waited = await self._chat_bucket(chat_id).acquire()
+        waited = await self._global.acquire() or waited
+        self.stats["delayed"] += waited
+
+    async def _send(self, make_request, bot, method, chat_id):
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                self.stats["sent"] += 1
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                self.stats["retry_after"] += 1
+                logging.warning(f"⏳ Telegram просит подождать {e.retry_after} с ({type(method).__name__}, чат {chat_id})")
+                bucket = self._global if chat_id is None else self._chat_bucket(chat_id)
+                bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + e.retry_after)
+                if chat_id is None:
+                    await self._global.acquire()
+                else:
+                    await self._acquire(chat_id)
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or isinstance(method, UNTHROTTLED_METHODS):
+            return await self._send(make_request, bot, method, None)
+        if not isinstance(method, COALESCE_METHODS) or method.message_id is None:
+            await self._acquire(chat_id)
+            return await self._send(make_request, bot, method, chat_id)
+
+        key = (type(method), chat_id, method.message_id)
+        if key in self._pending_edits:
+            self.stats["coalesced"] += 1
+        while (pending := self._pending_edits.get(key)) is not None:
+            # Предыдущая правка еще в очереди: подменяем ее текст и ждем общий результат
+            pending[0] = method
+            await asyncio.wait({pending[1]})
+            if not pending[1].cancelled():
+                return pending[1].result()
+            # Отправитель был отменен, не успев отправить: встаем в очередь сами
+
+        future = asyncio.get_running_loop().create_future()
+        pending = self._pending_edits[key] = [method, future]
+        previous = self._last_rounds.get(key)
+        self._last_rounds[key] = future
+        try:
+            await self._acquire(chat_id)
+            if previous is not None and not previous.done():
+                # Предыдущая правка еще в пути: иначе она может прийти позже и затереть эту
+                await asyncio.wait({previous})
+            # С этого момента новые правки начинают следующий круг
+            del self._pending_edits[key]
+            result = await self._send(make_request, bot, pending[0], chat_id)
+        except asyncio.CancelledError:
+            if self._pending_edits.get(key) is pending:
+                del self._pending_edits[key]
+            future.cancel()
+            raise
+        except Exception as e:
+            if self._pending_edits.get(key) is pending:
+                del self._pending_edits[key]
+            future.set_exception(e)
+            future.exception()  # ошибку получает и вызывающий ниже; без предупреждения "never retrieved"
+            raise
+        finally:
+            if self._last_rounds.get(key) is future:
+                del self._last_rounds[key]
+        future.set_result(result)
+        return result
@@ -0,0 +1,237 @@
+# sharded_runtime.py
+
+"""
+Многопроцессный режим бота (BOT_WORKERS > 1).
+
+Один процесс-приемник (ingress) забирает обновления через getUpdates и
+раскладывает их по N процессам-воркерам по user_id % N. Все обновления одного
+пользователя попадают в один и тот же процесс и обрабатываются там строго по
+очереди, поэтому FSM-состояния не разъезжаются, а разные пользователи
+обрабатываются параллельно на разных ядрах.
+
+Воркеры — обычный диспетчер из main.py (feed_raw_update вместо polling).
+Кэши ответов YouTube API и резолвов каналов общие: они лежат в SQLite (WAL),
+см. cache_store.SharedCache. Упавший воркер перезапускается супервизором;
+его очередь остается в приемнике, так что теряется не больше одного
+обновления, которое обрабатывалось в момент падения.
+
+Запуск: BOT_WORKERS=4 python main.py (или напрямую python sharded_runtime.py).
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.types import Update
+
+from config import TELEGRAM_BOT_TOKEN, BOT_WORKERS, JOB_DB_PATH, SHARED_CACHE_PATH
+from cache_store import SharedCache
+
+DEFAULT_SHARED_CACHE_PATH = "shared_cache.db"
+POLL_TIMEOUT = 25  # секунд long polling в getUpdates
+SUPERVISE_INTERVAL = 1.0
+METRICS_INTERVAL = 10.0
+# Бот обрабатывает только сообщения и нажатия кнопок
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+
+def shard_key(update: Update) -> int:
+    """Ключ шардирования: ID пользователя, иначе ID чата, иначе номер обновления."""
+    event = update.event
+    user = getattr(event, "from_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(event, "chat", None)
+    if chat is not None:
+        return chat.id
+    return update.update_id
+
+
+# --- ⚙️ ПРОЦЕСС-ВОРКЕР ---
+
+def _worker_process(index: int, updates: multiprocessing.Queue):
+    logging.basicConfig(level=logging.INFO, format=f"[worker {index}] %(levelname)s:%(name)s:%(message)s")
+    try:
+        asyncio.run(_worker_main(index, updates))
+    except KeyboardInterrupt:
+        pass  # Ctrl+C получает вся группа процессов; остановкой управляет приемник
+
+
+async def _feed_in_order(previous: asyncio.Task | None, dp, bot, update: dict):
+    """Обрабатывает обновление после предыдущего обновления того же пользователя."""
+    if previous is not None:
+        try:
+            await previous
+        except Exception:
+            pass  # ошибка уже залогирована в своей задаче
+    try:
+        await dp.feed_raw_update(bot, update)
+    except Exception:
+        logging.exception(f"Ошибка обработки обновления {update.get('update_id')}")
+
+
+async def _publish_metrics(index: int, analyzer):
+    metrics = SharedCache(os.environ["SHARED_CACHE_PATH"], "metrics", ttl=3 * METRICS_INTERVAL)
+    while True:
+        metrics.set(index, analyzer.metrics())
+        await asyncio.sleep(METRICS_INTERVAL)
+
+
+async def _worker_main(index: int, updates: multiprocessing.Queue):
+    # Диспетчер, хендлеры и анализатор импортируются только в воркере
+    import main as app
+
+    # У каждого воркера своя база фоновых задач: задачи поднимаются тем же
+    # процессом, куда попадают обновления их владельца
+    app.job_queue.store_path = f"{JOB_DB_PATH}.{index}"
+    await app.job_queue.start(app.bot)
+    if index == 0:
+        # База подписок общая; новые загрузки проверяет только один воркер
+        app.watch_scheduler.start(app.bot)
+    metrics_task = asyncio.create_task(_publish_metrics(index, app.youtube_analyzer))
+    prewarm_task = asyncio.create_task(app.prewarm())
+
+    loop = asyncio.get_running_loop()
+    tails = {}  # user_id -> последняя задача пользователя
+
+    def forget(key, task):
+        if tails.get(key) is task:
+            del tails[key]
+
+    logging.info("⚙️ Воркер запущен")
+    while True:
+        item = await loop.run_in_executor(None, updates.get)
+        if item is None:
+            break
+        key, raw = item
+        task = asyncio.create_task(_feed_in_order(tails.get(key), app.dp, app.bot, json.loads(raw)))
+        tails[key] = task
+        task.add_done_callback(lambda t, k=key: forget(k, t))
+
+    if tails:
+        await asyncio.gather(*tails.values(), return_exceptions=True)
+    metrics_task.cancel()
+    prewarm_task.cancel()
+    await app.bot.session.close()
+
+
+# --- 📥 ПРОЦЕСС-ПРИЕМНИК И СУПЕРВИЗОР ---
+
+class ShardedRuntime:
+    """Приемник обновлений, раскладывающий их по процессам-воркерам, и их супервизор."""
+
+    def __init__(self, workers: int, cache_path: str):
+        self.workers = workers
+        self.cache_path = cache_path
+        self._ctx = multiprocessing.get_context("spawn")
+        self.queues = [self._ctx.Queue() for _ in range(workers)]
+        self.processes = [None] * workers
+        self.restarts = [0] * workers
+
+    def _spawn(self, index: int):
+        process = self._ctx.Process(
+            target=_worker_process, args=(index, self.queues[index]), name=f"bot-worker-{index}", daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+
+    async def _supervise(self):
+        while True:
+            for index, process in enumerate(self.processes):
+                if not process.is_alive():
+                    self.restarts[index] += 1
+                    logging.warning(
+                        f"♻️ Воркер {index} завершился (код {process.exitcode}), перезапуск #{self.restarts[index]}"
+                    )
+                    self._spawn(index)
+            await asyncio.sleep(SUPERVISE_INTERVAL)
+
+    async def _poll(self, bot: Bot):
+        await bot.delete_webhook(drop_pending_updates=True)
+        offset = None
+        backoff = 1
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=POLL_TIMEOUT, allowed_updates=ALLOWED_UPDATES)
+            except Exception as e:
+                logging.warning(f"getUpdates: {e}; повтор через {backoff} с")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            backoff = 1
+            for update in updates:
+                offset = update.update_id + 1
+                key = shard_key(update)
+                raw = update.model_dump_json(by_alias=True, exclude_none=True)
+                self.queues[key % self.workers].put((key, raw))
+
+    async def _start_web_server(self):
+        """Тот же веб-сервер для Render, что и в main.py, плюс состояние воркеров."""
+        metrics = SharedCache(self.cache_path, "metrics", ttl=3 * METRICS_INTERVAL)
+
+        async def health_check(request):
+            return web.Response(text="Bot is alive!")
+
+        async def metrics_handler(request):
+            return web.json_response({
+                f"worker_{index}": {
+                    "alive": process.is_alive(),
+                    "restarts": self.restarts[index],
+                    "loaders": metrics.get(index, {}),
+                }
+                for index, process in enumerate(self.processes)
+            })
+
+        app = web.Application()
+        app.router.add_get('/', health_check)
+        app.router.add_get('/health', health_check)
+        app.router.add_get('/metrics', metrics_handler)
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        port = int(os.getenv("PORT", 8000))
+        await web.TCPSite(runner, '0.0.0.0', port).start()
+        logging.info(f"🌐 Fake web server started on port {port}")
+
+    async def run(self):
+        # Воркеры наследуют окружение: путь к общему кэшу они прочитают из config
+        os.environ["SHARED_CACHE_PATH"] = self.cache_path
+        SharedCache(self.cache_path, "metrics", ttl=0)  # создаем базу и включаем WAL до старта воркеров
+        for index in range(self.workers):
+            self._spawn(index)
+
+        bot = Bot(token=TELEGRAM_BOT_TOKEN)
+        await self._start_web_server()
+        supervisor = asyncio.create_task(self._supervise())
+        logging.info(f"🚀 Бот запущен в многопроцессном режиме: {self.workers} воркеров")
+        try:
+            await self._poll(bot)
+        finally:
+            supervisor.cancel()
+            await bot.session.close()
+            self.stop()
+
+    def stop(self, timeout: float = 10.0):
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+
+def run(workers: int = BOT_WORKERS):
+    runtime = ShardedRuntime(max(workers, 1), SHARED_CACHE_PATH or DEFAULT_SHARED_CACHE_PATH)
+    try:
+        asyncio.run(runtime.run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run()
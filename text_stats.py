@@ -0,0 +1,131 @@
+# text_stats.py
+
+import heapq
+import re
+from collections import Counter
+from operator import itemgetter
+
+# Слова из букв (без цифр и "_"), от 3 символов; ссылки вырезаются до разбора
+TOKEN_RE = re.compile(r"[^\W\d_]{3,}")
+URL_RE = re.compile(r"https?://\S+|www\.\S+")
+
+STOPWORDS = frozenset("""
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне было вот
+от меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него до вас нибудь опять
+уж вам ведь там потом себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам чтоб без
+будто чего раз тоже себе под будет ж тогда кто этот того потому этого какой совсем ним здесь этом один
+почти мой тем чтобы нее сейчас были куда зачем всех никогда можно при наконец два об другой хоть после
+над больше тот через эти нас про всего них какая много разве три эту моя впрочем хорошо свою этой перед
+иногда лучше чуть том нельзя такой им более всегда конечно всю между это просто очень вообще тебе
+the and for are but not you all any can had her was one our out day get has him his how man new now old
+see two way who boy did its let put say she too use that with have this will your from they know want
+been good much some time very when come here just like long make many more only over such take than
+them well were what which would there their about could into other then these
+""".split())
+
+# Первые слова вопросов (для комментариев без "?")
+QUESTION_WORDS = frozenset("""
+как почему зачем что когда где сколько какой какая какие кто чей откуда куда разве неужели подскажите
+how why what when where who which whose can could does did is are will would should
+""".split())
+
+
+def words(text: str) -> list:
+    """Все слова текста в нижнем регистре, без ссылок (стоп-слова остаются — нужны для фраз)."""
+    return TOKEN_RE.findall(URL_RE.sub(" ", text.lower()))
+
+
+def tokenize(text: str) -> list:
+    """Слова текста в нижнем регистре, без ссылок и стоп-слов."""
+    return [token for token in words(text) if token not in STOPWORDS]
+
+
+def is_question(text: str) -> bool:
+    if "?" in text:
+        return True
+    first = TOKEN_RE.search(text.lower())
+    return first is not None and first.group() in QUESTION_WORDS
+
+
+class TopK:
+    """
+    Приближенный top-k (Space-Saving с пакетным вытеснением): хранится не больше
+    2×capacity элементов. Когда их становится больше, остаются capacity самых частых,
+    а новые элементы стартуют со счетчика последнего оставшегося (floor).
+    Счетчики завышены не больше чем на floor, частые элементы не теряются.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts = {}
+        self.floor = 0
+
+    def update(self, counter: Counter):
+        counts, floor = self.counts, self.floor
+        for item, count in counter.items():
+            counts[item] = counts.get(item, floor) + count
+        if len(counts) > 2 * self.capacity:
+            kept = heapq.nlargest(self.capacity, counts.items(), key=itemgetter(1))
+            self.floor = kept[-1][1]
+            self.counts = dict(kept)
+
+    def top(self, n: int) -> list:
+        return heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+
+
+class CommentAggregator:
+    """
+    Статистика комментариев, которая копится постранично: каждая страница
+    commentThreads.list сворачивается в счетчики и отбрасывается.
+    Память ограничена емкостью TopK, числом дней и размером топа по лайкам,
+    а не количеством комментариев.
+    """
+
+    def __init__(self, top_capacity: int = 1000, top_liked: int = 5):
+        self.terms = TopK(top_capacity)
+        self.authors = TopK(top_capacity)
+        self.per_day = Counter()
+        self.total = 0
+        self.replies = 0
+        self.questions = 0
+        self._top_liked_size = top_liked
+        self._top_liked = []  # min-куча (лайки, порядковый номер, автор, текст)
+
+    def add_page(self, items: list):
+        terms, authors = Counter(), Counter()
+        for item in items:
+            snippet = item['snippet']
+            comment = snippet['topLevelComment']['snippet']
+            text = comment.get('textDisplay', '')
+            self.total += 1
+            self.replies += snippet.get('totalReplyCount', 0)
+            self.questions += is_question(text)
+            # Термин считается один раз на комментарий, чтобы не побеждали повторы внутри одного текста
+            terms.update(set(tokenize(text)))
+            authors[comment.get('authorDisplayName', '')] += 1
+            self.per_day[comment['publishedAt'][:10]] += 1
+
+            entry = (comment.get('likeCount', 0), self.total, comment.get('authorDisplayName', ''), text[:300])
+            if len(self._top_liked) < self._top_liked_size:
+                heapq.heappush(self._top_liked, entry)
+            elif entry > self._top_liked[0]:
+                heapq.heapreplace(self._top_liked, entry)
+        self.terms.update(terms)
+        authors.pop('', None)
+        self.authors.update(authors)
+
+    def summary(self, top: int = 15) -> dict:
+        days = sorted(self.per_day)
+        return {
+            "analyzed": self.total,
+            "replies": self.replies,
+            "questions": self.questions,
+            "top_terms": self.terms.top(top),
+            "top_authors": self.authors.top(10),
+            "top_liked": [
+                {"likes": likes, "author": author, "text": text}
+                for likes, _, author, text in sorted(self._top_liked, reverse=True)
+            ],
+            "days": days,
+            "per_day": [self.per_day[day] for day in days]
+        }
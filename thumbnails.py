@@ -0,0 +1,138 @@
+# thumbnails.py
+
+import asyncio
+import logging
+import tempfile
+import zipfile
+
+import httpx
+from aiogram.types import InputFile
+
+from cache_store import make_cache
+
+# Размеры превью от большего к меньшему. URL строится из ID видео, без запросов к API.
+# hqdefault есть у любого видео, maxres и sd — не всегда (иначе 404)
+THUMBNAIL_SIZES = ("maxresdefault", "sddefault", "hqdefault")
+FALLBACK_SIZE = "hqdefault"
+THUMBNAIL_URL = "https://i.ytimg.com/vi/{video_id}/{size}.jpg"
+
+# Архив собирается в памяти до этого размера, дальше — во временном файле на диске
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+_DONE = object()
+
+
+def thumbnail_url(video_id: str, size: str = FALLBACK_SIZE) -> str:
+    return THUMBNAIL_URL.format(video_id=video_id, size=size)
+
+
+class SpooledInputFile(InputFile):
+    """Отправка архива в Telegram кусками из временного файла, без чтения целиком в память."""
+
+    def __init__(self, file, filename: str):
+        super().__init__(filename=filename)
+        self.file = file
+
+    async def read(self, bot):
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
+
+
+class ThumbnailFetcher:
+    """
+    Превью видео с i.ytimg.com: выбор лучшего доступного размера (HEAD-запросы,
+    результат кэшируется) и потоковая упаковка превью канала в ZIP-архивы.
+    Квоту YouTube Data API не тратит.
+    """
+
+    def __init__(self, concurrency: int = 8, part_bytes: int = 45 * 1024 * 1024):
+        self.client = httpx.AsyncClient(timeout=10.0, limits=httpx.Limits(max_connections=concurrency))
+        self.concurrency = concurrency
+        self.part_bytes = part_bytes
+        # ID видео -> лучший доступный размер превью
+        self._size_cache = make_cache("thumbnail_size", ttl=7 * 24 * 3600, max_size=16384)
+
+    async def best_url(self, video_id: str) -> str:
+        """URL самого крупного существующего превью видео."""
+        size = self._size_cache.get(video_id)
+        if size is None:
+            for candidate in THUMBNAIL_SIZES[:-1]:
+                try:
+                    response = await self.client.head(thumbnail_url(video_id, candidate))
+                except httpx.HTTPError:
+                    # i.ytimg.com недоступен — отдаем гарантированный размер, не кэшируя
+                    return thumbnail_url(video_id)
+                if response.status_code == 200:
+                    size = candidate
+                    break
+            else:
+                size = FALLBACK_SIZE
+            self._size_cache.set(video_id, size)
+        return thumbnail_url(video_id, size)
+
+    async def _download(self, video_id: str) -> bytes | None:
+        for size in THUMBNAIL_SIZES:
+            try:
+                response = await self.client.get(thumbnail_url(video_id, size))
+            except httpx.HTTPError as e:
+                logging.warning(f"🖼 Не удалось скачать превью {video_id}: {e}")
+                return None
+            if response.status_code == 200:
+                self._size_cache.set(video_id, size)
+                return response.content
+        return None
+
+    async def iter_archives(self, video_ids: list, on_progress=None):
+        """
+        Скачивает превью (не больше `concurrency` одновременно) и отдает
+        ZIP-архивы частями не больше `part_bytes` — под лимит Telegram на файл.
+        В памяти одновременно не больше ~2×concurrency картинок: загрузчики ждут,
+        пока архив заберет уже скачанные. Каждая часть — словарь
+        {"file", "count", "failed"} (failed — нескачанные превью с начала выгрузки);
+        файл закрывается после перехода к следующей части.
+        on_progress — необязательная корутина, получает (обработано, всего).
+        """
+        queue = asyncio.Queue(maxsize=self.concurrency)
+        pending = iter(enumerate(video_ids, 1))
+
+        async def worker():
+            for index, video_id in pending:
+                await queue.put((index, video_id, await self._download(video_id)))
+
+        async def producer():
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+            await queue.put(_DONE)
+
+        task = asyncio.create_task(producer())
+        spool = archive = None
+        count = failed = processed = 0
+        try:
+            while (entry := await queue.get()) is not _DONE:
+                index, video_id, content = entry
+                processed += 1
+                if content is None:
+                    failed += 1
+                else:
+                    if archive is not None and spool.tell() + len(content) > self.part_bytes:
+                        archive.close()
+                        yield {"file": spool, "count": count, "failed": failed}
+                        spool.close()
+                        spool = archive = None
+                        count = 0
+                    if archive is None:
+                        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+                        # JPEG уже сжат: без повторного сжатия архив собирается быстрее
+                        archive = zipfile.ZipFile(spool, "w", compression=zipfile.ZIP_STORED)
+                    archive.writestr(f"{index:05d}_{video_id}.jpg", content)
+                    count += 1
+                if on_progress:
+                    await on_progress(processed, len(video_ids))
+
+            if archive is not None:
+                archive.close()
+                yield {"file": spool, "count": count, "failed": failed}
+        finally:
+            task.cancel()
+            if spool is not None:
+                spool.close()
@@ -2,13 +2,36 @@
 
 import asyncio
 from pytrends.request import TrendReq
-import matplotlib.pyplot as plt
 import io  # Для работы с файлами в памяти
 
+import deadline
+
 # Настройка Matplotlib для работы без графического интерфейса (важно для серверов)
 import matplotlib
 
 matplotlib.use('Agg')
+from matplotlib.figure import Figure
+
+
+def render_trend_chart(series, keyword: str) -> io.BytesIO:
+    """
+    График интереса за 90 дней. Отдельная Figure без pyplot: ее можно рисовать
+    в пуле потоков, не трогая общее состояние pyplot и не блокируя event loop.
+    """
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    ax.plot(series, label=f'Интерес к "{keyword}" на YouTube')
+    ax.set_title('Динамика популярности за 90 дней')
+    ax.set_xlabel('Дата')
+    ax.set_ylabel('Интерес (0-100)')
+    ax.legend()
+    ax.grid(True)
+
+    # Сохраняем график в буфер памяти (вместо файла)
+    image_buffer = io.BytesIO()
+    fig.savefig(image_buffer, format='png', bbox_inches='tight')
+    image_buffer.seek(0)  # "Перематываем" буфер в начало
+    return image_buffer
 
 
 async def analyze_google_trends(keyword: str) -> dict:
@@ -17,13 +40,18 @@ async def analyze_google_trends(keyword: str) -> dict:
     """
     try:
         # 1. Запускаем pytrends в асинхронном режиме (чтобы не блокировать бота)
-        pytrends = TrendReq(hl='en-US', tz=360)
+        # timeout=(connect, read) — чтобы зависший запрос не держал поток пула
+        # дольше, чем обработчик ждет ответ (см. deadline.POLICIES["pytrends"])
+        pytrends = TrendReq(hl='en-US', tz=360, timeout=(3.05, 15))
 
         loop = asyncio.get_event_loop()
 
+        def in_thread(func):
+            # Каждый шаг pytrends — отдельный вызов с таймаутом из политики и остатка бюджета
+            return deadline.call("pytrends", lambda: loop.run_in_executor(None, func))
+
         # 2. Создаем "полезную нагрузку" (payload)
-        await loop.run_in_executor(
-            None,  # Используем стандартный ThreadPoolExecutor
+        await in_thread(
             lambda: pytrends.build_payload(
                 kw_list=[keyword],
                 timeframe='today 3-m',  # "today 3-m" = "Последние 90 дней"
@@ -33,21 +61,18 @@ async def analyze_google_trends(keyword: str) -> dict:
         )
 
         # 3. Получаем данные для графика (Interest Over Time)
-        data = await loop.run_in_executor(None, pytrends.interest_over_time)
+        data = await in_thread(pytrends.interest_over_time)
 
         if data.empty:
             return {"error": "По этому запросу нет данных о трендах на YouTube."}
 
         # 4. Получаем данные по регионам
-        regions_data = await loop.run_in_executor(
-            None,
-            lambda: pytrends.interest_by_region(resolution='COUNTRY')
-        )
+        regions_data = await in_thread(lambda: pytrends.interest_by_region(resolution='COUNTRY'))
         # Сортируем и берем топ-1
         top_country = regions_data[keyword].idxmax() if not regions_data.empty else "N/A"
 
         # 5. Получаем похожие запросы
-        related_queries_data = await loop.run_in_executor(None, pytrends.related_queries)
+        related_queries_data = await in_thread(pytrends.related_queries)
         related_queries_raw = related_queries_data[keyword].get('top', None)
 
         related_queries = []
@@ -55,21 +80,8 @@ async def analyze_google_trends(keyword: str) -> dict:
             # Берем первые 5
             related_queries = list(related_queries_raw['query'].head(5))
 
-        # 6. Рисуем график
-        plt.figure(figsize=(10, 5))
-        plt.plot(data[keyword], label=f'Интерес к "{keyword}" на YouTube')
-        plt.title('Динамика популярности за 90 дней')
-        plt.xlabel('Дата')
-        plt.ylabel('Интерес (0-100)')
-        plt.legend()
-        plt.grid(True)
-
-        # 7. Сохраняем график в буфер памяти (вместо файла)
-        image_buffer = io.BytesIO()
-        plt.savefig(image_buffer, format='png', bbox_inches='tight')
-        plt.close()  # Очищаем фигуру
-
-        image_buffer.seek(0)  # "Перематываем" буфер в начало
+        # 6. Рисуем график в пуле потоков (matplotlib не должен держать event loop)
+        image_buffer = await loop.run_in_executor(None, render_trend_chart, data[keyword], keyword)
 
         return {
             "image": image_buffer,
@@ -77,6 +89,8 @@ async def analyze_google_trends(keyword: str) -> dict:
             "related_queries": related_queries
         }
 
+    except deadline.DeadlineExceeded:
+        return {"error": "Google Trends не ответил вовремя. Попробуйте еще раз чуть позже."}
     except Exception as e:
         # ⬇️ --- ИСПРАВЛЕНИЕ ЗДЕСЬ --- ⬇️
         # Pytrends может выдать ошибку, если запросов слишком много
@@ -0,0 +1,53 @@
+# uploads_feed.py
+
+from datetime import datetime, timezone
+from xml.etree.ElementTree import XMLPullParser
+
+# Сколько последних видео YouTube отдает в ленте канала feeds/videos.xml
+FEED_MAX_ENTRIES = 15
+
+_ATOM = "{http://www.w3.org/2005/Atom}"
+_YT = "{http://www.youtube.com/xml/schemas/2015}"
+
+
+def _to_api_timestamp(value: str) -> str:
+    """'2024-01-01T12:00:00+00:00' (лента) -> '2024-01-01T12:00:00Z' (как в Data API)."""
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(timezone.utc)
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class FeedParser:
+    """
+    Потоковый разбор Atom-ленты загрузок канала (XMLPullParser): байты подаются
+    по мере получения ответа, каждая запись <entry> разбирается сразу и удаляется
+    из дерева, так что документ целиком в памяти не собирается.
+    Записи — {"video_id", "title", "published_at"} в формате Data API, в порядке
+    ленты (от новых к старым).
+    """
+
+    def __init__(self):
+        self._parser = XMLPullParser(events=("start", "end"))
+        self._root = None
+        self.entries = []
+
+    def feed(self, data: bytes):
+        self._parser.feed(data)
+        for event, element in self._parser.read_events():
+            if event == "start":
+                if self._root is None:
+                    self._root = element
+                continue
+            if element.tag != f"{_ATOM}entry":
+                continue
+            video_id = element.findtext(f"{_YT}videoId")
+            published = element.findtext(f"{_ATOM}published")
+            if video_id and published:
+                self.entries.append({
+                    "video_id": video_id,
+                    "title": element.findtext(f"{_ATOM}title", default=""),
+                    "published_at": _to_api_timestamp(published),
+                })
+            self._root.remove(element)
+
+    def close(self):
+        self._parser.close()
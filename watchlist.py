@@ -0,0 +1,319 @@
+# watchlist.py
+
+import asyncio
+import html
+import logging
+import random
+import sqlite3
+import time
+from datetime import datetime
+
+from aiogram import Bot
+
+# Сколько проверок приходится на средний интервал между загрузками канала
+CHECKS_PER_GAP = 4
+# Разброс интервала (±20%), чтобы проверки каналов не собирались в пачки
+JITTER = 0.2
+# Вес нового интервала между загрузками в скользящем среднем
+GAP_EWMA_ALPHA = 0.3
+# Сколько каналов проверять за один проход планировщика
+DUE_BATCH = 100
+
+_CHANNEL_KEYS = ("channel_id", "title", "etag", "last_published", "avg_gap", "next_check", "errors", "seen_ids")
+_CHANNEL_COLUMNS = ", ".join(_CHANNEL_KEYS)
+_JOINED_CHANNEL_COLUMNS = ", ".join(f"c.{key}" for key in _CHANNEL_KEYS)
+
+
+def _parse_published(value: str) -> float:
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+def find_new_videos(videos: list, seen_ids: str | None, last_published: str | None) -> list:
+    """
+    Новые видео из ответа `videos` (он идет от новых к старым), по порядку публикации.
+    Новые — те, что в ответе выше последнего уже виденного видео: сравнение по ID
+    и порядку одного ответа, а не по датам. Даты публикации в ленте и в API могут
+    расходиться для одного видео (запланированные, премьеры), и после переключения
+    источника видео иначе объявлялось бы повторно или терялось.
+    Дата last_published нужна, только если ни одного виденного видео в ответе нет.
+    """
+    seen = set(seen_ids.split()) if seen_ids else set()
+    fresh = []
+    for video in videos:
+        if video['video_id'] in seen:
+            break
+        fresh.append(video)
+    else:
+        fresh = [v for v in videos if last_published is None or v['published_at'] > last_published]
+    return sorted(fresh, key=lambda v: v['published_at'])
+
+
+class WatchStore:
+    """
+    Подписки на каналы в локальной SQLite-базе.
+    Канал хранится один раз, сколько бы пользователей на него ни подписалось:
+    опрос YouTube идет по каналам, а не по подпискам.
+    """
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, timeout=5)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS watch_channels (
+                channel_id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                etag TEXT,
+                last_published TEXT,
+                avg_gap REAL NOT NULL,
+                next_check REAL NOT NULL,
+                errors INTEGER NOT NULL DEFAULT 0,
+                seen_ids TEXT
+            );
+            CREATE TABLE IF NOT EXISTS watch_subscriptions (
+                user_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                channel_id TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (user_id, channel_id)
+            );
+            CREATE INDEX IF NOT EXISTS watch_channels_next_check ON watch_channels (next_check);
+            CREATE INDEX IF NOT EXISTS watch_subscriptions_channel ON watch_subscriptions (channel_id);
+        """)
+        # Базы, созданные до появления seen_ids
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(watch_channels)")}
+        if "seen_ids" not in columns:
+            self.conn.execute("ALTER TABLE watch_channels ADD COLUMN seen_ids TEXT")
+        self.conn.commit()
+
+    def channel(self, channel_id: str) -> dict | None:
+        row = self.conn.execute(
+            f"SELECT {_CHANNEL_COLUMNS} "
+            "FROM watch_channels WHERE channel_id = ?", (channel_id,)
+        ).fetchone()
+        return self._channel_row(row) if row else None
+
+    @staticmethod
+    def _channel_row(row) -> dict:
+        return dict(zip(_CHANNEL_KEYS, row))
+
+    def add_channel(self, channel_id: str, title: str, etag: str | None, last_published: str | None,
+                    avg_gap: float, next_check: float, seen_ids: str | None = None):
+        self.conn.execute(
+            "INSERT OR IGNORE INTO watch_channels "
+            "(channel_id, title, etag, last_published, avg_gap, next_check, seen_ids) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (channel_id, title, etag, last_published, avg_gap, next_check, seen_ids)
+        )
+        self.conn.commit()
+
+    def update_channel(self, channel_id: str, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        self.conn.execute(f"UPDATE watch_channels SET {columns} WHERE channel_id = ?", (*fields.values(), channel_id))
+        self.conn.commit()
+
+    def subscribe(self, user_id: int, chat_id: int, channel_id: str) -> bool:
+        """True, если подписка новая."""
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO watch_subscriptions (user_id, chat_id, channel_id, created_at) VALUES (?, ?, ?, ?)",
+            (user_id, chat_id, channel_id, time.time())
+        )
+        self.conn.commit()
+        return cursor.rowcount > 0
+
+    def unsubscribe(self, user_id: int, channel_id: str) -> bool:
+        """Удаляет подписку; канал без подписчиков перестает опрашиваться."""
+        cursor = self.conn.execute(
+            "DELETE FROM watch_subscriptions WHERE user_id = ? AND channel_id = ?", (user_id, channel_id)
+        )
+        self.conn.execute(
+            "DELETE FROM watch_channels WHERE channel_id = ? AND NOT EXISTS "
+            "(SELECT 1 FROM watch_subscriptions WHERE channel_id = ?)", (channel_id, channel_id)
+        )
+        self.conn.commit()
+        return cursor.rowcount > 0
+
+    def user_channels(self, user_id: int) -> list:
+        rows = self.conn.execute(
+            f"SELECT {_JOINED_CHANNEL_COLUMNS} "
+            "FROM watch_subscriptions s JOIN watch_channels c ON c.channel_id = s.channel_id "
+            "WHERE s.user_id = ? ORDER BY s.created_at", (user_id,)
+        ).fetchall()
+        return [self._channel_row(row) for row in rows]
+
+    def count_user(self, user_id: int) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM watch_subscriptions WHERE user_id = ?", (user_id,)
+        ).fetchone()[0]
+
+    def subscribers(self, channel_id: str) -> list:
+        rows = self.conn.execute(
+            "SELECT DISTINCT chat_id FROM watch_subscriptions WHERE channel_id = ?", (channel_id,)
+        ).fetchall()
+        return [chat_id for (chat_id,) in rows]
+
+    def due(self, now: float, limit: int = DUE_BATCH) -> list:
+        rows = self.conn.execute(
+            f"SELECT {_CHANNEL_COLUMNS} "
+            "FROM watch_channels WHERE next_check <= ? ORDER BY next_check LIMIT ?", (now, limit)
+        ).fetchall()
+        return [self._channel_row(row) for row in rows]
+
+    def next_due(self) -> float | None:
+        return self.conn.execute("SELECT MIN(next_check) FROM watch_channels").fetchone()[0]
+
+
+class WatchScheduler:
+    """
+    Планировщик проверки новых загрузок.
+    Каждый канал опрашивается с интервалом, подобранным по его частоте загрузок
+    (CHECKS_PER_GAP проверок на средний интервал между видео, в границах
+    [min_interval, max_interval], с разбросом ±JITTER). Каналы, которые давно
+    молчат, опрашиваются редко. Проверка — чтение ленты загрузок канала
+    (без квоты); если лента недоступна — один playlistItems.list с
+    If-None-Match: если плейлист не менялся, ответ 304 без тела.
+    Между проверками планировщик спит, поэтому тихий список из тысяч каналов
+    почти ничего не стоит.
+    """
+
+    def __init__(self, store_path: str, analyzer, min_interval: float, max_interval: float,
+                 concurrency: int = 5):
+        self.store_path = store_path
+        self._store: WatchStore | None = None
+        self.analyzer = analyzer
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.bot: Bot | None = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.stats = {"checks": 0, "not_modified": 0, "new_videos": 0, "errors": 0}
+
+    @property
+    def store(self) -> WatchStore:
+        """База подписок открывается при первом обращении, а не при импорте."""
+        if self._store is None:
+            self._store = WatchStore(self.store_path)
+        return self._store
+
+    def start(self, bot: Bot):
+        self.bot = bot
+        self._task = asyncio.create_task(self._loop())
+
+    def plan_interval(self, avg_gap: float, last_published: str | None, now: float) -> float:
+        """Интервал до следующей проверки канала (сек)."""
+        gap = avg_gap
+        if last_published:
+            # Если канал молчит дольше обычного, он, скорее всего, сбавил темп
+            gap = max(gap, now - _parse_published(last_published))
+        interval = min(max(gap / CHECKS_PER_GAP, self.min_interval), self.max_interval)
+        return interval * random.uniform(1 - JITTER, 1 + JITTER)
+
+    async def watch(self, user_id: int, chat_id: int, channel_id: str) -> dict:
+        """
+        Подписывает пользователя на канал. Новый канал читается один раз,
+        чтобы запомнить последнее видео и оценить частоту загрузок.
+        Возвращает {"title", "created"} или {"error"}.
+        """
+        channel = self.store.channel(channel_id)
+        if channel is None:
+            info, latest = await asyncio.gather(
+                self.analyzer.load_channel(channel_id),
+                self.analyzer.get_latest_uploads(channel_id)
+            )
+            if not info:
+                return {"error": "Канал не найден."}
+            if latest.get("error"):
+                return latest
+
+            now = time.time()
+            published = sorted(_parse_published(v['published_at']) for v in latest['videos'])
+            gaps = [b - a for a, b in zip(published, published[1:])]
+            avg_gap = sum(gaps) / len(gaps) if gaps else self.max_interval * CHECKS_PER_GAP
+            last_published = max((v['published_at'] for v in latest['videos']), default=None)
+            self.store.add_channel(
+                channel_id, info['snippet']['title'], latest.get('etag'), last_published, avg_gap,
+                now + self.plan_interval(avg_gap, last_published, now),
+                seen_ids=" ".join(v['video_id'] for v in latest['videos'])
+            )
+            self._wakeup.set()
+            channel = self.store.channel(channel_id)
+
+        created = self.store.subscribe(user_id, chat_id, channel_id)
+        return {"title": channel['title'], "created": created}
+
+    async def _loop(self):
+        while True:
+            now = time.time()
+            due = self.store.due(now)
+            if due:
+                results = await asyncio.gather(*(self._check(channel) for channel in due), return_exceptions=True)
+                for channel, result in zip(due, results):
+                    if isinstance(result, Exception):
+                        logging.error(f"👀 Сбой проверки канала {channel['channel_id']}: {result}")
+                        self.store.update_channel(channel['channel_id'], next_check=now + self.min_interval)
+                continue
+
+            # Сон не дольше min_interval: каналы могли добавить другие процессы бота
+            next_due = self.store.next_due()
+            timeout = self.min_interval if next_due is None else min(max(next_due - now, 1.0), self.min_interval)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _check(self, channel: dict):
+        async with self._semaphore:
+            result = await self.analyzer.get_latest_uploads(channel['channel_id'], etag=channel['etag'])
+        self.stats["checks"] += 1
+        now = time.time()
+
+        if result.get("error"):
+            self.stats["errors"] += 1
+            errors = channel['errors'] + 1
+            backoff = min(self.min_interval * 2 ** errors, self.max_interval)
+            logging.warning(f"👀 Проверка канала {channel['channel_id']} не удалась: {result['error']}")
+            self.store.update_channel(channel['channel_id'], errors=errors, next_check=now + backoff)
+            return
+
+        if result.get("not_modified"):
+            self.stats["not_modified"] += 1
+            self.store.update_channel(
+                channel['channel_id'], errors=0,
+                next_check=now + self.plan_interval(channel['avg_gap'], channel['last_published'], now)
+            )
+            return
+
+        last_published = channel['last_published']
+        new_videos = find_new_videos(result['videos'], channel['seen_ids'], last_published)
+        avg_gap = channel['avg_gap']
+        previous = last_published
+        for video in new_videos:
+            if previous:
+                gap = max(_parse_published(video['published_at']) - _parse_published(previous), 0.0)
+                avg_gap = (1 - GAP_EWMA_ALPHA) * avg_gap + GAP_EWMA_ALPHA * gap
+            previous = max(previous or video['published_at'], video['published_at'])
+
+        if new_videos:
+            self.stats["new_videos"] += len(new_videos)
+            await self._notify(channel, new_videos)
+
+        # У ответа из ленты etag нет: прежний пригодится для следующего запроса к API
+        etag = result.get('etag') or channel['etag']
+        seen_ids = " ".join(v['video_id'] for v in result['videos']) or channel['seen_ids']
+        self.store.update_channel(
+            channel['channel_id'], etag=etag, last_published=previous, avg_gap=avg_gap, errors=0,
+            next_check=now + self.plan_interval(avg_gap, previous, now), seen_ids=seen_ids
+        )
+
+    async def _notify(self, channel: dict, videos: list):
+        lines = [f"🔔 <b>Новое на канале {html.escape(channel['title'])}</b>\n"]
+        lines += [
+            f"▶️ <a href='https://www.youtube.com/watch?v={v['video_id']}'>{html.escape(v['title'])}</a>"
+            for v in videos
+        ]
+        text = "\n".join(lines)
+        for chat_id in self.store.subscribers(channel['channel_id']):
+            try:
+                await self.bot.send_message(chat_id, text, parse_mode="HTML")
+            except Exception as e:
+                logging.warning(f"Не удалось отправить уведомление в чат {chat_id}: {e}")
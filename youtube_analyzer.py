@@ -1,13 +1,31 @@
 # youtube_analyzer.py
 
-import re
 import datetime
 import asyncio
+import logging
+import threading
 import numpy as np
-from googleapiclient.discovery import build
-from config import YOUTUBE_API_KEY
+import httplib2
+from config import (YOUTUBE_API_KEY, HEALTH_DEPTH_DEFAULT, HEALTH_DEPTH_MAX, STATS_CACHE_TTL, RYD_CONCURRENCY,
+                    NICHE_OUTLIER_DEPTH, NICHE_OUTLIERS_TOP, NICHE_CONCURRENCY,
+                    COMMENTS_MAX_PAGES, COMMENTS_PREFETCH, COMMENTS_TOP_CAPACITY, SEARCH_DB_PATH,
+                    SHORTS_MAX_SECONDS, COMPARE_MAX_CHANNELS, COMPARE_DEPTH, RSS_FEED_URL)
+from analytics import (DAY_NAMES, parse_timestamps, build_publication_grid, weekly_cadence, channel_health,
+                       niche_outliers, parse_durations, shorts_mask, format_health, top_in_windows)
+from cache_store import make_cache
+from batch_loader import BatchLoader
+from http_cache import ETagCache, ETagCachingHttp, CACHE_HIT_HEADER
+import api_fields
+import deadline
+from link_parser import ParsedLink, parse_link
+from text_stats import CommentAggregator
+from search_index import SearchIndex
+from uploads_feed import FeedParser, FEED_MAX_ENTRIES
 import httpx
 
+# Сколько последних видео попадает в быструю теплокарту публикаций
+HEATMAP_RECENT_VIDEOS = 50
+
 
 class YouTubeAnalyzer:
     """
@@ -16,61 +34,238 @@ class YouTubeAnalyzer:
     """
 
     def __init__(self):
-        # Инициализация сервиса YouTube API
-        self.youtube = build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
+        # Сервис YouTube API строится лениво (см. свойство youtube)
+        self._youtube = None
+        self._youtube_lock = threading.Lock()
 
         # Клиент для API Return YouTube Dislike
         self.ryd_client = httpx.AsyncClient(
             base_url="https://returnyoutubedislikeapi.com",
             timeout=5.0
         )
+        # Клиент для ленты загрузок feeds/videos.xml (см. get_feed_uploads)
+        self.feed_client = httpx.AsyncClient(timeout=5.0, follow_redirects=True)
+        self._feed_stats = {"used": 0, "not_enough": 0, "failed": 0}
+
+        # У httplib2 нет потокобезопасности: каждому потоку пула — свой HTTP-клиент.
+        # Кэш ответов с ETag общий: повторные GET уходят с If-None-Match
+        self._local = threading.local()
+        self._etag_cache = ETagCache()
+
+        # Кэши: статистика видео живет недолго, а плейлист загрузок канала не меняется.
+        # В многопроцессном режиме они общие для всех воркеров (см. cache_store.make_cache)
+        self._stats_cache = make_cache("stats", ttl=STATS_CACHE_TTL, max_size=512)
+        self._uploads_cache = make_cache("uploads", ttl=24 * 3600, max_size=4096)
+        self._categories_cache = make_cache("categories", ttl=24 * 3600, max_size=16)
+        # Резолв @псевдонима / названия в ID канала стоит до 100 единиц квоты (search.list)
+        self._resolve_cache = make_cache("resolve", ttl=24 * 3600, max_size=4096)
+
+        # Коалесцеры videos.list / channels.list: (ресурс, part) -> BatchLoader
+        self._loaders = {}
+
+        # Полнотекстовый индекс всего, что бот уже скачал (см. search_index)
+        self._search_index = None
+
+    # --- Выполнение запросов к YouTube API ---
+
+    @property
+    def youtube(self):
+        """
+        Сервис YouTube Data API. googleapiclient и разбор discovery-документа
+        занимают заметное время, поэтому выполняются при первом обращении
+        (или фоновым прогревом), а не при старте бота.
+        """
+        if self._youtube is None:
+            with self._youtube_lock:
+                if self._youtube is None:
+                    from googleapiclient.discovery import build
+                    self._youtube = build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
+        return self._youtube
+
+    @property
+    def search_index(self) -> SearchIndex:
+        """База индекса открывается при первом обращении, а не при импорте."""
+        if self._search_index is None:
+            self._search_index = SearchIndex(SEARCH_DB_PATH)
+        return self._search_index
+
+    def _index_videos(self, videos: list):
+        """Попутное пополнение поискового индекса; сбой индекса не ломает анализ."""
+        if not videos:
+            return
+        try:
+            self.search_index.add_videos(videos)
+        except Exception as e:
+            logging.warning(f"🔎 Не удалось обновить поисковый индекс: {e}")
+
+    def _index_video_items(self, items: list):
+        """Элементы videos.list -> записи индекса (с каналом, если он есть в ответе)."""
+        self._index_videos([
+            {
+                "video_id": item['id'], "channel_id": item['snippet'].get('channelId'),
+                "title": item['snippet'].get('title'), "tags": item['snippet'].get('tags', []),
+                "description": item['snippet'].get('description'),
+                "published_at": item['snippet'].get('publishedAt'),
+                "views": item.get('statistics', {}).get('viewCount')
+            }
+            for item in items if item and 'snippet' in item
+        ])
+        channels = {item['snippet']['channelId']: item['snippet']['channelTitle']
+                    for item in items if item and item.get('snippet', {}).get('channelTitle')}
+        for channel_id, title in channels.items():
+            self._index_channel(channel_id, title)
+
+    def _index_channel(self, channel_id: str, title: str):
+        try:
+            self.search_index.add_channel(channel_id, title)
+        except Exception as e:
+            logging.warning(f"🔎 Не удалось обновить поисковый индекс: {e}")
+
+    def _thread_http(self) -> httplib2.Http:
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = self._local.http = ETagCachingHttp(httplib2.Http(timeout=30), self._etag_cache)
+        return http
+
+    def _cached_postproc(self, postproc):
+        """
+        Если ответ восстановлен из ETag-кэша после 304, JSON уже разобран —
+        возвращаем сохраненный объект вместо повторного разбора.
+        Код анализатора ответы API не изменяет, поэтому объект можно отдавать повторно.
+        """
+        def wrapper(resp, content):
+            key = resp.get(CACHE_HIT_HEADER)
+            entry = self._etag_cache.get(key) if key else None
+            if entry is not None and entry['parsed'] is not None:
+                return entry['parsed']
+            parsed = postproc(resp, content)
+            if entry is not None:
+                entry['parsed'] = parsed
+            return parsed
+        return wrapper
+
+    async def _execute(self, request) -> dict:
+        """
+        Выполняет запрос googleapiclient в пуле потоков, не блокируя event loop.
+        Таймаут — по политике "youtube" и не больше остатка бюджета обработчика (deadline).
+        """
+        loop = asyncio.get_running_loop()
+        request.postproc = self._cached_postproc(request.postproc)
+        return await deadline.call(
+            "youtube", lambda: loop.run_in_executor(None, lambda: request.execute(http=self._thread_http()))
+        )
+
+    def _loader(self, resource: str, part: str, fields: str) -> BatchLoader:
+        """
+        Возвращает коалесцер для videos.list или channels.list с нужными `part` и `fields`.
+        Одиночные запросы из разных обработчиков склеиваются в пачки по 50 ID.
+        """
+        key = (resource, part, fields)
+        loader = self._loaders.get(key)
+        if loader is None:
+            async def batch_fn(ids: list) -> dict:
+                request = getattr(self.youtube, resource)().list(part=part, id=",".join(ids), fields=fields)
+                response = await self._execute(request)
+                return {item['id']: item for item in response.get('items', [])}
+
+            loader = self._loaders[key] = BatchLoader(batch_fn)
+        return loader
+
+    async def load_video(self, video_id: str, part: str = "snippet,statistics",
+                         fields: str = api_fields.VIDEO_DETAILS) -> dict | None:
+        return await self._loader('videos', part, fields).load(video_id)
+
+    async def load_channel(self, channel_id: str, part: str = "snippet,statistics",
+                           fields: str = api_fields.CHANNEL_DETAILS) -> dict | None:
+        item = await self._loader('channels', part, fields).load(channel_id)
+        if item and 'snippet' in item:
+            self._index_channel(item['id'], item['snippet']['title'])
+        return item
+
+    def metrics(self) -> dict:
+        """
+        Счетчики коалесцеров (сколько одиночных запросов ушло в сколько пакетных),
+        ETag-кэша (сколько ответов пришло как 304 и сколько байт это сэкономило)
+        и ленты загрузок (сколько раз она заменила запрос к API).
+        """
+        # Разные маски fields с одинаковым part — разные коалесцеры: подписываем их именем из api_fields
+        mask_names = {value: name for name, value in vars(api_fields).items() if name.isupper()}
+        metrics = {
+            f"{resource}.list[{part}] {mask_names.get(fields, fields)}": dict(loader.stats)
+            for (resource, part, fields), loader in self._loaders.items()
+        }
+        metrics["etag_cache"] = self._etag_cache.metrics()
+        metrics["feed"] = dict(self._feed_stats)
+        return metrics
+
+    async def _iter_playlist_pages(self, playlist_id: str, part: str, fields: str, page_size: int = 50):
+        """
+        Постранично (по 50 элементов) отдает содержимое плейлиста.
+        Страницы не накапливаются: вызывающий код обрабатывает их по мере получения.
+        `fields` — маска из api_fields (должна включать nextPageToken).
+        """
+        page_token = None
+        while True:
+            request = self.youtube.playlistItems().list(
+                part=part,
+                playlistId=playlist_id,
+                maxResults=page_size,
+                pageToken=page_token,
+                fields=fields
+            )
+            response = await self._execute(request)
+            items = response.get('items', [])
+            if not items:
+                break
+            yield items
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
 
     # --- Утилитарные функции для извлечения ID ---
 
-    def _extract_video_id(self, url: str) -> str | None:
-        match_standard = re.search(r'(?<=v=)[a-zA-Z0-9_-]+', url)
-        if match_standard: return match_standard.group(0)
-        match_short = re.search(r'youtu\.be/([a-zA-Z0-9_-]+)', url)
-        if match_short: return match_short.group(1)
-        match_shorts = re.search(r'/shorts/([a-zA-Z0-9_-]+)', url)
-        if match_shorts: return match_shorts.group(1)
-        return None
+    def _extract_video_id(self, url: str | ParsedLink) -> str | None:
+        link = url if isinstance(url, ParsedLink) else parse_link(url, kind='video')
+        return link.value if link and link.is_video else None
 
-    def _extract_channel_info(self, text_input: str) -> dict | None:
-        match_raw_handle = re.fullmatch(r'@([a-zA-Z0-9_.-]+)', text_input.strip())
-        if match_raw_handle: return {'type': 'search_query', 'value': match_raw_handle.group(1)}
-        match_id = re.search(r'/channel/([a-zA-Z0-9_-]+)', text_input)
-        if match_id: return {'type': 'id', 'value': match_id.group(1)}
-        match_user = re.search(r'/user/([a-zA-Z0-9_-]+)', text_input)
-        if match_user: return {'type': 'username', 'value': match_user.group(1)}
-        match_handle = re.search(r'/@([a-zA-Z0-9_.-]+)', text_input)
-        if match_handle: return {'type': 'search_query', 'value': match_handle.group(1)}
-        match_custom = re.search(r'/c/([a-zA-Z0-9_.-]+)', text_input)
-        if match_custom: return {'type': 'search_query', 'value': match_custom.group(1)}
-        if not (text_input.startswith('http') or text_input.startswith('www.') or '/' in text_input):
-            clean_input = text_input.replace('@', '').strip()
-            if clean_input: return {'type': 'search_query', 'value': clean_input}
-        return None
+    def _extract_channel_info(self, text_input: str | ParsedLink) -> dict | None:
+        link = text_input if isinstance(text_input, ParsedLink) else parse_link(text_input, kind='channel')
+        return link.as_channel_info() if link and not link.is_video else None
 
     # --- Функционал "Аналитика видео" ---
 
     async def _get_ryd_dislikes(self, video_id: str) -> str:
-        try:
+        """Дизлайки из RYD — необязательное поле: при задержке или сбое вместо них 'N/A'."""
+        async def fetch() -> dict:
             response = await self.ryd_client.get(f"/votes?videoId={video_id}")
             response.raise_for_status()
-            data = response.json()
+            return response.json()
+
+        try:
+            data = await deadline.call("ryd", fetch, fallback=None)
+            if data is None:
+                return 'N/A'
             dislikes = data.get('dislikes', 'N/A')
             return str(dislikes) if isinstance(dislikes, int) else 'N/A'
         except Exception:
             return 'N/A'
 
+    async def _get_category_map(self) -> dict:
+        """Справочник категорий {id: название}; меняется редко, поэтому кэшируется на сутки."""
+        category_map = self._categories_cache.get("US")
+        if category_map is None:
+            request = self.youtube.videoCategories().list(
+                part="snippet", regionCode="US", fields=api_fields.CATEGORY_TITLES
+            )
+            response = await self._execute(request)
+            category_map = {item['id']: item['snippet']['title'] for item in response['items']}
+            self._categories_cache.set("US", category_map)
+        return category_map
+
     async def _get_category_name(self, category_id: str) -> str:
         try:
-            request = self.youtube.videoCategories().list(part="snippet", regionCode="US")
-            response = request.execute()
-            for item in response['items']:
-                if item['id'] == category_id: return item['snippet']['title']
-            return "Неизвестно"
+            category_map = await self._get_category_map()
+            return category_map.get(category_id, "Неизвестно")
         except Exception:
             return "Ошибка загрузки категории"
 
@@ -82,44 +277,155 @@ class YouTubeAnalyzer:
         if 'default' in thumbnails: return thumbnails['default']['url']
         return None
 
+    def _build_video_data(self, item: dict, dislike_count: str, category_name: str) -> dict:
+        """Собирает словарь с данными видео из элемента ответа videos.list."""
+        video_id = item['id']
+        snippet = item['snippet']
+        stats = item.get('statistics', {})
+        return {
+            "title": snippet['title'], "video_id": video_id,
+            "url": f"https://www.youtube.com/watch?v={video_id}",
+            "published_at": snippet['publishedAt'], "category_id": snippet['categoryId'],
+            "description": snippet.get('description', ''), "tags": snippet.get('tags', []),
+            "geo_code": snippet.get('countryCode', 'N/A'), "views": stats.get('viewCount', '0'),
+            "likes": stats.get('likeCount', '0'), "dislikes": dislike_count,
+            "comments": stats.get('commentCount', '0'),
+            "thumbnail_url": self._get_best_thumbnail_url(snippet.get('thumbnails', {})),
+            "category_name": category_name
+        }
+
     async def get_video_data_by_id(self, video_id: str) -> dict | None:
         if not video_id: return {"error": "Неверный ID видео."}
         try:
-            request = self.youtube.videos().list(part="snippet,statistics", id=video_id)
-            response = request.execute()
-            if not response['items']: return {"error": "Видео не найдено или недоступно."}
-            item = response['items'][0]
-            snippet = item['snippet']
-            stats = item.get('statistics', {})
-            geo_info = snippet.get('countryCode', 'N/A')
-            dislike_count = await self._get_ryd_dislikes(video_id)
-            thumbnail_url = self._get_best_thumbnail_url(snippet.get('thumbnails', {}))
-            data = {
-                "title": snippet['title'], "video_id": video_id,
-                "url": f"https://www.youtube.com/watch?v={video_id}",
-                "published_at": snippet['publishedAt'], "category_id": snippet['categoryId'],
-                "description": snippet['description'], "tags": snippet.get('tags', []),
-                "geo_code": geo_info, "views": stats.get('viewCount', '0'),
-                "likes": stats.get('likeCount', '0'), "dislikes": dislike_count,
-                "comments": stats.get('commentCount', '0'), "thumbnail_url": thumbnail_url
-            }
-            category_name = await self._get_category_name(data['category_id'])
-            data['category_name'] = category_name
-            return data
+            item = await self.load_video(video_id)
+            if not item: return {"error": "Видео не найдено или недоступно."}
+            self._index_video_items([item])
+            dislike_count, category_name = await asyncio.gather(
+                self._get_ryd_dislikes(video_id),
+                self._get_category_name(item['snippet']['categoryId'])
+            )
+            return self._build_video_data(item, dislike_count, category_name)
         except Exception as e:
             return {"error": f"Ошибка при обращении к YouTube API: {e}"}
 
-    async def analyze_video(self, video_url: str) -> dict | None:
+    async def get_videos_bulk(self, video_ids: list) -> dict:
+        """
+        Массовый анализ видео: videos.list пачками по 50 ID, затем параллельное
+        обогащение дизлайками (RYD, с ограничением параллельности) и категориями
+        (один справочник на всю пачку). Возвращает {"videos": [...], "missing": [...]}.
+        """
+        unique_ids = list(dict.fromkeys(video_ids))
+        try:
+            items = await self._loader('videos', 'snippet,statistics', api_fields.VIDEO_DETAILS).load_many(unique_ids)
+        except Exception as e:
+            return {"error": f"Ошибка при обращении к YouTube API: {e}"}
+
+        found = [item for item in items if item]
+        missing = [video_id for video_id, item in zip(unique_ids, items) if not item]
+        self._index_video_items(found)
+
+        semaphore = asyncio.Semaphore(RYD_CONCURRENCY)
+
+        async def limited_dislikes(video_id: str) -> str:
+            async with semaphore:
+                return await self._get_ryd_dislikes(video_id)
+
+        async def safe_category_map() -> dict | None:
+            try:
+                return await self._get_category_map()
+            except Exception:
+                return None
+
+        dislike_counts, category_map = await asyncio.gather(
+            asyncio.gather(*(limited_dislikes(item['id']) for item in found)),
+            safe_category_map()
+        )
+
+        videos = []
+        for item, dislikes in zip(found, dislike_counts):
+            if category_map is None:
+                category_name = "Ошибка загрузки категории"
+            else:
+                category_name = category_map.get(item['snippet']['categoryId'], "Неизвестно")
+            videos.append(self._build_video_data(item, dislikes, category_name))
+
+        return {"videos": videos, "missing": missing}
+
+    async def analyze_video(self, video_url: str | ParsedLink) -> dict | None:
         video_id = self._extract_video_id(video_url)
         if not video_id: return {"error": "Не удалось найти ID видео в ссылке. Проверьте формат."}
         return await self.get_video_data_by_id(video_id)
 
+    async def analyze_comments(self, video_id: str, max_pages: int = COMMENTS_MAX_PAGES, on_progress=None) -> dict:
+        """
+        Сводка по комментариям видео: частые слова, активные авторы, вопросы,
+        самые залайканные комментарии и число комментариев по дням.
+        Страницы commentThreads.list (от новых к старым) загружаются наперед
+        (не больше COMMENTS_PREFETCH) и сразу сворачиваются в счетчики
+        CommentAggregator, так что память не растет с числом комментариев.
+        Квота ограничена max_pages (1 единица на страницу из 100 комментариев).
+        on_progress — необязательная корутина, получает кол-во обработанных комментариев.
+        """
+        video = await self.load_video(video_id)
+        if not video:
+            return {"error": "Видео не найдено или недоступно."}
+        self._index_video_items([video])
+
+        pages = asyncio.Queue(maxsize=COMMENTS_PREFETCH)
+
+        async def fetch_pages():
+            page_token = None
+            try:
+                for _ in range(max_pages):
+                    request = self.youtube.commentThreads().list(
+                        part="snippet", videoId=video_id, maxResults=100, order="time",
+                        textFormat="plainText", pageToken=page_token, fields=api_fields.COMMENT_THREADS
+                    )
+                    response = await self._execute(request)
+                    await pages.put(response.get('items', []))
+                    page_token = response.get('nextPageToken')
+                    if not page_token:
+                        break
+                await pages.put(page_token)  # None — комментарии закончились, иначе уперлись в max_pages
+            except Exception as e:
+                await pages.put(e)
+
+        aggregator = CommentAggregator(top_capacity=COMMENTS_TOP_CAPACITY)
+        fetcher = asyncio.create_task(fetch_pages())
+        try:
+            while isinstance(page := await pages.get(), list):
+                aggregator.add_page(page)
+                if on_progress:
+                    await on_progress(aggregator.total)
+        finally:
+            fetcher.cancel()
+
+        if isinstance(page, Exception):
+            if aggregator.total == 0:
+                if "commentsDisabled" in str(page):
+                    return {"error": "Комментарии к видео отключены."}
+                return {"error": f"Ошибка при загрузке комментариев: {page}"}
+            truncated = True  # сбой посреди выгрузки: отдаем то, что успели собрать
+        else:
+            truncated = page is not None
+
+        result = aggregator.summary()
+        result.update({
+            "video_id": video_id,
+            "title": video['snippet']['title'],
+            "total_comments": int(video.get('statistics', {}).get('commentCount', 0)),
+            "truncated": truncated
+        })
+        return result
+
     # --- "Аналитика канала" ---
 
     async def _get_channel_id_by_search(self, query: str) -> str | None:
         try:
-            request = self.youtube.search().list(part="snippet", q=query, type="channel", maxResults=1)
-            response = request.execute()
+            request = self.youtube.search().list(
+                part="snippet", q=query, type="channel", maxResults=1, fields=api_fields.SEARCH_CHANNEL_ID
+            )
+            response = await self._execute(request)
             if response.get('items'): return response['items'][0]['snippet']['channelId']
             return None
         except Exception:
@@ -127,54 +433,364 @@ class YouTubeAnalyzer:
 
     async def _get_uploads_playlist_id(self, channel_id: str) -> str | None:
         """Вспомогательная функция для получения ID плейлиста 'Uploads'."""
+        cached = self._uploads_cache.get(channel_id)
+        if cached:
+            return cached
         try:
-            request_details = self.youtube.channels().list(
-                part="contentDetails",
-                id=channel_id
-            )
-            response_details = request_details.execute()
-            if not response_details.get('items'):
+            item = await self.load_channel(channel_id, part="contentDetails", fields=api_fields.CHANNEL_UPLOADS)
+            if not item:
                 return None
-            return response_details['items'][0]['contentDetails'].get('relatedPlaylists', {}).get('uploads')
+            uploads_id = item['contentDetails'].get('relatedPlaylists', {}).get('uploads')
+            if uploads_id:
+                self._uploads_cache.set(channel_id, uploads_id)
+            return uploads_id
         except Exception:
             return None
 
-    async def get_recent_video_stats(self, channel_id: str) -> dict:
+    # --- Лента загрузок (RSS) ---
+
+    async def _fetch_feed(self, channel_id: str, limit: int | None = None) -> list | None:
+        """
+        Записи ленты канала, разобранные по мере скачивания. Как только набралось
+        `limit` записей, чтение обрывается. None — лента недоступна.
+        """
+        async def fetch():
+            parser = FeedParser()
+            async with self.feed_client.stream("GET", RSS_FEED_URL, params={"channel_id": channel_id}) as response:
+                if response.status_code != 200:
+                    return None
+                async for chunk in response.aiter_bytes():
+                    parser.feed(chunk)
+                    if limit is not None and len(parser.entries) >= limit:
+                        return parser.entries
+            parser.close()
+            return parser.entries
+
+        return await deadline.call("feed", fetch, fallback=None)
+
+    async def get_feed_uploads(self, channel_id: str, count: int | None = None,
+                               since: np.datetime64 | None = None) -> list | None:
+        """
+        Последние загрузки канала из публичной ленты feeds/videos.xml — без квоты Data API.
+        В ленте только FEED_MAX_ENTRIES последних видео, поэтому результат отдается,
+        лишь если его хватает: в ленте есть `count` видео, или самое старое видео
+        ленты раньше `since`, или видео меньше FEED_MAX_ENTRIES (это вся история канала).
+        Без count и since нужна вся история.
+        Возвращает [{"video_id", "title", "published_at"}, ...] от новых к старым
+        или None — тогда вызывающий идет в Data API.
+        """
+        if not RSS_FEED_URL:
+            return None
+        entries = await self._fetch_feed(channel_id, limit=count)
+        if entries is None:
+            self._feed_stats["failed"] += 1
+            return None
+
+        enough = (
+            len(entries) < FEED_MAX_ENTRIES
+            or (count is not None and len(entries) >= count)
+            or (since is not None and parse_timestamps([entries[-1]['published_at']])[0] < since)
+        )
+        if not enough:
+            self._feed_stats["not_enough"] += 1
+            return None
+        self._feed_stats["used"] += 1
+        self._index_videos([dict(entry, channel_id=channel_id) for entry in entries])
+        return entries[:count]
+
+    async def get_latest_uploads(self, channel_id: str, etag: str | None = None, limit: int = 10) -> dict:
+        """
+        Последние `limit` загрузок канала. Сначала — из ленты загрузок (без квоты);
+        если она недоступна — одним запросом к плейлисту загрузок.
+        С `etag` запрос к API условный: если плейлист не менялся, API отвечает 304,
+        и возвращается {"not_modified": True}.
+        Иначе {"etag": ..., "videos": [{"video_id", "title", "published_at"}, ...]} или {"error": ...}.
+        У ответа из ленты etag нет.
+        """
+        videos = await self.get_feed_uploads(channel_id, count=limit)
+        if videos is not None:
+            return {"etag": None, "videos": videos}
+
+        uploads_id = await self._get_uploads_playlist_id(channel_id)
+        if not uploads_id:
+            return {"error": "Не удалось найти плейлист загрузок канала."}
+
+        request = self.youtube.playlistItems().list(
+            part="snippet", playlistId=uploads_id, maxResults=limit, fields=api_fields.PLAYLIST_LATEST
+        )
+        if etag:
+            request.headers['If-None-Match'] = etag
+        try:
+            response = await self._execute(request)
+        except Exception as e:
+            # googleapiclient считает 304 ошибкой (HttpError)
+            if getattr(getattr(e, 'resp', None), 'status', None) == 304:
+                return {"not_modified": True}
+            return {"error": f"Ошибка API: {e}"}
+
+        videos = [
+            {
+                "video_id": item['snippet']['resourceId']['videoId'],
+                "title": item['snippet']['title'],
+                "published_at": item['snippet']['publishedAt'],
+            }
+            for item in response.get('items', [])
+        ]
+        self._index_videos([dict(video, channel_id=channel_id) for video in videos])
+        return {"etag": response.get('etag'), "videos": videos}
+
+    async def _get_video_statistics(self, video_ids: list) -> dict:
+        """
+        Статистика и длительность по списку видео: videos.list принимает до 50 ID
+        за один запрос (та же стоимость квоты, contentDetails — в том же запросе),
+        поэтому коалесцер режет ID на пачки по 50, которые запрашиваются параллельно.
+        Возвращает {video_id: (statistics, ISO 8601 длительность)}.
+        """
+        items = await self._loader('videos', 'statistics,contentDetails',
+                                   api_fields.VIDEO_STATS_DURATION).load_many(video_ids)
+        return {
+            item['id']: (item.get('statistics', {}), item.get('contentDetails', {}).get('duration'))
+            for item in items if item
+        }
+
+    async def get_recent_video_stats(self, channel_id: str, depth: int = HEALTH_DEPTH_DEFAULT) -> dict:
         """
         Собирает статистику (просмотры, лайки, комменты)
-        по 10 последним видео для "Здоровья канала".
+        по `depth` последним видео (по умолчанию 10) для "Здоровья канала".
+        Результат кэшируется, поэтому повторные запросы (кнопка графика) мгновенны.
+        Плейлист читается страницами по 50 (квота та же, что и за 10 элементов),
+        поэтому попутно возвращаются даты публикации HEATMAP_RECENT_VIDEOS последних видео
+        ("published_at") — для теплокарты без повторного чтения плейлиста.
+        По каждому видео также известны дата публикации ("published_list") и длительность
+        ("duration_list", сек.), а "shorts_list" отмечает Shorts. "exhausted" — в плейлисте
+        меньше `depth` видео, то есть выборка — вся история канала.
         """
+        depth = max(1, min(int(depth), HEALTH_DEPTH_MAX))
+        cache_key = (channel_id, depth)
+        cached = self._stats_cache.get(cache_key)
+        if cached:
+            return cached
+
         uploads_playlist_id = await self._get_uploads_playlist_id(channel_id)
         if not uploads_playlist_id:
             return {"error": "У канала нет плейлиста загрузок."}
 
-        request_videos = self.youtube.playlistItems().list(
-            part="contentDetails",
-            playlistId=uploads_playlist_id,
-            maxResults=10
-        )
-        response_videos = request_videos.execute()
-        video_ids = [item['contentDetails']['videoId'] for item in response_videos.get('items', [])]
+        video_ids, published, published_by_id = [], [], {}
+        async for items in self._iter_playlist_pages(uploads_playlist_id, part="contentDetails",
+                                                     fields=api_fields.PLAYLIST_RECENT):
+            for item in items:
+                video_ids.append(item['contentDetails']['videoId'])
+                # У скрытых и удаленных видео даты публикации нет
+                if item['contentDetails'].get('videoPublishedAt'):
+                    published.append(item['contentDetails']['videoPublishedAt'])
+                    published_by_id[video_ids[-1]] = published[-1]
+            if len(video_ids) >= max(depth, HEATMAP_RECENT_VIDEOS):
+                break
+        exhausted = len(video_ids) < depth
+        video_ids = video_ids[:depth]
 
         if not video_ids: return {"error": "На канале нет недавних видео."}
 
-        request_stats = self.youtube.videos().list(part="statistics", id=",".join(video_ids))
-        response_stats = request_stats.execute()
+        stats_by_id = await self._get_video_statistics(video_ids)
 
-        views_list, likes_list, comments_list = [], [], []
-        for video_stat in response_stats.get('items', []):
-            stats = video_stat.get('statistics', {})
+        # Сохраняем порядок плейлиста (от новых к старым); удаленные/скрытые видео пропускаем
+        found_ids, views_list, likes_list, comments_list, published_list, durations = [], [], [], [], [], []
+        for video_id in video_ids:
+            if video_id not in stats_by_id or video_id not in published_by_id:
+                continue
+            stats, duration = stats_by_id[video_id]
+            found_ids.append(video_id)
             views_list.append(int(stats.get('viewCount', 0)))
             likes_list.append(int(stats.get('likeCount', 0)))
             comments_list.append(int(stats.get('commentCount', 0)))
+            published_list.append(published_by_id[video_id])
+            durations.append(duration)
 
         if not views_list: return {"error": "Не удалось собрать статистику по видео."}
 
-        return {"views_list": views_list, "likes_list": likes_list, "comments_list": comments_list}
+        seconds = parse_durations(durations)
+        result = {"video_ids": found_ids, "views_list": views_list,
+                  "likes_list": likes_list, "comments_list": comments_list,
+                  "published_list": published_list, "duration_list": seconds.tolist(),
+                  "shorts_list": shorts_mask(seconds, SHORTS_MAX_SECONDS).tolist(), "exhausted": exhausted,
+                  "uploads_playlist_id": uploads_playlist_id, "published_at": published[:HEATMAP_RECENT_VIDEOS]}
+        self._stats_cache.set(cache_key, result)
+        return result
 
-    async def analyze_channel(self, channel_input: str) -> dict | None:
+    async def get_niche_outliers(self, channels: list, depth: int = NICHE_OUTLIER_DEPTH,
+                                 top: int = NICHE_OUTLIERS_TOP, on_progress=None) -> dict:
+        """
+        Видео-выбросы по всей нише: последние `depth` видео каждого канала
+        сравниваются с медианой своего канала и с числом подписчиков.
+        channels — [{"channel_id", "subs"}, ...]. Статистика собирается параллельно
+        (запросы videos.list склеиваются коалесцером), расчет — векторный (analytics.niche_outliers).
+        Возвращает {"outliers": [...], "videos_scanned": N}; в каждой записи "channel" —
+        индекс в channels, плюс данные видео (title, url, published_at).
+        """
+        semaphore = asyncio.Semaphore(NICHE_CONCURRENCY)
+        done = 0
+
+        async def load(channel: dict) -> dict:
+            nonlocal done
+            async with semaphore:
+                try:
+                    stats = await self.get_recent_video_stats(channel['channel_id'], depth)
+                except Exception as e:
+                    stats = {"error": str(e)}
+            done += 1
+            if on_progress:
+                await on_progress(done, len(channels))
+            return stats
+
+        results = await asyncio.gather(*(load(channel) for channel in channels))
+
+        # Shorts и длинные видео канала сравниваются каждый со своей медианой:
+        # каждая пара (канал, формат) — отдельная группа для niche_outliers
+        group_channel, group_shorts, video_ids, views, subscribers = [], [], [], [], []
+        for index, (channel, r) in enumerate(zip(channels, results)):
+            if r.get('error'):
+                continue
+            shorts = r.get('shorts_list') or [False] * len(r['video_ids'])
+            for is_short in (False, True):
+                picked = [i for i, flag in enumerate(shorts) if flag == is_short]
+                if not picked:
+                    continue
+                group_channel.append(index)
+                group_shorts.append(is_short)
+                video_ids.append([r['video_ids'][i] for i in picked])
+                views.append([r['views_list'][i] for i in picked])
+                subscribers.append(int(channel.get('subs') or 0))
+        outliers = niche_outliers(views, subscribers, top=top)
+
+        # Названия и даты нужны только для попавших в топ видео
+        items = await self._loader('videos', 'snippet,statistics', api_fields.VIDEO_DETAILS).load_many(
+            [video_ids[o['channel']][o['video']] for o in outliers]
+        )
+        rows = []
+        for outlier, item in zip(outliers, items):
+            if not item:
+                continue
+            group = outlier['channel']
+            rows.append(dict(
+                outlier,
+                channel=group_channel[group],
+                is_short=group_shorts[group],
+                video_id=item['id'],
+                title=item['snippet']['title'],
+                published_at=item['snippet']['publishedAt'],
+                url=f"https://www.youtube.com/watch?v={item['id']}"
+            ))
+        return {"outliers": rows, "videos_scanned": sum(len(v) for v in views)}
+
+    async def compare_channels(self, channel_ids: list, depth: int = COMPARE_DEPTH, on_progress=None) -> dict:
+        """
+        Сравнение до COMPARE_MAX_CHANNELS каналов. Статистика и плейлисты загрузок всех
+        каналов — одним channels.list (50 ID за запрос), последние `depth` видео каждого
+        канала — через коалесцер videos.list: ID всех каналов идут общими пачками по 50.
+        Отдельно на каждый канал — только одна страница плейлиста загрузок.
+        on_progress — необязательная корутина, получает (готово каналов, всего).
+        Возвращает {"rows": [...]} по убыванию медианы просмотров последних видео
+        и "missing" — ID, которые не нашлись.
+        """
+        channel_ids = list(dict.fromkeys(channel_ids))[:COMPARE_MAX_CHANNELS]
+        items = await self._loader('channels', 'snippet,statistics,contentDetails',
+                                   api_fields.CHANNEL_COMPARE).load_many(channel_ids)
+        found = [item for item in items if item]
+        if not found:
+            return {"error": "Ни один канал не найден."}
+        for item in found:
+            # Плейлист загрузок уже известен: get_recent_video_stats не будет запрашивать его отдельно
+            uploads = item.get('contentDetails', {}).get('relatedPlaylists', {}).get('uploads')
+            if uploads:
+                self._uploads_cache.set(item['id'], uploads)
+            self._index_channel(item['id'], item['snippet']['title'])
+
+        semaphore = asyncio.Semaphore(NICHE_CONCURRENCY)
+        done = 0
+
+        async def load(channel_id: str) -> dict:
+            nonlocal done
+            async with semaphore:
+                try:
+                    recent = await self.get_recent_video_stats(channel_id, depth)
+                except Exception as e:
+                    recent = {"error": str(e)}
+            done += 1
+            if on_progress:
+                await on_progress(done, len(found))
+            return recent
+
+        results = await asyncio.gather(*(load(item['id']) for item in found))
+
+        rows = []
+        for item, recent in zip(found, results):
+            stats = item.get('statistics', {})
+            subs = int(stats.get('subscriberCount', 0))
+            row = {
+                "channel_id": item['id'], "title": item['snippet']['title'],
+                "url": f"https://www.youtube.com/channel/{item['id']}",
+                "subs": subs, "views": int(stats.get('viewCount', 0)), "videos": int(stats.get('videoCount', 0)),
+                "sample": 0, "median_views": None, "er": None, "views_to_subs": None,
+                "per_week": None, "shorts_share": None
+            }
+            if not recent.get('error'):
+                health = channel_health(recent['views_list'], recent['likes_list'], recent['comments_list'])
+                row.update(sample=health['num_videos'], median_views=health['median_views'], er=health['er'])
+                if subs:
+                    row['views_to_subs'] = round(health['median_views'] / subs, 3)
+                shorts = recent.get('shorts_list')
+                if shorts:
+                    row['shorts_share'] = round(100 * sum(shorts) / len(shorts))
+                published = parse_timestamps(recent.get('published_list', []))
+                if published.size >= 2:
+                    span_days = (published.max() - published.min()).astype(np.int64) / 86400
+                    if span_days > 0:
+                        row['per_week'] = round(float((published.size - 1) / span_days * 7), 1)
+            rows.append(row)
+
+        rows.sort(key=lambda r: -1 if r['median_views'] is None else r['median_views'], reverse=True)
+        found_ids = {item['id'] for item in found}
+        return {"rows": rows, "depth": depth, "missing": [cid for cid in channel_ids if cid not in found_ids]}
+
+    async def get_video_ideas(self, channel_id: str, recent: dict | None, windows: tuple = (7, 14, 30)) -> dict:
+        """
+        Идеи для таблицы ниши: самое просматриваемое длинное видео за каждое окно
+        (7/14/30 дней — "idea_7d" ...) и самый популярный Shorts за самое длинное окно
+        ("idea_shorts"). Считаются по уже собранной статистике последних видео
+        (recent — результат get_recent_video_stats), без запросов к API.
+        search.list (100 единиц квоты) вызывается только для окон, которые выборка
+        не покрывает: канал выпустил больше видео, чем в ней есть.
+        """
+        ideas = {f"idea_{days}d": "N/A" for days in windows}
+        ideas["idea_shorts"] = "N/A"
+        if not recent or recent.get('error') or 'published_list' not in recent:
+            for days in windows:
+                ideas[f"idea_{days}d"] = await self.get_most_popular_video_in_range(channel_id, days)
+            return ideas
+
+        now = np.datetime64(datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None), 's')
+        published = parse_timestamps(recent['published_list'])
+        views = np.asarray(recent['views_list'], dtype=np.int64)
+        shorts = np.asarray(recent['shorts_list'], dtype=bool)
+        oldest_age = (now - published.min()).astype(np.int64) / 86400
+
+        long_best = top_in_windows(published, views, ~shorts, windows, now)
+        for days, index in zip(windows, long_best):
+            if not recent['exhausted'] and oldest_age < days:
+                # Окно старше выборки: лучшее видео может в нее не попасть
+                ideas[f"idea_{days}d"] = await self.get_most_popular_video_in_range(channel_id, days)
+            elif index >= 0:
+                ideas[f"idea_{days}d"] = f"https://youtu.be/{recent['video_ids'][index]}"
+        shorts_best = top_in_windows(published, views, shorts, windows[-1:], now)[0]
+        if shorts_best >= 0:
+            ideas["idea_shorts"] = f"https://youtu.be/{recent['video_ids'][shorts_best]}"
+        return ideas
+
+    async def analyze_channel(self, channel_input: str | ParsedLink,
+                              depth: int = HEALTH_DEPTH_DEFAULT) -> dict | None:
         """
         Получает и обрабатывает ГЛУБОКУЮ статистику для конкретного канала.
+        `depth` — сколько последних видео учитывать в "здоровье канала".
         """
         channel_info = self._extract_channel_info(channel_input)
         if not channel_info:
@@ -195,11 +811,14 @@ class YouTubeAnalyzer:
                     return {"error": f"Не удалось найти канал по имени '{channel_info['value']}'."}
                 request_args['id'] = channel_id
 
-            request = self.youtube.channels().list(**request_args)
-            response = request.execute()
-            if not response.get('items'): return {"error": "Канал не найден или недоступен."}
+            if 'id' in request_args:
+                item = await self.load_channel(request_args['id'])
+            else:
+                request = self.youtube.channels().list(**request_args, fields=api_fields.CHANNEL_DETAILS)
+                response = await self._execute(request)
+                item = response['items'][0] if response.get('items') else None
+            if not item: return {"error": "Канал не найден или недоступен."}
 
-            item = response['items'][0]
             snippet, stats = item['snippet'], item.get('statistics', {})
             if not channel_id: channel_id = item['id']
 
@@ -212,18 +831,31 @@ class YouTubeAnalyzer:
                 "subscriber_count": stats.get('subscriberCount', '0')
             }
 
-            health_data = await self.get_recent_video_stats(channel_id)
+            try:
+                health_data = await self.get_recent_video_stats(channel_id, depth)
+            except deadline.DeadlineExceeded:
+                # "Здоровье канала" необязательно: при исчерпанном бюджете отдаем карточку без него
+                logging.info(f"⏱ Здоровье канала {channel_id} (глубина {depth}) не уложилось в бюджет обработчика")
+                health_data = {"error": "timeout"}
+                data['health_timeout'] = True
 
             if 'error' not in health_data:
-                num_videos = len(health_data['views_list'])
-                total_views = sum(health_data['views_list'])
-                total_likes = sum(health_data['likes_list'])
-                total_comments = sum(health_data['comments_list'])
-                data['avg_views'] = int(total_views / num_videos)
-                data['avg_likes'] = int(total_likes / num_videos)
-                data['avg_comments'] = int(total_comments / num_videos)
-                data[
-                    'er'] = f"{((total_likes + total_comments) / total_views) * 100:.2f}" if total_views > 0 else "0.00"
+                data.update(channel_health(
+                    health_data['views_list'],
+                    health_data['likes_list'],
+                    health_data['comments_list']
+                ))
+                if 'shorts_list' in health_data:
+                    split = format_health(health_data['views_list'], health_data['likes_list'],
+                                          health_data['comments_list'], health_data['shorts_list'])
+                    data['formats'] = {"shorts": split['shorts'], "long": split['long']}
+                    # Выбросы ищутся внутри своего формата: вирусный Shorts не делает
+                    # "провальными" все длинные видео, и наоборот
+                    data.update(outliers_high=split['outliers_high'], outliers_low=split['outliers_low'],
+                                outlier_flags=split['outlier_flags'])
+                data['depth'] = depth
+                # Промежуточные данные для кнопок под отчетом (графики, теплокарта)
+                data['recent_stats'] = health_data
 
             return data
 
@@ -231,46 +863,97 @@ class YouTubeAnalyzer:
             return {"error": f"Ошибка при обращении к YouTube API: {e}"}
 
     # ⭐️⭐️⭐️ ФУНКЦИЯ ДЛЯ ТЕПЛОКАРТЫ ⭐️⭐️⭐️
-    async def get_publication_heatmap_data(self, channel_id: str) -> dict:
+    async def get_publication_heatmap_data(
+            self, channel_id: str, full_history: bool = False, tz_name: str = "UTC",
+            date_from: datetime.date | None = None, date_to: datetime.date | None = None,
+            on_progress=None, published: list | None = None) -> dict:
+        """
+        Теплокарта публикаций (день недели x час).
+        По умолчанию — 50 последних видео в UTC. В режиме full_history читает
+        весь плейлист загрузок (или диапазон дат) постранично и дополнительно
+        считает недельную регулярность публикаций и ее тренд.
+        on_progress — необязательная корутина, получает кол-во прочитанных видео.
+        published — уже известные даты публикации (ISO 8601): тогда API не вызывается.
+        Если хватает ленты загрузок (см. get_feed_uploads), API тоже не вызывается.
+        """
         try:
-            uploads_playlist_id = await self._get_uploads_playlist_id(channel_id)
-            if not uploads_playlist_id:
-                return {"error": "У канала нет плейлиста загрузок."}
-
-            request_videos = self.youtube.playlistItems().list(
-                part="snippet",
-                playlistId=uploads_playlist_id,
-                maxResults=50
-            )
-            response_videos = request_videos.execute()
+            range_from = np.datetime64(date_from, 's') if date_from else None
+            range_to = np.datetime64(date_to + datetime.timedelta(days=1), 's') if date_to else None
 
-            items = response_videos.get('items', [])
-            if not items:
-                return {"error": "На канале нет недавних видео."}
+            if published is None:
+                # Лента покрывает только последние видео: ее хватает небольшому каналу
+                # или диапазону, который начинается не раньше самого старого видео ленты
+                feed = await self.get_feed_uploads(channel_id, count=None if full_history else HEATMAP_RECENT_VIDEOS,
+                                                   since=range_from)
+                if feed is not None:
+                    published = [video['published_at'] for video in feed]
 
-            grid = np.zeros((7, 24), dtype=int)
-            day_map = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
+            if published is None:
+                uploads_playlist_id = await self._get_uploads_playlist_id(channel_id)
+                if not uploads_playlist_id:
+                    return {"error": "У канала нет плейлиста загрузок."}
 
-            for item in items:
-                pub_str = item['snippet']['publishedAt']
-                dt = datetime.datetime.fromisoformat(pub_str.replace('Z', '+00:00'))
-                weekday = dt.weekday()
-                hour = dt.hour
-                grid[weekday, hour] += 1
+                published = []
+                async for items in self._iter_playlist_pages(uploads_playlist_id, part="snippet",
+                                                             fields=api_fields.PLAYLIST_PUBLISHED):
+                    published.extend(item['snippet']['publishedAt'] for item in items)
+                    if not full_history:
+                        break
+                    if on_progress:
+                        await on_progress(len(published))
+                    # Плейлист загрузок идет от новых к старым: дальше листать нет смысла
+                    if range_from is not None and parse_timestamps(published[-1:])[0] < range_from:
+                        break
+
+            timestamps = parse_timestamps(published)
+            if range_from is not None:
+                timestamps = timestamps[timestamps >= range_from]
+            if range_to is not None:
+                timestamps = timestamps[timestamps < range_to]
+
+            if timestamps.size == 0:
+                return {"error": "На канале нет видео за выбранный период."}
+
+            grid = build_publication_grid(timestamps, tz_name)
 
             max_idx = np.unravel_index(np.argmax(grid), grid.shape)
-            report_day = day_map[max_idx[0]]
+            report_day = DAY_NAMES[max_idx[0]]
             report_hour = f"{max_idx[1]:02d}:00 - {max_idx[1] + 1:02d}:00"
 
-            report = (
-                f"<b>Отчет по 50 последним видео:</b>\n"
-                f"├ <b>Самый частый день:</b> {report_day}\n"
-                f"└ <b>Самое \"горячее\" время (UTC):</b> {report_hour}"
-            )
+            if full_history:
+                scope = f"всем {timestamps.size} видео"
+                if date_from or date_to:
+                    scope += f" ({date_from or '…'} — {date_to or '…'})"
+            else:
+                scope = f"{timestamps.size} последним видео"
+
+            lines = [
+                f"<b>Отчет по {scope}:</b>",
+                f"├ <b>Самый частый день:</b> {report_day}",
+                f"└ <b>Самое \"горячее\" время ({tz_name}):</b> {report_hour}"
+            ]
+
+            cadence = None
+            if full_history:
+                until = range_to - np.timedelta64(1, 's') if range_to is not None else None
+                cadence = weekly_cadence(timestamps, until=until, tz_name=tz_name)
+                trend = cadence['trend_per_month']
+                trend_word = "растет" if trend > 0.05 else "падает" if trend < -0.05 else "стабильна"
+                lines.extend([
+                    "",
+                    "<b>Регулярность публикаций:</b>",
+                    f"├ В среднем: {cadence['avg_per_week']:.2f} видео/нед. (за {cadence['weeks']} нед.)",
+                    f"├ Последние 12 недель: {cadence['recent_per_week']:.2f} видео/нед.",
+                    f"├ Предыдущие 12 недель: {cadence['previous_per_week']:.2f} видео/нед.",
+                    f"└ Тренд: {trend_word} ({trend:+.2f} видео/нед. за месяц)"
+                ])
 
             return {
                 "grid": grid,
-                "report": report
+                "report": "\n".join(lines),
+                "video_count": int(timestamps.size),
+                "tz_name": tz_name,
+                "cadence": cadence
             }
         except Exception as e:
             return {"error": f"Ошибка при сборе данных для теплокарты: {e}"}
@@ -283,9 +966,9 @@ class YouTubeAnalyzer:
             request = self.youtube.search().list(
                 part="snippet", channelId=channel_id,
                 publishedAfter=published_after, order="viewCount",
-                type="video", maxResults=1
+                type="video", maxResults=1, fields=api_fields.SEARCH_VIDEO_ID
             )
-            response = request.execute()
+            response = await self._execute(request)
             if response.get('items'):
                 video_id = response['items'][0]['id']['videoId']
                 return f"https://youtu.be/{video_id}"
@@ -294,37 +977,106 @@ class YouTubeAnalyzer:
         except Exception:
             return "Ошибка API"
 
-    # ⭐️⭐️⭐️ НОВАЯ ФУНКЦИЯ: СБОР ВСЕХ НАЗВАНИЙ ⭐️⭐️⭐️
-    async def get_all_video_titles(self, channel_input: str) -> dict:
+    async def resolve_channel_id(self, channel_input: str | ParsedLink) -> dict:
         """
-        Собирает названия ВСЕХ видео с канала через пагинацию.
-        Возвращает список строк (названий).
+        Превращает ссылку, @псевдоним или название в ID канала.
+        Возвращает {"channel_id": ...} или {"error": ...}.
         """
-        # 1. Получаем ID канала
         channel_info = self._extract_channel_info(channel_input)
         if not channel_info:
             return {"error": "Неверная ссылка или ID канала."}
 
-        channel_id = None
         if channel_info['type'] == 'id':
-            channel_id = channel_info['value']
-        else:
-            try:
-                if channel_info['type'] == 'username':
-                    req = self.youtube.channels().list(part="id", forUsername=channel_info['value'])
-                    resp = req.execute()
-                    if resp.get('items'):
-                        channel_id = resp['items'][0]['id']
-                
-                # Если не нашли по username или это search query
-                if not channel_id:
-                    channel_id = await self._get_channel_id_by_search(channel_info['value'])
-            except Exception as e:
-                return {"error": f"Ошибка поиска канала: {e}"}
+            return {"channel_id": channel_info['value']}
+
+        cache_key = (channel_info['type'], channel_info['value'].lower())
+        channel_id = self._resolve_cache.get(cache_key)
+        if channel_id:
+            return {"channel_id": channel_id}
+
+        try:
+            if channel_info['type'] == 'username':
+                req = self.youtube.channels().list(
+                    part="id", forUsername=channel_info['value'], fields=api_fields.CHANNEL_ID
+                )
+                resp = await self._execute(req)
+                if resp.get('items'):
+                    channel_id = resp['items'][0]['id']
+
+            # Если не нашли по username или это search query
+            if not channel_id:
+                channel_id = await self._get_channel_id_by_search(channel_info['value'])
+        except Exception as e:
+            return {"error": f"Ошибка поиска канала: {e}"}
 
         if not channel_id:
             return {"error": "Канал не найден."}
+        self._resolve_cache.set(cache_key, channel_id)
+        return {"channel_id": channel_id}
+
+    async def get_all_video_ids_by_id(self, channel_id: str, limit: int | None = None, on_progress=None) -> dict:
+        """
+        ID видео канала из плейлиста загрузок (от новых к старым), не больше `limit`.
+        on_progress — необязательная корутина, получает кол-во собранных ID после каждой страницы.
+        """
+        uploads_id = await self._get_uploads_playlist_id(channel_id)
+        if not uploads_id:
+            return {"error": "Не удалось найти плейлист загрузок."}
+
+        video_ids = []
+        try:
+            async for items in self._iter_playlist_pages(uploads_id, part="contentDetails",
+                                                         fields=api_fields.PLAYLIST_VIDEO_IDS):
+                video_ids.extend(item['contentDetails']['videoId'] for item in items)
+                if on_progress:
+                    await on_progress(len(video_ids))
+                if limit and len(video_ids) >= limit:
+                    break
+        except Exception as e:
+            return {"error": f"Ошибка при сборе видео: {e}"}
+        return {"video_ids": video_ids[:limit] if limit else video_ids}
 
+    async def get_keyword_corpus(self, channel_id: str, limit: int, on_progress=None) -> dict:
+        """
+        Названия, теги и просмотры последних `limit` видео канала для keyword_miner.
+        ID берутся из плейлиста загрузок, данные — videos.list пачками по 50
+        (через коалесцер), так что на 50 видео уходит 2 единицы квоты.
+        Возвращает {"titles", "tags", "views"} (списки одной длины) или {"error"}.
+        """
+        listed = await self.get_all_video_ids_by_id(channel_id, limit=limit, on_progress=on_progress)
+        if listed.get("error"):
+            return listed
+        try:
+            items = await self._loader('videos', 'snippet,statistics', api_fields.VIDEO_KEYWORDS) \
+                .load_many(listed['video_ids'])
+        except Exception as e:
+            return {"error": f"Ошибка при обращении к YouTube API: {e}"}
+
+        found = [item for item in items if item]
+        self._index_video_items(found)
+        return {
+            "titles": [item['snippet']['title'] for item in found],
+            "tags": [item['snippet'].get('tags', []) for item in found],
+            "views": [int(item.get('statistics', {}).get('viewCount', 0)) for item in found]
+        }
+
+    # ⭐️⭐️⭐️ НОВАЯ ФУНКЦИЯ: СБОР ВСЕХ НАЗВАНИЙ ⭐️⭐️⭐️
+    async def get_all_video_titles(self, channel_input: str) -> dict:
+        """
+        Собирает названия ВСЕХ видео с канала через пагинацию.
+        Возвращает список строк (названий).
+        """
+        # 1. Получаем ID канала
+        resolved = await self.resolve_channel_id(channel_input)
+        if resolved.get("error"):
+            return resolved
+        return await self.get_all_video_titles_by_id(resolved['channel_id'])
+
+    async def get_all_video_titles_by_id(self, channel_id: str, on_progress=None) -> dict:
+        """
+        То же, что get_all_video_titles, но для уже известного ID канала.
+        on_progress — необязательная корутина, получает кол-во собранных названий после каждой страницы.
+        """
         # 2. Получаем ID плейлиста "Uploads"
         uploads_id = await self._get_uploads_playlist_id(channel_id)
         if not uploads_id:
@@ -332,34 +1084,19 @@ class YouTubeAnalyzer:
 
         # 3. Цикл по всем страницам (Pagination)
         all_titles = []
-        next_page_token = None
-        
-        try:
-            while True:
-                request = self.youtube.playlistItems().list(
-                    part="snippet",
-                    playlistId=uploads_id,
-                    maxResults=50, # Максимум за 1 запрос
-                    pageToken=next_page_token
-                )
-                response = request.execute()
-                
-                items = response.get('items', [])
-                if not items:
-                    break
 
+        try:
+            async for items in self._iter_playlist_pages(uploads_id, part="snippet",
+                                                         fields=api_fields.PLAYLIST_TITLES):
                 for item in items:
-                    title = item['snippet']['title']
-                    all_titles.append(title)
-
-                next_page_token = response.get('nextPageToken')
-                
-                # Если токена следующей страницы нет, мы дошли до конца
-                if not next_page_token:
-                    break
-                    
-                # Маленькая пауза
-                await asyncio.sleep(0.05)
+                    all_titles.append(item['snippet']['title'])
+                self._index_videos([
+                    {"video_id": item['snippet']['resourceId']['videoId'], "channel_id": channel_id,
+                     "title": item['snippet']['title'], "published_at": item['snippet']['publishedAt']}
+                    for item in items if 'resourceId' in item['snippet']
+                ])
+                if on_progress:
+                    await on_progress(len(all_titles))
 
             # Получаем название канала для имени файла (опционально, доп. запрос)
             channel_title = f"Channel_{channel_id}"